@@ -63,10 +63,11 @@ api.interceptors.response.use(
           refresh: refreshToken,
         });
         
-        const { access } = response.data;
+        // Refresh tokens rotate: the old one is revoked once used
+        const { access, refresh = refreshToken } = response.data;
         const user = tokenManager.getUser();
         
-        tokenManager.setTokens(access, refreshToken, user);
+        tokenManager.setTokens(access, refresh, user);
         originalRequest.headers.Authorization = `Bearer ${access}`;
         
         return api(originalRequest);
@@ -165,7 +166,9 @@ const authService = {
     try {
       console.log("📤 [LOGOUT] Request");
       
-      await api.post(AUTH_ENDPOINTS.LOGOUT);
+      await api.post(AUTH_ENDPOINTS.LOGOUT, {
+        refresh: tokenManager.getRefreshToken(),
+      });
       
       console.log("📥 [LOGOUT] Success");
     } catch (error) {
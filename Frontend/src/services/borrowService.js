@@ -39,6 +39,32 @@ const borrowService = {
     }
   },
 
+  // Borrow several books at once; each result reports that book's outcome
+  borrowBooks: async (bookIds) => {
+    try {
+      const response = await api.post(`${BORROW_ENDPOINT}/borrow/batch/`, {
+        book_ids: bookIds,
+      });
+      return response.data;
+    } catch (error) {
+      console.error("Error borrowing books:", error);
+      throw error;
+    }
+  },
+
+  // Return several books at once
+  returnBooks: async (borrowIds) => {
+    try {
+      const response = await api.post(`${BORROW_ENDPOINT}/return/batch/`, {
+        borrow_ids: borrowIds,
+      });
+      return response.data;
+    } catch (error) {
+      console.error("Error returning books:", error);
+      throw error;
+    }
+  },
+
   // Renew a book
   renewBook: async (borrowId) => {
     try {
@@ -19,7 +19,8 @@ class StudentAdmin(admin.ModelAdmin):
     list_display = ['user', 'roll_number', 'is_approved', 'total_fines', 'created_at']
     list_filter = ['is_approved', 'created_at', 'department']
     search_fields = ['user__username', 'user__email', 'roll_number']
-    readonly_fields = ['created_at', 'updated_at']
+    # Summed from the loans by the overdue sweep (borrow.fines)
+    readonly_fields = ['total_fines', 'created_at', 'updated_at']
 
 
 @admin.register(Administrator)
@@ -47,7 +48,9 @@ class BooksAdmin(admin.ModelAdmin):
 
 @admin.register(BorrowRecord)
 class BorrowRecordAdmin(admin.ModelAdmin):
-    list_display = ['user_id', 'book_id', 'borrow_date', 'return_date', 'status', 'fine_amount']
+    list_display = ['user', 'book', 'borrow_date', 'return_date', 'status', 'fine_amount']
     list_filter = ['status', 'borrow_date', 'return_date']
-    search_fields = ['user_id', 'book_id']
+    list_select_related = ['user', 'book']
+    search_fields = ['user__username', 'book__title', 'book__isbn']
+    raw_id_fields = ['user', 'book']
     readonly_fields = ['created_at']
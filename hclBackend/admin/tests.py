@@ -1,3 +1,216 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from books.models import Books
+from hclBackend.benchmarking import analyze_tables
+from hclBackend.explain import QueryPlanAssertions, requires_postgresql
+from hclBackend.factories import make_loans, make_student
+from borrow.models import BorrowRecord
+from users.models import Student, User
+
+
+class AdminTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create(username='librarian', role='administrator')
+        self.client.force_authenticate(self.admin)
+
+
+class AdminDashboardStatsTests(AdminTestCase):
+    def test_constant_queries(self):
+        make_loans([make_student('s1'), make_student('s2')], overdue=True)
+        with self.assertNumQueries(5):
+            self.client.get(reverse('admin_dashboard_stats'), {'fresh': '1'})
+
+        make_loans([make_student(f'more{i}') for i in range(10)], overdue=True)
+        make_loans([make_student(f'fresh{i}') for i in range(5)])
+        make_student('waiting', approved=False, total_fines=7)
+        with self.assertNumQueries(5):
+            response = self.client.get(reverse('admin_dashboard_stats'), {'fresh': '1'})
+
+        data = response.json()
+        stats = {stat['label']: stat['value'] for stat in data['stats']}
+        self.assertEqual(stats['Total Books'], 17)
+        self.assertEqual(stats['Borrowed'], 17)
+        self.assertEqual(stats['Overdue'], 12)
+        self.assertEqual(stats['Pending Reg'], 1)
+        self.assertEqual(len(data['overdue_loans']), 5)
+        self.assertEqual(len(data['recent_borrows']), 3)
+        self.assertEqual(data['summary']['total_students'], 17)
+        self.assertEqual(Decimal(data['summary']['total_fines']), 7)
+        self.assertEqual(data['summary']['active_borrowers'], 17)
+
+    def test_snapshot_is_cached_until_a_write(self):
+        student = make_student('reader')
+        book = Books.objects.create(title='Hot', description='', category='General', author='A',
+                                    isbn='1', available_copies=2)
+        first = self.client.get(reverse('admin_dashboard_stats')).json()
+        with self.assertNumQueries(0):
+            cached = self.client.get(reverse('admin_dashboard_stats')).json()
+        self.assertEqual(cached['computed_at'], first['computed_at'])
+
+        self.client.force_authenticate(student)
+        self.client.post(reverse('borrow_book'), {'book_id': book.id}, format='json')
+        self.client.force_authenticate(self.admin)
+
+        data = self.client.get(reverse('admin_dashboard_stats')).json()
+        stats = {stat['label']: stat['value'] for stat in data['stats']}
+        self.assertEqual(stats['Borrowed'], 1)
+        self.assertNotEqual(data['computed_at'], first['computed_at'])
+
+
+class StudentsDueListTests(AdminTestCase):
+    def setUp(self):
+        super().setUp()
+        self.rich = make_student('rich', department='CSE', total_fines=50)
+        self.mid = make_student('mid', department='ECE', total_fines=20)
+        self.none = make_student('none', department='CSE', total_fines=0)
+        make_student('pending', approved=False, total_fines=99)
+        make_loans([self.mid], overdue=True)
+        make_loans([self.rich, self.rich])
+
+    def usernames(self, **params):
+        response = self.client.get(reverse('students_dues'), params)
+        self.assertEqual(response.status_code, 200)
+        return [student['username'] for student in response.json()['results']]
+
+    def test_default_sort_and_counts(self):
+        results = self.client.get(reverse('students_dues')).json()['results']
+        self.assertEqual([s['username'] for s in results], ['rich', 'mid', 'none'])
+        self.assertEqual([s['borrowed_count'] for s in results], [2, 1, 0])
+        self.assertEqual(results[0]['total_fines'], '50.00')
+
+    def test_filters(self):
+        self.assertEqual(self.usernames(min_due='20'), ['rich', 'mid'])
+        self.assertEqual(self.usernames(min_due='oops'), ['rich', 'mid', 'none'])
+        self.assertEqual(self.usernames(department='CSE'), ['rich', 'none'])
+        self.assertEqual(self.usernames(has_overdue='true'), ['mid'])
+        self.assertEqual(self.usernames(has_overdue='false'), ['rich', 'none'])
+        self.assertEqual(self.usernames(ordering='roll_number'), ['mid', 'none', 'rich'])
+
+    def test_constant_queries(self):
+        with self.assertNumQueries(2):
+            self.client.get(reverse('students_dues'), {'page_size': 50})
+        for index in range(30):
+            make_loans([make_student(f'extra{index}', total_fines=index)])
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('students_dues'), {'page_size': 50})
+        self.assertEqual(response.json()['count'], 33)
+
+
+class BulkRegistrationActionTests(AdminTestCase):
+    def pending(self, count, department='CSE', prefix='pending'):
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}-{department}-{index}', role='student') for index in range(count)
+        ])
+        return [student.id for student in Student.objects.bulk_create([
+            Student(user=user, roll_number=f'{prefix[:2]}{department}{user.id}', department=department)
+            for user in users
+        ])]
+
+    def act(self, **data):
+        return self.client.post(reverse('bulk_registration_action'), data, format='json')
+
+    def test_approve_reports_each_id(self):
+        pending = self.pending(3)
+        approved = make_student('approved')
+        response = self.act(action='approve', ids=[*pending, approved.student_profile.id, 999999])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['processed'], 3)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['approved'] * 3 + ['already_approved', 'not_found'])
+        self.assertEqual(Student.objects.filter(id__in=pending, is_approved=True).count(), 3)
+
+    def test_reject_by_department_deletes_pending_users(self):
+        rejected = self.pending(3, department='ECE')
+        kept = self.pending(2, department='CSE')
+        response = self.act(action='reject', department='ECE')
+
+        self.assertEqual(response.data['counts'], {'rejected': 3})
+        self.assertEqual(sorted(result['id'] for result in response.data['results']), rejected)
+        self.assertFalse(Student.objects.filter(id__in=rejected).exists())
+        self.assertEqual(Student.objects.filter(id__in=kept, is_approved=False).count(), 2)
+
+    def test_constant_queries(self):
+        def count_queries(action, ids):
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.act(action=action, ids=ids).status_code, 200)
+            return len(queries)
+
+        self.assertEqual(
+            count_queries('approve', self.pending(2, prefix='approve-small')),
+            count_queries('approve', self.pending(200, prefix='approve-large')),
+        )
+        # Django's deletion collector removes the users 100 ids per statement
+        small = count_queries('reject', self.pending(2, prefix='reject-small'))
+        self.assertEqual(count_queries('reject', self.pending(200, prefix='reject-large')), small + 1)
+
+    def test_rejects_bad_requests(self):
+        self.assertEqual(self.act(action='archive', ids=[1]).status_code, 400)
+        self.assertEqual(self.act(action='approve', ids='1,2').status_code, 400)
+        self.assertEqual(self.act(action='approve').status_code, 400)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportStudentsTests(AdminTestCase):
+    CSV = (
+        'username,email,roll_number,department,full_name,password\n'
+        'asha,asha@nitt.edu,CS001,CSE,Asha Rao,welcome-1\n'
+        'ben,ben@nitt.edu,CS002,CSE,Ben Das,\n'
+        'asha,other@nitt.edu,CS003,CSE,Asha Again,welcome-1\n'
+    )
+
+    def post(self, body, params=''):
+        return self.client.generic('POST', reverse('import_students') + params, body.encode(), 'text/csv')
+
+    def test_imports_csv_with_per_row_outcomes(self):
+        response = self.post(self.CSV)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['total'], response.data['created'], response.data['failed']), (3, 2, 1))
+        self.assertEqual(response.data['failed_students'][0]['error'], 'Duplicate username in upload')
+        self.assertIn('password', response.data['created_students'][1])
+        self.assertEqual(Student.objects.filter(is_approved=True, department='CSE').count(), 2)
+
+        response = self.post(self.CSV, '?approved=false')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['created'], 0)
+
+    def test_students_cannot_import(self):
+        self.client.force_authenticate(make_student('reader'))
+        self.assertEqual(self.post(self.CSV).status_code, 403)
+
+
+@requires_postgresql
+class AdminQueryPlanTests(QueryPlanAssertions, AdminTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f'plan{i}', role='student') for i in range(2000)])
+        Student.objects.bulk_create([
+            Student(user=user, roll_number=f'P{user.id}', is_approved=i % 20 != 0, department=f'D{i % 8}',
+                    total_fines=i % 40)
+            for i, user in enumerate(users)
+        ])
+        for offset in range(0, 2000, 500):
+            make_loans(users[offset:offset + 250], overdue=True)
+            make_loans(users[offset + 250:offset + 500])
+        returned = BorrowRecord.objects.order_by('id').values_list('id', flat=True)[:1500]
+        BorrowRecord.objects.filter(id__in=list(returned)).update(status='returned')
+        analyze_tables(BorrowRecord._meta.db_table, Books._meta.db_table, Student._meta.db_table)
+
+    def test_dashboard_and_dues_use_indexes(self):
+        with self.assertNoSequentialScans():
+            self.client.get(reverse('admin_dashboard_stats'), {'fresh': '1'})
+            self.client.get(reverse('students_dues'))
+            self.client.get(reverse('students_dues'), {'department': 'D3', 'cursor': ''})
+            self.client.get(reverse('students_dues'), {'has_overdue': 'true', 'min_due': '10'})
+            self.client.get(reverse('students_dues'), {'ordering': 'created_at'})
+            self.client.get(reverse('pending_registrations'))
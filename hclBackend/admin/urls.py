@@ -1,14 +1,26 @@
 from django.urls import path
-from .views import PendingStudentRegistrationsView, ApproveRejectStudentView, StudentsDueListView,AdminDashboardStatsView
+from .views import (
+    PendingStudentRegistrationsView, ApproveRejectStudentView, StudentsDueListView, AdminDashboardStatsView,
+    ProfileDetailView, ProfileListView, ImportStudentsView, BulkRegistrationActionView,
+)
 
 urlpatterns = [
     # Registration management
     path('registrations/pending/', PendingStudentRegistrationsView.as_view(), name='pending_registrations'),
-    path('registrations/<int:registration_id>/action/', ApproveRejectStudentView.as_view(), name='approve_reject_student'),
+    path(
+        'registrations/<int:registration_id>/action/', ApproveRejectStudentView.as_view(),
+        name='approve_reject_student',
+    ),
+    path('registrations/bulk-action/', BulkRegistrationActionView.as_view(), name='bulk_registration_action'),
     
     # Student management
     path('students/dues/', StudentsDueListView.as_view(), name='students_dues'),
+    path('students/import/', ImportStudentsView.as_view(), name='import_students'),
     
     # Dashboard
     path('dashboard/stats/', AdminDashboardStatsView.as_view(), name='admin_dashboard_stats'),
+
+    # Request profiles (hclBackend.profiling)
+    path('profiles/', ProfileListView.as_view(), name='profile_list'),
+    path('profiles/<str:profile_id>/', ProfileDetailView.as_view(), name='profile_detail'),
 ]
@@ -1,20 +1,36 @@
+import json
+from collections import Counter
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
+from hclBackend.pagination import KeysetPaginationMixin
 from rest_framework.permissions import IsAuthenticated
 from users.models import RegistrationRequest, Student
+from books.streaming import READERS, UploadError, input_format, open_text
+from users.authentication import bump_auth_version
+from users.onboarding import DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE, import_students
 from users.permissions import IsAdministrator
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import FileResponse
+from django.db import transaction
 from django.utils import timezone
-from django.db.models import Q, Sum
+from decimal import Decimal, InvalidOperation
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from borrow.fines import overdue_on
 from borrow.models import BorrowRecord
 from books.models import Books
+from hclBackend import profiling
+from hclBackend.caching import DASHBOARD, bump_version, get_version
 
 User = get_user_model()
 
 
-class AdminPagination(PageNumberPagination):
+class AdminPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
@@ -29,7 +45,8 @@ class PendingStudentRegistrationsView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        pending_students = Student.objects.filter(is_approved=False).select_related('user')
+        # Oldest requests first; served by student_approved_created_idx
+        pending_students = Student.objects.filter(is_approved=False).select_related('user').order_by('created_at', 'id')
         paginator = AdminPagination()
         paginated_students = paginator.paginate_queryset(pending_students, request)
         
@@ -84,6 +101,8 @@ class ApproveRejectStudentView(APIView):
                 user = student.user
                 user.is_active = True
                 user.save()
+                bump_version(DASHBOARD)
+                bump_auth_version(user.id)
                 
                 return Response({
                     'message': 'Student registration approved',
@@ -105,6 +124,8 @@ class ApproveRejectStudentView(APIView):
             try:
                 user = student.user
                 user.delete() # Casacades to student
+                bump_version(DASHBOARD)
+                bump_auth_version(student.user_id)
                 return Response({
                     'message': 'Student registration rejected and account deleted',
                     'status': 'rejected'
@@ -122,8 +143,88 @@ class ApproveRejectStudentView(APIView):
             )
 
 
+# Most students a single bulk action may name
+MAX_BULK_REGISTRATIONS = 10_000
+
+
+class BulkRegistrationActionView(APIView):
+    """
+    Approve or reject many pending registrations in one request.
+
+    The body holds ``action`` ("approve" or "reject") and either ``ids``
+    (student profile ids) or ``department`` (every pending student in it).
+    The students are locked and updated (or their users deleted) with
+    set-based statements in one transaction, and the response lists each
+    id's outcome: ``approved``, ``rejected``, ``already_approved`` or
+    ``not_found``.
+    """
+    permission_classes = [IsAdministrator]
+
+    def post(self, request):
+        action = request.data.get('action')
+        if action not in ('approve', 'reject'):
+            return Response(
+                {'error': 'Action must be "approve" or "reject"'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ids = request.data.get('ids')
+        department = request.data.get('department')
+        if ids is not None:
+            if not isinstance(ids, list) or not all(type(student_id) is int for student_id in ids):
+                return Response({'error': 'ids must be a list of student ids'}, status=status.HTTP_400_BAD_REQUEST)
+            if len(ids) > MAX_BULK_REGISTRATIONS:
+                return Response(
+                    {'error': f'At most {MAX_BULK_REGISTRATIONS} students per request'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            students = Student.objects.filter(id__in=set(ids))
+        elif department:
+            students = Student.objects.filter(is_approved=False, department=department).order_by('id')[
+                :MAX_BULK_REGISTRATIONS
+            ]
+        else:
+            return Response({'error': 'Send ids or a department'}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            found = {
+                student_id: (user_id, approved)
+                for student_id, user_id, approved in students.select_for_update().values_list(
+                    'id', 'user_id', 'is_approved'
+                )
+            }
+            pending = [student_id for student_id, (_, approved) in found.items() if not approved]
+            user_ids = [found[student_id][0] for student_id in pending]
+            if action == 'approve':
+                Student.objects.filter(id__in=pending).update(is_approved=True, updated_at=timezone.now())
+                User.objects.filter(id__in=user_ids).update(is_active=True)
+            else:
+                User.objects.filter(id__in=user_ids).delete()  # Cascades to the students
+        if pending:
+            bump_version(DASHBOARD)
+            bump_auth_version(*user_ids)
+
+        outcome = 'approved' if action == 'approve' else 'rejected'
+        results = [
+            {
+                'id': student_id,
+                'status': 'not_found' if student_id not in found
+                else 'already_approved' if found[student_id][1] else outcome,
+            }
+            for student_id in dict.fromkeys(ids if ids is not None else found)
+        ]
+        return Response({
+            'action': action,
+            'processed': len(pending),
+            'counts': dict(Counter(result['status'] for result in results)),
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+
 class StudentsDueListView(APIView):
     permission_classes = [IsAdministrator]
+    # Every sort key is backed by an index on users_student (see Student.Meta)
+    ordering_fields = ['total_fines', 'roll_number', 'created_at']
     
     def get(self, request):
         if request.user.role != 'administrator':
@@ -132,12 +233,45 @@ class StudentsDueListView(APIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        students = Student.objects.filter(is_approved=True).select_related('user')
+        # Filtering, counting, sorting and paging all happen in the database;
+        # borrowed_count is a correlated subquery so it only runs for the page.
+        borrowed_count = BorrowRecord.objects.filter(
+            user_id=OuterRef('user_id'), status__in=BorrowRecord.ACTIVE_STATUSES
+        ).order_by().values('user_id').annotate(total=Count('id')).values('total')
+        students = Student.objects.filter(is_approved=True).select_related('user').annotate(
+            borrowed_count=Coalesce(Subquery(borrowed_count), 0)
+        )
+        
+        min_due = request.query_params.get('min_due')
+        if min_due:
+            try:
+                min_due = Decimal(min_due)
+                if min_due.is_finite():
+                    students = students.filter(total_fines__gte=min_due)
+            except InvalidOperation:
+                pass
+        
+        department = request.query_params.get('department')
+        if department:
+            students = students.filter(department=department)
+        
+        has_overdue = request.query_params.get('has_overdue', '').lower()
+        if has_overdue in ('true', 'false'):
+            overdue_loans = BorrowRecord.objects.filter(
+                overdue_on(timezone.now().date()), user_id=OuterRef('user_id')
+            )
+            students = students.filter(Exists(overdue_loans) if has_overdue == 'true' else ~Exists(overdue_loans))
+        
+        ordering = request.query_params.get('ordering', '-total_fines')
+        if ordering.lstrip('-') not in self.ordering_fields:
+            ordering = '-total_fines'
+        students = students.order_by(ordering, '-id' if ordering.startswith('-') else 'id')
+        
+        paginator = AdminPagination()
+        paginated_students = paginator.paginate_queryset(students, request)
         
-        students_data = []
-        for student in students:
-            borrowed_count = BorrowRecord.objects.filter(user_id=student.user.id, status='borrowed').count()
-            students_data.append({
+        students_data = [
+            {
                 'id': student.id,
                 'user_id': student.user.id,
                 'username': student.user.username,
@@ -148,96 +282,173 @@ class StudentsDueListView(APIView):
                 'phone': student.phone,
                 'department': student.department,
                 'total_fines': str(student.total_fines),
-                'borrowed_count': borrowed_count,
+                'borrowed_count': student.borrowed_count,
                 'created_at': student.created_at,
                 'status': 'Active' if student.is_approved else 'Pending'
-            })
-        
-        min_due = request.query_params.get('min_due')
-        if min_due:
-            try:
-                min_due = float(min_due)
-                students_data = [s for s in students_data if float(s['total_fines']) >= min_due]
-            except ValueError:
-                pass
-        
-        students_data.sort(key=lambda x: float(x['total_fines']), reverse=True)
-        
-        total_fines = sum(float(s['total_fines']) for s in students_data)
-        
-        paginator = AdminPagination()
-        paginated_students = paginator.paginate_queryset(students_data, request)
+            }
+            for student in paginated_students
+        ]
         
-        return paginator.get_paginated_response(paginated_students)
+        return paginator.get_paginated_response(students_data)
 
 class AdminDashboardStatsView(APIView):
     permission_classes = [IsAdministrator]
     
     def get(self, request):
+        # Served from a short-lived snapshot; borrows, returns, approvals and
+        # catalog changes bump the dashboard version, and ?fresh=1 recomputes.
+        # Overdue counts also change with the date alone
+        cache_key = f"admin:dashboard:{timezone.now().date()}:{get_version(DASHBOARD)}"
+        snapshot = None
+        if request.query_params.get('fresh') != '1':
+            snapshot = cache.get(cache_key)
+        if snapshot is None:
+            snapshot = self.build_snapshot()
+            cache.set(cache_key, snapshot, settings.ADMIN_DASHBOARD_CACHE_TTL)
+        return Response(snapshot)
+
+    def build_snapshot(self):
         total_books = Books.objects.count()
         
-        # Books that are either marked overdue or borrowed but past due date
+        # Borrowed loans past their due date count as overdue before sweep_overdue flips them
         now = timezone.now().date()
-        borrowed_records = BorrowRecord.objects.filter(status='borrowed')
-        
-        overdue_records = BorrowRecord.objects.filter(
-            Q(status='overdue') | 
-            (Q(status='borrowed') & Q(due_date__lt=now))
+        loan_stats = BorrowRecord.objects.filter(status__in=BorrowRecord.ACTIVE_STATUSES).aggregate(
+            borrowed=Count('id'),
+            overdue=Count('id', filter=overdue_on(now)),
+            active_borrowers=Count('user_id', distinct=True),
+        )
+        student_stats = Student.objects.aggregate(
+            total_students=Count('id', filter=Q(is_approved=True)),
+            pending_registrations=Count('id', filter=Q(is_approved=False)),
+            total_fines=Sum('total_fines'),
         )
-        
-        total_students = Student.objects.filter(is_approved=True).count()
-        pending_registrations = Student.objects.filter(is_approved=False).count()
         
         # Get recent overdue loans for dashboard
-        overdue_data = []
-        for loan in overdue_records.order_by('due_date')[:5]:
-            try:
-                student = Student.objects.get(user__id=loan.user_id)
-                book = Books.objects.get(id=loan.book_id)
-                overdue_data.append({
-                    'id': loan.id,
-                    'member': student.user.username,
-                    'title': book.title,
-                    'author': book.author,
-                    'overdue': f"{(now - loan.due_date).days} days" if loan.due_date else "Unknown",
-                    'returnDate': loan.due_date.strftime("%b %d, %Y") if loan.due_date else "N/A"
-                })
-            except Exception:
-                continue
+        overdue_loans = BorrowRecord.objects.filter(
+            overdue_on(now), book__isnull=False, user__student_profile__isnull=False
+        ).select_related('book', 'user').order_by('due_date')[:5]
+        overdue_data = [
+            {
+                'id': loan.id,
+                'member': loan.user.username,
+                'title': loan.book.title,
+                'author': loan.book.author,
+                'overdue': f"{(now - loan.due_date).days} days" if loan.due_date else "Unknown",
+                'returnDate': loan.due_date.strftime("%b %d, %Y") if loan.due_date else "N/A"
+            }
+            for loan in overdue_loans
+        ]
 
         # Get recent borrows for right panel
-        recent_borrows = BorrowRecord.objects.all().order_by('-created_at')[:3]
-        recent_borrows_data = []
-        for loan in recent_borrows:
-            try:
-                book = Books.objects.get(id=loan.book_id)
-                recent_borrows_data.append({
-                    'title': book.title,
-                    'author': book.author,
-                    'code': book.isbn,
-                    'status': loan.status,
-                    'borrow': loan.borrow_date.strftime("%b %d, %Y"),
-                    'returnBy': loan.due_date.strftime("%b %d, %Y") if loan.due_date else "N/A",
-                    'cover': "from-blue-600 to-blue-700"
-                })
-            except Exception:
-                continue
-
-        # Sum all student fines
-        total_student_fines = Student.objects.aggregate(total=Sum('total_fines'))['total'] or 0.0
+        recent_borrows = BorrowRecord.objects.filter(
+            book__isnull=False
+        ).select_related('book').order_by('-created_at')[:3]
+        recent_borrows_data = [
+            {
+                'title': loan.book.title,
+                'author': loan.book.author,
+                'code': loan.book.isbn,
+                'status': loan.status,
+                'borrow': loan.borrow_date.strftime("%b %d, %Y"),
+                'returnBy': loan.due_date.strftime("%b %d, %Y") if loan.due_date else "N/A",
+                'cover': "from-blue-600 to-blue-700"
+            }
+            for loan in recent_borrows
+        ]
 
-        return Response({
+        return {
             'stats': [
                 { 'label': "Total Books", 'value': total_books, 'icon': "📘", 'bg': "bg-blue-600" },
-                { 'label': "Borrowed", 'value': borrowed_records.count(), 'icon': "📖", 'bg': "bg-indigo-600" },
-                { 'label': "Overdue", 'value': overdue_records.count(), 'icon': "📕", 'bg': "bg-rose-600" },
-                { 'label': "Pending Reg", 'value': pending_registrations, 'icon': "👤", 'bg': "bg-amber-600" },
+                { 'label': "Borrowed", 'value': loan_stats['borrowed'], 'icon': "📖", 'bg': "bg-indigo-600" },
+                { 'label': "Overdue", 'value': loan_stats['overdue'], 'icon': "📕", 'bg': "bg-rose-600" },
+                {
+                    'label': "Pending Reg", 'value': student_stats['pending_registrations'],
+                    'icon': "👤", 'bg': "bg-amber-600"
+                },
             ],
             'overdue_loans': overdue_data,
             'recent_borrows': recent_borrows_data,
             'summary': {
-                'total_students': total_students,
-                'total_fines': str(total_student_fines),
-                'active_borrowers': BorrowRecord.objects.filter(status='borrowed').values('user_id').distinct().count()
-            }
-        })
+                'total_students': student_stats['total_students'],
+                'total_fines': str(student_stats['total_fines'] or 0.0),
+                'active_borrowers': loan_stats['active_borrowers'],
+            },
+            'computed_at': timezone.now().isoformat(),
+        }
+
+
+class ProfileListView(APIView):
+    permission_classes = [IsAdministrator]
+
+    def get(self, request):
+        """Stored request profiles, newest first (see hclBackend.profiling)."""
+        return Response({'results': profiling.list_profiles()})
+
+
+class ProfileDetailView(APIView):
+    permission_classes = [IsAdministrator]
+
+    def get(self, request, profile_id):
+        # ?download=1 returns the raw pstats dump for snakeviz/pstats
+        download = request.query_params.get('download') == '1'
+        path = profiling.profile_path(profile_id, '.prof' if download else '.json')
+        if path is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        if download:
+            return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.prof',
+                                content_type='application/octet-stream')
+        with open(path) as handle:
+            return Response(json.load(handle))
+
+
+class ImportStudentsView(APIView):
+    """
+    Onboard a CSV (or NDJSON) of students in one request (see users.onboarding).
+
+    Columns: username, email, roll_number, department, full_name, password.
+    Generated passwords are returned with the created students. Imported
+    students are approved unless ``?approved=false``.
+    """
+    permission_classes = [IsAdministrator]
+
+    def post(self, request):
+        input_type = input_format(request.content_type, request.query_params.get('input'))
+        if input_type is None:
+            return Response(
+                {'error': 'Send text/csv or application/x-ndjson, or pass ?input=csv|ndjson'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        try:
+            batch_size = int(request.query_params.get('batch_size', DEFAULT_BATCH_SIZE))
+        except ValueError:
+            return Response({'error': 'batch_size must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        approved = request.query_params.get('approved', 'true').lower() not in ('0', 'false', 'no')
+
+        try:
+            report = import_students(
+                READERS[input_type](open_text(request)),
+                approved=approved,
+                batch_size=min(max(batch_size, 1), MAX_BATCH_SIZE),
+                shared_pool=True,
+            )
+        except UploadError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if report['created_students']:
+            bump_version(DASHBOARD)
+            response_status = status.HTTP_201_CREATED
+        elif report['failed_students']:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_200_OK
+
+        return Response({
+            'message': 'Student import completed',
+            'total': report['total'],
+            'created': len(report['created_students']),
+            'failed': len(report['failed_students']),
+            'elapsed_s': report['elapsed_s'],
+            'users_per_s': report['users_per_s'],
+            'created_students': report['created_students'],
+            'failed_students': report['failed_students'],
+        }, status=response_status)
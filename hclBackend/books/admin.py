@@ -1,4 +1,5 @@
 from django.contrib import admin
+from hclBackend.caching import CATALOG, DASHBOARD, bump_version
 from .models import Books
 
 
@@ -7,3 +8,15 @@ class BooksAdmin(admin.ModelAdmin):
     list_display = ['title', 'author', 'category', 'isbn', 'available_copies']
     list_filter = ['category', 'published_year']
     search_fields = ['title', 'author', 'isbn']
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        bump_version(CATALOG, DASHBOARD)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_version(CATALOG, DASHBOARD)
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_version(CATALOG, DASHBOARD)
@@ -0,0 +1,315 @@
+"""
+The category index: one ``books_category`` row per distinct category with
+its number of books and of available copies.
+
+Categories are matched case-insensitively and ignoring surrounding spaces
+(``lower(trim(category))``), and a category is listed under the spelling
+it was first seen with. Like the search index (see ``books.search``), the
+rows are maintained by the database itself, so every write path (the
+views, bulk imports, raw ``bulk_create``/``update`` calls) keeps them in
+sync:
+
+* PostgreSQL: statement-level triggers fold each statement's inserted or
+  deleted rows into one upsert per category, in key order. Moving a book
+  to another category fires a row-level trigger.
+* SQLite: row-level triggers upsert the old and new category of each row.
+
+Borrows and returns change ``available_copies`` all the time, and
+updating a counter per category would make every loan in a category
+wait on the same row. Instead a copies change appends a row to
+``books_category_copies_change``, which never conflicts, and readers
+fold the pending changes into the category rows (``fold_copy_changes``)
+before reading them.
+
+Categories whose books are all gone keep a row with ``book_count = 0``.
+SQLite's ``lower()`` only folds ASCII letters. On other backends the
+category list falls back to scanning the catalog.
+
+Note: on SQLite, migrations that rebuild ``books_books`` drop its triggers
+and must call ``install_category_index`` again afterwards.
+"""
+from collections import defaultdict
+
+from django.db import connections, transaction
+from django.db.models import Case, Count, F, Min, Sum, Value, When
+from django.db.models.functions import Lower, Trim
+
+from .models import Books, Category, CategoryCopiesChange
+
+CATEGORY_TABLE = Category._meta.db_table
+CHANGES_TABLE = CategoryCopiesChange._meta.db_table
+
+# Upper bound on facets returned with a search, most books first
+MAX_FACETS = 50
+
+UPSERT_SET = """
+    book_count = {table}.book_count + excluded.book_count,
+    available_copies = {table}.available_copies + excluded.available_copies,
+    name = CASE WHEN {table}.book_count = 0 THEN excluded.name ELSE {table}.name END
+""".format(table=CATEGORY_TABLE)
+
+POSTGRES_CHANGES = {
+    'INSERT': "SELECT category, 1, available_copies FROM new_rows",
+    'DELETE': "SELECT category, -1, -available_copies FROM old_rows",
+}
+
+POSTGRES_FUNCTION_SQL = """
+CREATE OR REPLACE FUNCTION books_category_sync_{operation}() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO {table} (normalized_name, name, book_count, available_copies)
+    SELECT lower(btrim(category)), min(btrim(category)), sum(books), sum(copies)
+    FROM ({changes}) AS changes (category, books, copies)
+    WHERE btrim(category) <> ''
+    GROUP BY lower(btrim(category))
+    ORDER BY 1
+    ON CONFLICT (normalized_name) DO UPDATE SET {upsert};
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql
+"""
+
+POSTGRES_TRIGGER_SQL = """
+CREATE TRIGGER books_category_{name} AFTER {operation} ON books_books
+REFERENCING {tables} FOR EACH STATEMENT EXECUTE FUNCTION books_category_sync_{name}()
+"""
+
+POSTGRES_TRANSITION_TABLES = {
+    'INSERT': 'NEW TABLE AS new_rows',
+    'DELETE': 'OLD TABLE AS old_rows',
+}
+
+# Postgres doesn't allow transition tables on UPDATE OF triggers, so these
+# are row-level: a category change (rare) moves the book and its copies, and
+# a copies change (every loan) only appends to the change table.
+POSTGRES_UPDATE_SQL = [
+    f"""
+    CREATE OR REPLACE FUNCTION books_category_sync_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE {CATEGORY_TABLE}
+        SET book_count = book_count - 1, available_copies = available_copies - old.available_copies
+        WHERE normalized_name = lower(btrim(old.category));
+        INSERT INTO {CATEGORY_TABLE} (normalized_name, name, book_count, available_copies)
+        SELECT lower(btrim(new.category)), btrim(new.category), 1, new.available_copies
+        WHERE btrim(new.category) <> ''
+        ON CONFLICT (normalized_name) DO UPDATE SET {UPSERT_SET};
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f"""
+    CREATE OR REPLACE FUNCTION books_category_sync_copies() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO {CHANGES_TABLE} (normalized_name, copies)
+        SELECT lower(btrim(new.category)), new.available_copies - old.available_copies
+        WHERE btrim(new.category) <> '';
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS books_category_update ON books_books",
+    "DROP TRIGGER IF EXISTS books_category_copies ON books_books",
+    """
+    CREATE TRIGGER books_category_update AFTER UPDATE OF category ON books_books
+    FOR EACH ROW WHEN (lower(btrim(old.category)) IS DISTINCT FROM lower(btrim(new.category)))
+    EXECUTE FUNCTION books_category_sync_update()
+    """,
+    """
+    CREATE TRIGGER books_category_copies AFTER UPDATE OF available_copies ON books_books
+    FOR EACH ROW WHEN (
+        old.available_copies IS DISTINCT FROM new.available_copies
+        AND lower(btrim(old.category)) IS NOT DISTINCT FROM lower(btrim(new.category))
+    )
+    EXECUTE FUNCTION books_category_sync_copies()
+    """,
+]
+
+BACKFILL_SQL = [
+    f"DELETE FROM {CATEGORY_TABLE}",
+    f"DELETE FROM {CHANGES_TABLE}",
+    """
+    INSERT INTO {table} (normalized_name, name, book_count, available_copies)
+    SELECT lower({trim}(category)), min({trim}(category)), count(*), coalesce(sum(available_copies), 0)
+    FROM books_books
+    WHERE {trim}(category) <> ''
+    GROUP BY lower({trim}(category))
+    """,
+]
+
+POSTGRES_INDEX_SQL = [
+    *[
+        POSTGRES_FUNCTION_SQL.format(
+            operation=operation.lower(), table=CATEGORY_TABLE, changes=changes, upsert=UPSERT_SET
+        )
+        for operation, changes in POSTGRES_CHANGES.items()
+    ],
+    *[
+        f"DROP TRIGGER IF EXISTS books_category_{operation.lower()} ON books_books"
+        for operation in POSTGRES_CHANGES
+    ],
+    *[
+        POSTGRES_TRIGGER_SQL.format(name=operation.lower(), operation=operation, tables=tables)
+        for operation, tables in POSTGRES_TRANSITION_TABLES.items()
+    ],
+    *POSTGRES_UPDATE_SQL,
+    *[sql.format(table=CATEGORY_TABLE, trim='btrim') for sql in BACKFILL_SQL],
+]
+
+POSTGRES_OPERATIONS = ('insert', 'delete', 'update', 'copies')
+
+POSTGRES_DROP_SQL = [
+    *[f"DROP TRIGGER IF EXISTS books_category_{operation} ON books_books" for operation in POSTGRES_OPERATIONS],
+    *[f"DROP FUNCTION IF EXISTS books_category_sync_{operation}()" for operation in POSTGRES_OPERATIONS],
+]
+
+SQLITE_ADD = f"""
+    INSERT INTO {CATEGORY_TABLE} (normalized_name, name, book_count, available_copies)
+    SELECT lower(trim(new.category)), trim(new.category), 1, new.available_copies
+    WHERE trim(new.category) <> ''
+    ON CONFLICT (normalized_name) DO UPDATE SET {UPSERT_SET};
+"""
+
+SQLITE_REMOVE = f"""
+    UPDATE {CATEGORY_TABLE}
+    SET book_count = book_count - 1, available_copies = available_copies - old.available_copies
+    WHERE normalized_name = lower(trim(old.category));
+"""
+
+SQLITE_COPIES = f"""
+    INSERT INTO {CHANGES_TABLE} (normalized_name, copies)
+    SELECT lower(trim(new.category)), new.available_copies - old.available_copies
+    WHERE trim(new.category) <> '';
+"""
+
+SQLITE_INDEX_SQL = [
+    f"CREATE TRIGGER IF NOT EXISTS books_category_insert AFTER INSERT ON books_books BEGIN {SQLITE_ADD} END",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_category_update AFTER UPDATE OF category ON books_books
+    WHEN lower(trim(old.category)) IS NOT lower(trim(new.category)) BEGIN {SQLITE_REMOVE} {SQLITE_ADD} END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_category_copies AFTER UPDATE OF available_copies ON books_books
+    WHEN old.available_copies IS NOT new.available_copies
+    AND lower(trim(old.category)) IS lower(trim(new.category)) BEGIN {SQLITE_COPIES} END
+    """,
+    f"CREATE TRIGGER IF NOT EXISTS books_category_delete AFTER DELETE ON books_books BEGIN {SQLITE_REMOVE} END",
+    *[sql.format(table=CATEGORY_TABLE, trim='trim') for sql in BACKFILL_SQL],
+]
+
+SQLITE_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS books_category_insert",
+    "DROP TRIGGER IF EXISTS books_category_update",
+    "DROP TRIGGER IF EXISTS books_category_copies",
+    "DROP TRIGGER IF EXISTS books_category_delete",
+]
+
+
+def install_category_index(schema_editor):
+    """Create (or rebuild) the category triggers and counts for the current database vendor."""
+    connection = schema_editor.connection
+    # Earlier migrations call this too; the triggers need the change table
+    # added in 0008, which installs them itself.
+    if CHANGES_TABLE not in connection.introspection.table_names():
+        return
+    statements = {
+        'postgresql': POSTGRES_INDEX_SQL,
+        'sqlite': SQLITE_INDEX_SQL,
+    }.get(connection.vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def remove_category_index(schema_editor):
+    statements = {
+        'postgresql': POSTGRES_DROP_SQL,
+        'sqlite': SQLITE_DROP_SQL,
+    }.get(schema_editor.connection.vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def is_maintained(using='default'):
+    return connections[using].vendor in ('postgresql', 'sqlite')
+
+
+def fold_copy_changes(using='default'):
+    """
+    Move the pending copies changes into their category rows. The category
+    rows are locked in key order, like the insert and delete triggers do, so
+    concurrent folds and catalog writes can't deadlock.
+    """
+    with transaction.atomic(using=using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {CHANGES_TABLE} RETURNING normalized_name, copies")
+            changes = cursor.fetchall()
+        totals = defaultdict(int)
+        for name, copies in changes:
+            totals[name] += copies
+        names = sorted(name for name, copies in totals.items() if copies)
+        if not names:
+            return
+        list(Category.objects.using(using).select_for_update().filter(
+            normalized_name__in=names
+        ).order_by('normalized_name').values_list('id', flat=True))
+        Category.objects.using(using).filter(normalized_name__in=names).update(
+            available_copies=F('available_copies') + Case(
+                *[When(normalized_name=name, then=Value(totals[name])) for name in names], default=Value(0)
+            )
+        )
+
+
+def category_counts():
+    """``[{name, book_count, available_copies}]`` for every category with books, by name."""
+    if not is_maintained(Category.objects.db):
+        return sorted(legacy_counts(Books.objects.all()), key=lambda row: row['name'])
+    fold_copy_changes(Category.objects.db)
+    rows = Category.objects.filter(book_count__gt=0).values('name', 'book_count', 'available_copies')
+    return sorted(rows, key=lambda row: row['name'])
+
+
+def category_names():
+    """The name of every category with books, in order."""
+    if not is_maintained(Category.objects.db):
+        return [row['name'] for row in category_counts()]
+    return sorted(Category.objects.filter(book_count__gt=0).values_list('name', flat=True))
+
+
+def legacy_counts(books):
+    counts = {}
+    for category, copies in books.exclude(category__isnull=True).values_list('category', 'available_copies'):
+        name = category.strip()
+        if name:
+            row = counts.setdefault(name.lower(), {'name': name, 'book_count': 0, 'available_copies': 0})
+            row['book_count'] += 1
+            row['available_copies'] += copies
+    return list(counts.values())
+
+
+def facet_counts(books, filtered):
+    """
+    Category facets of ``books``, most books first: read from the index when
+    the queryset is the whole catalog, else grouped over the matching rows.
+    """
+    if not filtered and is_maintained(books.db):
+        fold_copy_changes(books.db)
+        return [
+            {'category': row['name'], 'count': row['book_count'], 'available_copies': row['available_copies']}
+            for row in Category.objects.filter(book_count__gt=0).order_by('-book_count', 'name').values(
+                'name', 'book_count', 'available_copies'
+            )[:MAX_FACETS]
+        ]
+    groups = list(books.order_by().exclude(category__isnull=True).annotate(
+        normalized=Lower(Trim('category'))
+    ).exclude(normalized='').values('normalized').annotate(
+        name=Min(Trim('category')), count=Count('id'), copies=Sum('available_copies')
+    ).order_by('-count', 'normalized')[:MAX_FACETS])
+    if is_maintained(books.db):
+        # List categories under the same spelling as the category index
+        names = dict(Category.objects.filter(
+            normalized_name__in=[group['normalized'] for group in groups]
+        ).values_list('normalized_name', 'name'))
+        for group in groups:
+            group['name'] = names.get(group['normalized'], group['name'])
+    return [
+        {'category': group['name'], 'count': group['count'], 'available_copies': group['copies'] or 0}
+        for group in groups
+    ]
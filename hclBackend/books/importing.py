@@ -0,0 +1,195 @@
+"""
+Batched catalog import used by BulkUploadBooksView.
+
+Rows are validated in Python first, then written a chunk at a time: one
+query looks up which ISBNs already exist, and the new books go in with a
+single ``bulk_create`` inside a transaction, so a chunk is either fully
+written or not at all. ISBNs that already exist are handled according to
+``on_conflict``:
+
+- ``error`` (default): the row is reported as failed, as before.
+- ``skip``: the row is reported as skipped and the stored book is left alone.
+- ``update``: the fields present in the row overwrite the stored book.
+"""
+import itertools
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+
+from .models import Books
+
+ON_CONFLICT_CHOICES = ('error', 'skip', 'update')
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 5000
+
+# Values used for fields missing from an uploaded row
+IMPORT_DEFAULTS = {
+    'title': '',
+    'description': '',
+    'category': '',
+    'thumbnail': '',
+    'num_pages': 0,
+    'average_rating': 0.0,
+    'author': '',
+    'isbn': None,
+    'published_year': '',
+    'available_copies': 0,
+}
+
+
+def clean_row(data):
+    """Return the validated fields present in ``data``; raise ValidationError otherwise."""
+    if isinstance(data, ValidationError):
+        # A reader could not parse this row and passed its error through.
+        raise data
+    if not isinstance(data, dict):
+        raise ValidationError('Each book must be an object')
+    if not data.get('isbn'):
+        raise ValidationError('ISBN is required')
+
+    values = {}
+    for name, default in IMPORT_DEFAULTS.items():
+        if name not in data:
+            continue
+        field = Books._meta.get_field(name)
+        value = data[name]
+        if value is None and not field.null:
+            value = default
+        try:
+            value = field.to_python(value)
+            if value not in field.empty_values:
+                field.run_validators(value)
+        except ValidationError as exc:
+            raise ValidationError(f"{name}: {' '.join(exc.messages)}")
+        values[name] = value
+    return values
+
+
+def row_summary(index, data, error):
+    data = data if isinstance(data, dict) else {}
+    return {
+        'index': index,
+        'title': data.get('title', 'Unknown'),
+        'isbn': data.get('isbn', 'Unknown'),
+        'error': error,
+    }
+
+
+def book_summary(book):
+    return {'id': book.id, 'isbn': book.isbn, 'title': book.title}
+
+
+def import_books(rows, on_conflict='error', batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import an iterable of book dicts and return the per-row report.
+
+    The report holds ``created_books``, ``updated_books``, ``skipped_books``
+    and ``failed_books`` lists, plus ``total``, the number of rows read.
+    """
+    report = {'total': 0, 'created_books': [], 'updated_books': [], 'skipped_books': [], 'failed_books': []}
+    for result in iter_import(rows, on_conflict, batch_size):
+        report['total'] += result['rows']
+        for outcome in ('created', 'updated', 'skipped'):
+            report[f'{outcome}_books'].extend(book_summary(book) for book in result[outcome])
+        report['failed_books'].extend(result['failed'])
+    return report
+
+
+def iter_import(rows, on_conflict='error', batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import ``rows`` lazily, yielding one result per chunk once it is committed.
+
+    Each result holds ``rows`` (rows read), the ``created``, ``updated`` and
+    ``skipped`` Books and the ``failed`` row summaries. Only one chunk is
+    held in memory at a time, so ``rows`` can be a generator over a file of
+    any size. An ISBN repeated within a chunk fails as a duplicate; one
+    repeated in a later chunk is treated as an existing book.
+    """
+    if on_conflict not in ON_CONFLICT_CHOICES:
+        raise ValueError(f'on_conflict must be one of {", ".join(ON_CONFLICT_CHOICES)}')
+
+    rows = enumerate(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+
+        chunk, failed, seen = [], [], set()
+        for index, data in batch:
+            try:
+                values = clean_row(data)
+            except ValidationError as exc:
+                failed.append(row_summary(index, data, ' '.join(exc.messages)))
+                continue
+            if values['isbn'] in seen:
+                failed.append(row_summary(index, data, 'Duplicate ISBN in upload'))
+                continue
+            seen.add(values['isbn'])
+            chunk.append((index, data, values))
+
+        result = {'rows': len(batch), 'created': [], 'updated': [], 'skipped': [], 'failed': failed}
+        if chunk:
+            import_chunk(chunk, on_conflict, result)
+        result['failed'].sort(key=lambda row: row['index'])
+        yield result
+
+
+def import_chunk(chunk, on_conflict, result):
+    # A concurrent writer can insert one of our ISBNs between the lookup and
+    # the insert; the chunk is rolled back, so look the ISBNs up once more.
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                created, updated, skipped, failed = write_chunk(chunk, on_conflict)
+            break
+        except IntegrityError as exc:
+            error = str(exc)
+    else:
+        result['failed'].extend(row_summary(index, data, error) for index, data, _ in chunk)
+        return
+
+    result['created'] = created
+    result['updated'] = updated
+    result['skipped'] = skipped
+    result['failed'].extend(failed)
+
+
+def write_chunk(chunk, on_conflict):
+    isbns = [values['isbn'] for _, _, values in chunk]
+    if on_conflict == 'update':
+        existing = Books.objects.in_bulk(isbns, field_name='isbn')
+    else:
+        existing = {
+            isbn: Books(id=book_id, isbn=isbn, title=title)
+            for book_id, isbn, title in Books.objects.filter(isbn__in=isbns).values_list('id', 'isbn', 'title')
+        }
+
+    created, updated, skipped, failed = [], [], [], []
+    update_fields = set()
+    for index, data, values in chunk:
+        book = existing.get(values['isbn'])
+        if book is None:
+            created.append(Books(**{**IMPORT_DEFAULTS, **values}))
+        elif on_conflict == 'skip':
+            skipped.append(book)
+        elif on_conflict == 'update':
+            for name, value in values.items():
+                setattr(book, name, value)
+            update_fields.update(values)
+            updated.append(book)
+        else:
+            failed.append(row_summary(index, data, 'A book with this ISBN already exists'))
+
+    if created:
+        Books.objects.bulk_create(created)
+    update_fields = sorted(update_fields - {'isbn'})
+    if updated and update_fields:
+        if connection.features.supports_update_conflicts_with_target:
+            # INSERT ... ON CONFLICT (isbn) DO UPDATE is far cheaper than the
+            # per-row CASE expressions bulk_update generates.
+            Books.objects.bulk_create(
+                updated, update_conflicts=True, unique_fields=['isbn'], update_fields=update_fields
+            )
+        else:
+            Books.objects.bulk_update(updated, update_fields)
+    return created, updated, skipped, failed
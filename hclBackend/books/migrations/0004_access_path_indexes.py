@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:17
+
+from django.db import migrations, models
+
+from hclBackend.operations import AddIndexConcurrently
+
+# Keyset pages put NULLs last in both directions (hclBackend.pagination), so a
+# descending walk over a nullable column needs DESC NULLS LAST indexes. SQLite
+# cannot declare NULL placement in an index, so these exist on PostgreSQL only
+# and are not part of the model state.
+NULLS_LAST_INDEXES = {
+    'books_year_desc_idx': ('published_year', 'id'),
+    'books_rating_desc_idx': ('average_rating', 'id'),
+}
+
+
+def create_nulls_last_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, (column, tiebreaker) in NULLS_LAST_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+            f'ON books_books ({column} DESC NULLS LAST, {tiebreaker} DESC)'
+        )
+
+
+def drop_nulls_last_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in NULLS_LAST_INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('books', '0003_books_search_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='books',
+            index=models.Index(fields=['category', 'id'], name='books_category_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='books',
+            index=models.Index(fields=['title', 'id'], name='books_title_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='books',
+            index=models.Index(fields=['published_year', 'id'], name='books_year_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='books',
+            index=models.Index(fields=['average_rating', 'id'], name='books_rating_idx'),
+        ),
+        migrations.RunPython(create_nulls_last_indexes, drop_nulls_last_indexes, atomic=False),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:54
+
+from django.db import migrations, models
+
+from books.categories import install_category_index, remove_category_index
+
+
+def create_category_index(apps, schema_editor):
+    install_category_index(schema_editor)
+
+
+def drop_category_index(apps, schema_editor):
+    remove_category_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0004_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_name', models.CharField(max_length=100, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('book_count', models.IntegerField(default=0)),
+                ('available_copies', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'categories',
+                'db_table': 'books_category',
+                'indexes': [models.Index(condition=models.Q(('book_count__gt', 0)), fields=['name'], include=('book_count', 'available_copies'), name='category_listed_idx')],
+            },
+        ),
+        migrations.RunPython(create_category_index, drop_category_index),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 07:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0005_category_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchEntry',
+            fields=[
+                ('book', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='books.books')),
+            ],
+            options={
+                'db_table': 'books_books_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+from books.categories import install_category_index, remove_category_index
+
+
+def create_category_index(apps, schema_editor):
+    install_category_index(schema_editor)
+
+
+def drop_category_index(apps, schema_editor):
+    remove_category_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0006_book_search_entry'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_category_index, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='category',
+            name='category_listed_idx',
+        ),
+        migrations.RemoveField(
+            model_name='category',
+            name='available_copies',
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(condition=models.Q(('book_count__gt', 0)), fields=['name'], include=('book_count',), name='category_listed_idx'),
+        ),
+        migrations.RunPython(create_category_index, drop_category_index),
+    ]
@@ -0,0 +1,67 @@
+from django.db import migrations, models
+
+from books.categories import install_category_index, remove_category_index
+
+# Categories are listed straight from this index on PostgreSQL. SQLite
+# ignores INCLUDE columns, so it only gets the plain index from the model.
+COVERING_INDEX = 'category_listed_covering_idx'
+
+
+def create_category_index(apps, schema_editor):
+    install_category_index(schema_editor)
+
+
+def drop_category_index(apps, schema_editor):
+    remove_category_index(schema_editor)
+
+
+def create_covering_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {COVERING_INDEX} ON books_category (name) '
+        f'INCLUDE (book_count, available_copies) WHERE book_count > 0'
+    )
+
+
+def drop_covering_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {COVERING_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('books', '0007_category_book_counts_only'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_category_index, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='CategoryCopiesChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('normalized_name', models.CharField(max_length=100)),
+                ('copies', models.IntegerField()),
+            ],
+            options={
+                'db_table': 'books_category_copies_change',
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='category',
+            name='category_listed_idx',
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='available_copies',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='category',
+            index=models.Index(condition=models.Q(('book_count__gt', 0)), fields=['name'], name='category_listed_idx'),
+        ),
+        migrations.RunPython(create_covering_index, drop_covering_index),
+        migrations.RunPython(create_category_index, drop_category_index),
+    ]
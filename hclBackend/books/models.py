@@ -16,6 +16,65 @@ class Books(models.Model):
     class Meta:
         db_table = 'books_books'
         ordering = ['-id']
+        # ListBooksView: category filter and each allowed ordering, with id as the tiebreaker
+        indexes = [
+            models.Index(fields=['category', 'id'], name='books_category_idx'),
+            models.Index(fields=['title', 'id'], name='books_title_idx'),
+            models.Index(fields=['published_year', 'id'], name='books_year_idx'),
+            models.Index(fields=['average_rating', 'id'], name='books_rating_idx'),
+        ]
 
     def __str__(self):
-        return self.title
\ No newline at end of file
+        return self.title
+
+
+class BookSearchEntry(models.Model):
+    """
+    A book's row in the SQLite full-text index (see ``books.search``), so
+    searches can join it. The table is created by ``install_search_index``
+    and only exists on SQLite.
+    """
+    book = models.OneToOneField(
+        Books, primary_key=True, db_column='rowid', db_constraint=False,
+        on_delete=models.DO_NOTHING, related_name='search_entry',
+    )
+
+    class Meta:
+        managed = False
+        db_table = 'books_books_fts'
+
+
+class Category(models.Model):
+    """
+    A category's book and available-copy counts, kept in sync with
+    ``books_books`` by database triggers (see ``books.categories``).
+    """
+    normalized_name = models.CharField(max_length=100, unique=True)
+    name = models.CharField(max_length=100)
+    book_count = models.IntegerField(default=0)
+    available_copies = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'books_category'
+        verbose_name_plural = 'categories'
+        # CategoryListView and catalog facets: categories that still have books.
+        # On PostgreSQL migration 0008 adds a covering version of this index.
+        indexes = [
+            models.Index(fields=['name'], condition=models.Q(book_count__gt=0), name='category_listed_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class CategoryCopiesChange(models.Model):
+    """
+    A change to the available copies of a category's books, appended by a
+    trigger on every borrow and return and folded into ``Category`` when
+    the counts are read (see ``books.categories``).
+    """
+    normalized_name = models.CharField(max_length=100)
+    copies = models.IntegerField()
+
+    class Meta:
+        db_table = 'books_category_copies_change'
@@ -0,0 +1,198 @@
+"""
+Full-text search for the book catalog.
+
+The search index is maintained by the database itself, so every write path
+(AddBook, BookDetailView, BulkUploadBooksView, the Django admin, raw
+``bulk_create``/``update`` calls) keeps it in sync without extra Python code:
+
+* PostgreSQL: a generated ``search_vector`` tsvector column with a GIN index.
+* SQLite: an FTS5 table ``books_books_fts`` kept in sync by triggers.
+
+Other backends fall back to the original ``icontains`` scan.
+
+Field weighting is title > author > category > isbn and every query term is
+matched as a prefix, so partial words typed in the SearchPage match. Terms
+are not matched in the middle of a word, except for queries that look like
+an ISBN fragment ("0132350884", "7356-5"): those are also matched anywhere in
+the ISBN, hyphens ignored, as the original ``icontains`` search did. That
+part is a scan of the ISBN column.
+
+Note: on SQLite, migrations that rebuild ``books_books`` drop its triggers and
+must call ``install_search_index`` again afterwards. On PostgreSQL, altering
+the type of an indexed column requires dropping the generated column first.
+"""
+import re
+
+from django.db import connections, models
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Replace
+
+FTS_TABLE = 'books_books_fts'
+
+# Upper bound on terms per query, keeps pathological inputs cheap.
+MAX_TERMS = 8
+
+TERM_RE = re.compile(r'\w+')
+
+# Digits and hyphens (an ISBN-10 may end in X); at least this many digits
+ISBN_FRAGMENT_RE = re.compile(r'[\d\s-]+[xX]?')
+MIN_ISBN_FRAGMENT = 4
+
+# bm25() weights for the FTS5 columns: title, author, category, isbn
+SQLITE_WEIGHTS = (10.0, 5.0, 2.0, 1.0)
+
+# Hyphenated ISBNs are indexed both split on the hyphen and compacted so that
+# "978-0743273565", "0743273565" and "9780743273565" all match.
+SQLITE_ISBN_TERMS = "replace({row}.isbn, '-', ' ') || ' ' || replace({row}.isbn, '-', '')"
+
+POSTGRES_INDEX_SQL = [
+    """
+    ALTER TABLE books_books ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(author, '')), 'B') ||
+        setweight(to_tsvector('simple', coalesce(category, '')), 'C') ||
+        setweight(to_tsvector('simple',
+            replace(coalesce(isbn, ''), '-', ' ') || ' ' || replace(coalesce(isbn, ''), '-', '')), 'D')
+    ) STORED
+    """,
+    "CREATE INDEX books_books_search_vector_gin ON books_books USING GIN (search_vector)",
+]
+
+POSTGRES_DROP_SQL = [
+    "DROP INDEX IF EXISTS books_books_search_vector_gin",
+    "ALTER TABLE books_books DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_INDEX_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, author, category, isbn, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"DELETE FROM {FTS_TABLE}",
+    f"""
+    INSERT INTO {FTS_TABLE} (rowid, title, author, category, isbn)
+    SELECT id, title, author, category, {SQLITE_ISBN_TERMS.format(row='books_books')} FROM books_books
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_books_fts_insert AFTER INSERT ON books_books BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, title, author, category, isbn)
+        VALUES (new.id, new.title, new.author, new.category, {SQLITE_ISBN_TERMS.format(row='new')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_books_fts_update
+    AFTER UPDATE OF id, title, author, category, isbn ON books_books BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE} (rowid, title, author, category, isbn)
+        VALUES (new.id, new.title, new.author, new.category, {SQLITE_ISBN_TERMS.format(row='new')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_books_fts_delete AFTER DELETE ON books_books BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+]
+
+SQLITE_DROP_SQL = [
+    "DROP TRIGGER IF EXISTS books_books_fts_insert",
+    "DROP TRIGGER IF EXISTS books_books_fts_update",
+    "DROP TRIGGER IF EXISTS books_books_fts_delete",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def install_search_index(schema_editor):
+    """Create (or rebuild) the search index for the current database vendor."""
+    statements = {
+        'postgresql': POSTGRES_INDEX_SQL,
+        'sqlite': SQLITE_INDEX_SQL,
+    }.get(schema_editor.connection.vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def remove_search_index(schema_editor):
+    statements = {
+        'postgresql': POSTGRES_DROP_SQL,
+        'sqlite': SQLITE_DROP_SQL,
+    }.get(schema_editor.connection.vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def search_terms(query):
+    """Split a raw search string into lowercase word terms."""
+    return TERM_RE.findall(query.lower())[:MAX_TERMS]
+
+
+def legacy_search(books, query):
+    """The original unindexed search, used on unsupported backends."""
+    return books.filter(
+        models.Q(title__icontains=query)
+        | models.Q(author__icontains=query)
+        | models.Q(category__icontains=query)
+        | models.Q(isbn__icontains=query)
+    )
+
+
+def isbn_fragment(query):
+    """The query without hyphens and spaces if it looks like part of an ISBN, else None."""
+    if not ISBN_FRAGMENT_RE.fullmatch(query):
+        return None
+    fragment = re.sub(r'[\s-]', '', query)
+    return fragment if len(fragment) >= MIN_ISBN_FRAGMENT else None
+
+
+def search_books(books, query):
+    """
+    Filter ``books`` to those matching ``query`` and annotate a
+    ``search_rank`` (higher is more relevant).
+    """
+    terms = search_terms(query)
+    vendor = connections[books.db].vendor
+    if not terms or vendor not in ('postgresql', 'sqlite'):
+        return legacy_search(books, query).annotate(
+            search_rank=models.Value(0.0, output_field=models.FloatField())
+        )
+
+    fragment = isbn_fragment(query)
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        matches = RawSQL(
+            "books_books.search_vector @@ to_tsquery('simple', %s)", (tsquery,), output_field=models.BooleanField()
+        )
+        rank = RawSQL(
+            "ts_rank(books_books.search_vector, to_tsquery('simple', %s))", (tsquery,),
+            output_field=models.FloatField(),
+        )
+    elif not fragment:
+        # Join the FTS table (through BookSearchEntry) instead of using a
+        # correlated subquery so that the MATCH (and bm25) is evaluated once
+        # per query rather than once per row.
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        return books.filter(search_entry__isnull=False).filter(
+            RawSQL(f"{FTS_TABLE} MATCH %s", (match,), output_field=models.BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f"-bm25({FTS_TABLE}, {weights})", (), output_field=models.FloatField())
+        )
+    else:
+        # An ISBN fragment may match outside the index, so rows can't be
+        # joined to it; full-text matches simply rank above the others.
+        match = ' '.join(f'"{term}"*' for term in terms)
+        matches = RawSQL(
+            f"books_books.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)", (match,),
+            output_field=models.BooleanField(),
+        )
+        rank = models.Case(
+            models.When(matches, then=models.Value(1.0)), default=models.Value(0.0),
+            output_field=models.FloatField(),
+        )
+
+    condition = models.Q(matches)
+    if fragment:
+        books = books.alias(isbn_digits=Replace('isbn', models.Value('-'), models.Value('')))
+        condition |= models.Q(isbn_digits__icontains=fragment)
+    return books.filter(condition).annotate(search_rank=rank)
@@ -0,0 +1,98 @@
+"""
+Streaming readers for StreamUploadBooksView.
+
+The upload is read straight from the request stream through a chain of
+generators (raw bytes -> optional gunzip -> text -> parsed rows), so only a
+buffer and the current import chunk are ever held in memory, whatever the
+size of the file.
+"""
+import csv
+import gzip
+import io
+import json
+
+from django.core.exceptions import ValidationError
+
+GZIP_MAGIC = b'\x1f\x8b'
+READ_BUFFER_SIZE = 64 * 1024
+
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/x-jsonlines': 'ndjson',
+}
+INPUT_FORMATS = ('csv', 'ndjson')
+
+
+class UploadError(Exception):
+    """The upload itself cannot be read any further (bad gzip, bad encoding)."""
+
+
+class RequestReader(io.RawIOBase):
+    """Expose an HTTP request body as a raw binary stream."""
+
+    def __init__(self, request):
+        self.request = request
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.request.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def input_format(content_type, requested=None):
+    """Pick ``csv`` or ``ndjson`` from ``?input=`` or the Content-Type; None if unknown."""
+    if requested:
+        return requested if requested in INPUT_FORMATS else None
+    media_type = (content_type or '').split(';')[0].strip().lower()
+    return CONTENT_TYPES.get(media_type)
+
+
+def open_text(request):
+    """Text stream over the request body, gunzipping it if it starts with the gzip magic."""
+    raw = io.BufferedReader(RequestReader(request), READ_BUFFER_SIZE)
+    if raw.peek(2)[:2] == GZIP_MAGIC:
+        raw = gzip.GzipFile(fileobj=raw, mode='rb')
+    return io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+
+
+def read_lines(text):
+    try:
+        yield from text
+    except (OSError, EOFError, UnicodeDecodeError) as exc:
+        # gzip.BadGzipFile is an OSError; a truncated gzip stream is an EOFError.
+        raise UploadError(f'Could not read upload: {exc}')
+
+
+def read_csv_rows(text):
+    """Yield one dict per CSV record, leaving empty cells out so defaults apply."""
+    reader = csv.DictReader(read_lines(text))
+    try:
+        for row in reader:
+            yield {
+                key.strip(): value for key, value in row.items()
+                if key is not None and value not in ('', None)
+            }
+    except csv.Error as exc:
+        raise UploadError(f'Malformed CSV at line {reader.line_num}: {exc}')
+
+
+def read_ndjson_rows(text):
+    """Yield one parsed object per non-blank line; a line that is not JSON yields a ValidationError."""
+    for line_number, line in enumerate(read_lines(text), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as exc:
+            # Passed through so the importer reports it as a failed row.
+            yield ValidationError(f'Invalid JSON on line {line_number}: {exc.msg}')
+
+
+READERS = {'csv': read_csv_rows, 'ndjson': read_ndjson_rows}
@@ -1,3 +1,533 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from urllib.parse import urlencode
 
-# Create your tests here.
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from hclBackend.benchmarking import analyze_tables
+from hclBackend.explain import QueryPlanAssertions, requires_postgresql
+from hclBackend.metrics import get_metrics
+from users.models import Student, User
+from .categories import category_counts, legacy_counts
+from .models import Books, CategoryCopiesChange
+
+
+def make_book(**overrides):
+    data = {
+        'title': 'Untitled',
+        'description': 'A book.',
+        'category': 'General',
+        'author': 'Anonymous',
+        'isbn': '0000000000000',
+        'available_copies': 1,
+    }
+    data.update(overrides)
+    return Books.objects.create(**data)
+
+
+class BookSearchTests(TestCase):
+    def setUp(self):
+        self.gatsby = make_book(
+            title='The Great Gatsby', author='F. Scott Fitzgerald', category='Fiction', isbn='0-7432-7356-5'
+        )
+        self.fitz_bio = make_book(
+            title='Some Sort of Epic Grandeur', author='Matthew Bruccoli', category='Gatsby Studies',
+            isbn='9781570034558',
+        )
+        self.clean_code = make_book(
+            title='Clean Code', author='Robert C. Martin', category='Technology', isbn='9780132350884'
+        )
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('list_books'), {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [book['id'] for book in response.json()['results']]
+
+    def test_prefix_match(self):
+        self.assertEqual(self.search('gats'), [self.gatsby.id, self.fitz_bio.id])
+        self.assertEqual(self.search('clea co'), [self.clean_code.id])
+
+    def test_title_outranks_category(self):
+        self.assertEqual(self.search('gatsby')[0], self.gatsby.id)
+
+    def test_isbn_match(self):
+        self.assertEqual(self.search('7432'), [self.gatsby.id])
+        self.assertEqual(self.search('0743273565'), [self.gatsby.id])
+        self.assertEqual(self.search('97801323'), [self.clean_code.id])
+
+    def test_isbn_fragments_match_anywhere(self):
+        self.assertEqual(self.search('0132350884'), [self.clean_code.id])
+        self.assertEqual(self.search('2350-884'), [self.clean_code.id])
+        self.assertEqual(self.search('27356'), [self.gatsby.id])
+        # Words are still matched as prefixes only
+        self.assertEqual(self.search('atsby'), [])
+
+    def test_explicit_ordering_overrides_rank(self):
+        self.assertEqual(self.search('gatsby', ordering='-id'), [self.fitz_bio.id, self.gatsby.id])
+
+    def test_index_follows_writes(self):
+        book = make_book(title='Dune', author='Frank Herbert', isbn='9780441172719')
+        self.assertEqual(self.search('dune'), [book.id])
+
+        self.client.put(
+            reverse('book_detail', args=[book.id]), {'title': 'Children of Dune'}, content_type='application/json'
+        )
+        self.assertEqual(self.search('children'), [book.id])
+
+        self.client.delete(reverse('book_detail', args=[book.id]))
+        self.assertEqual(self.search('dune'), [])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        ratings = [4.5, None, 3.0, 4.5, None, 3.0, 5.0, 4.5, 1.0, None, 3.0, 2.5]
+        for index, rating in enumerate(ratings):
+            make_book(
+                title=f'Book {index % 4}',
+                isbn=f'{index:013d}',
+                average_rating=rating,
+                published_year=None if index % 5 == 0 else str(1990 + index % 3),
+            )
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def expected_ids(self, ordering):
+        # Cursor pages sort NULLs last in both directions, with the id as tiebreaker.
+        field, descending = ordering.lstrip('-'), ordering.startswith('-')
+        books = list(Books.objects.all())
+        present = sorted((b for b in books if getattr(b, field) is not None),
+                         key=lambda b: (getattr(b, field), b.id), reverse=descending)
+        missing = sorted((b for b in books if getattr(b, field) is None), key=lambda b: b.id, reverse=descending)
+        return [b.id for b in present + missing]
+
+    def walk(self, ordering, page_size=5):
+        url, params = reverse('list_books'), {'cursor': '', 'ordering': ordering, 'page_size': page_size}
+        pages = []
+        while url:
+            data = self.get(url, params)
+            pages.append(data)
+            url, params = data['next'], None
+        return pages
+
+    def test_forward_and_backward_walks_match_ordering(self):
+        for ordering in ['id', '-id', 'title', '-title', 'published_year', '-published_year',
+                         'average_rating', '-average_rating']:
+            with self.subTest(ordering=ordering):
+                pages = self.walk(ordering)
+                forward = [book['id'] for page in pages for book in page['results']]
+                self.assertEqual(forward, self.expected_ids(ordering))
+                self.assertNotIn('count', pages[0])
+                self.assertIsNone(pages[0]['previous'])
+
+                backward = []
+                url = pages[-1]['previous']
+                while url:
+                    data = self.get(url)
+                    backward = [book['id'] for book in data['results']] + backward
+                    url = data['previous']
+                self.assertEqual(backward + [book['id'] for book in pages[-1]['results']], forward)
+
+    def test_deep_page_is_a_single_seek(self):
+        last_page = self.walk('-average_rating', page_size=3)[-1]
+        with CaptureQueriesContext(connection) as queries:
+            self.get(last_page['previous'])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('OFFSET', queries[0]['sql'].upper())
+        self.assertNotIn('COUNT(', queries[0]['sql'].upper())
+
+    def test_optional_count(self):
+        data = self.get(reverse('list_books'), {'cursor': '', 'count': 'true'})
+        self.assertEqual(data['count'], Books.objects.count())
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('list_books'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class BulkUploadTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create(username='librarian', role='administrator'))
+        self.existing = make_book(title='Old Title', isbn='1111111111111', available_copies=4)
+
+    def upload(self, rows, **params):
+        url = reverse('bulk_upload_books')
+        if params:
+            url = f'{url}?{urlencode(params)}'
+        return self.client.post(url, rows, format='json')
+
+    def test_per_row_report(self):
+        response = self.upload([
+            {'title': 'New', 'isbn': '2222222222222', 'num_pages': '120'},
+            {'title': 'No ISBN'},
+            {'title': 'Bad pages', 'isbn': '3333333333333', 'num_pages': 'many'},
+            {'title': 'Too long', 'isbn': '44444444444444'},
+            {'title': 'Again', 'isbn': '2222222222222'},
+            {'title': 'Clash', 'isbn': '1111111111111'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual((data['total'], data['created'], data['failed']), (6, 1, 5))
+        self.assertEqual([row['index'] for row in data['failed_books']], [1, 2, 3, 4, 5])
+        self.assertEqual(data['failed_books'][0]['error'], 'ISBN is required')
+        self.assertTrue(data['failed_books'][1]['error'].startswith('num_pages:'))
+        self.assertEqual(data['failed_books'][3]['error'], 'Duplicate ISBN in upload')
+        self.assertEqual(Books.objects.get(isbn='2222222222222').num_pages, 120)
+        self.assertEqual(Books.objects.count(), 2)
+
+    def test_all_failed_is_bad_request(self):
+        self.assertEqual(self.upload([{'title': 'No ISBN'}]).status_code, 400)
+        self.assertEqual(self.upload([{'isbn': '1'}], on_conflict='merge').status_code, 400)
+        self.assertEqual(self.upload([{'isbn': '1'}], batch_size='lots').status_code, 400)
+
+    def test_skip_conflicts(self):
+        response = self.upload([{'title': 'Replacement', 'isbn': '1111111111111'}], on_conflict='skip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['skipped_books'], [
+            {'id': self.existing.id, 'isbn': '1111111111111', 'title': 'Old Title'}
+        ])
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.title, 'Old Title')
+
+    def test_update_conflicts_keeps_missing_fields(self):
+        response = self.upload([
+            {'title': 'Replacement', 'isbn': '1111111111111'},
+            {'title': 'Fresh', 'isbn': '5555555555555'},
+        ], on_conflict='update')
+        data = response.json()
+        self.assertEqual((data['created'], data['updated']), (1, 1))
+        self.existing.refresh_from_db()
+        self.assertEqual((self.existing.title, self.existing.available_copies), ('Replacement', 4))
+
+    def test_queries_scale_with_batches_not_rows(self):
+        def count_queries(rows):
+            with CaptureQueriesContext(connection) as queries:
+                self.upload([{'title': f'Book {i}', 'isbn': f'9{i:012d}'} for i in rows], batch_size=50)
+            return len(queries)
+
+        self.assertEqual(count_queries(range(0, 10)), count_queries(range(10, 50)))
+        self.assertEqual(Books.objects.count(), 51)
+
+
+class StreamUploadTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create(username='librarian', role='administrator'))
+        make_book(title='Old Title', isbn='1111111111111')
+
+    def upload(self, body, content_type, **params):
+        url = reverse('stream_upload_books')
+        if params:
+            url = f'{url}?{urlencode(params)}'
+        response = self.client.post(url, body, content_type=content_type)
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_csv_reports_progress_and_row_errors(self):
+        body = (
+            'title,isbn,num_pages,available_copies\n'
+            'First,2222222222222,100,\n'
+            'No ISBN,,10,1\n'
+            'Bad pages,3333333333333,lots,1\n'
+            'Second,4444444444444,,2\n'
+        )
+        lines = self.upload(body.encode(), 'text/csv', batch_size=2)
+        self.assertEqual([line['type'] for line in lines], ['error', 'progress', 'error', 'progress', 'summary'])
+        self.assertEqual(lines[0]['index'], 1)
+        self.assertEqual(lines[2]['index'], 2)
+        self.assertEqual(lines[1]['total'], 2)
+        self.assertEqual(
+            {key: lines[-1][key] for key in ('total', 'created', 'failed')}, {'total': 4, 'created': 2, 'failed': 2}
+        )
+        second = Books.objects.get(isbn='4444444444444')
+        self.assertEqual((second.num_pages, second.available_copies), (0, 2))
+
+    def test_gzipped_ndjson(self):
+        body = '\n'.join([
+            json.dumps({'title': 'Replacement', 'isbn': '1111111111111'}),
+            '{not json',
+            '',
+            json.dumps({'title': 'Fresh', 'isbn': '5555555555555'}),
+        ])
+        lines = self.upload(gzip.compress(body.encode()), 'application/x-ndjson', on_conflict='skip')
+        self.assertEqual(lines[0]['error'], 'Invalid JSON on line 2: Expecting property name enclosed in double quotes')
+        self.assertEqual({key: lines[-1][key] for key in ('created', 'skipped', 'failed')},
+                         {'created': 1, 'skipped': 1, 'failed': 1})
+        self.assertEqual(Books.objects.get(isbn='1111111111111').title, 'Old Title')
+
+    def test_corrupt_gzip_is_fatal(self):
+        body = gzip.compress(b'{"title": "A", "isbn": "1"}\n' * 10)[:-12]
+        lines = self.upload(body, 'application/x-ndjson', input='ndjson')
+        self.assertEqual(lines[-1]['type'], 'fatal')
+
+    def test_unknown_format(self):
+        response = self.client.post(reverse('stream_upload_books'), b'<books/>', content_type='application/xml')
+        self.assertEqual(response.status_code, 415)
+
+
+class ExportBooksTests(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(User.objects.create(username='librarian', role='administrator'))
+        self.gatsby = make_book(title='The Great Gatsby', category='Fiction', isbn='1')
+        self.other = make_book(title='Gatsby Notes', category='Study', isbn='2', published_year=None)
+        self.unrelated = make_book(title='Clean Code', category='Technology', isbn='3')
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_books'), params)
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content)
+
+    def test_csv_uses_list_filters(self):
+        response, body = self.export(search='gatsby', category='Fiction')
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual([row['id'] for row in rows], [str(self.gatsby.id)])
+        self.assertEqual(rows[0]['isbn'], '1')
+
+    def test_ndjson_ordering(self):
+        _, body = self.export(output='ndjson', ordering='title')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['id'] for row in rows], [self.unrelated.id, self.other.id, self.gatsby.id])
+        self.assertIsNone(rows[1]['published_year'])
+
+    def test_gzip_on_request(self):
+        response = self.client.get(reverse('export_books'), {'output': 'ndjson'}, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        body = gzip.decompress(b''.join(response.streaming_content))
+        self.assertEqual(len(body.splitlines()), 3)
+
+    def test_bad_output_and_permissions(self):
+        self.assertEqual(self.client.get(reverse('export_books'), {'output': 'xml'}).status_code, 400)
+        self.client.force_authenticate(User.objects.create(username='reader', role='student'))
+        self.assertEqual(self.client.get(reverse('export_books')).status_code, 403)
+
+
+class CatalogCacheTests(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create(username='librarian', role='administrator')
+        self.book = make_book(title='Dune', category='Science Fiction', isbn='9780441172719', available_copies=2)
+
+    def get(self, url, query='', cached=True):
+        # A cached book list still reads its books' available copies
+        with self.assertNumQueries((1 if cached else 2) if url == reverse('list_books') else 0 if cached else 1):
+            response = self.client.get(f'{url}?{query}')
+        self.assertEqual(response['X-Cache'], 'HIT' if cached else 'MISS')
+        return response.json()
+
+    def test_equivalent_requests_share_an_entry(self):
+        url = reverse('list_books')
+        self.get(url, 'category=Science+Fiction&page=1', cached=False)
+        self.get(url, 'page=1&category=+Science+Fiction&profile=1')
+        self.get(url, 'page=1&page_size=5&category=Science+Fiction', cached=False)
+        self.get(reverse('category_list'), cached=False)
+        self.assertEqual(self.get(reverse('category_list')), ['Science Fiction'])
+        self.get(reverse('book_detail', args=[self.book.id]), cached=False)
+        self.assertEqual(self.get(reverse('book_detail', args=[self.book.id]))['title'], 'Dune')
+
+    def test_errors_are_not_cached(self):
+        for _ in range(2):
+            response = self.client.get(reverse('book_detail', args=[999]))
+            self.assertEqual((response.status_code, response['X-Cache']), (404, 'MISS'))
+
+    def test_writes_invalidate(self):
+        student = User.objects.create(username='reader', role='student')
+        Student.objects.create(user=student, roll_number='R1', is_approved=True)
+        detail = reverse('book_detail', args=[self.book.id])
+        self.get(detail, cached=False)
+
+        self.client.force_authenticate(self.admin)
+        self.client.put(detail, {'title': 'Dune Messiah'}, format='json')
+        self.assertEqual(self.get(detail, cached=False)['title'], 'Dune Messiah')
+
+        self.client.force_authenticate(student)
+        loan = self.client.post(reverse('borrow_book'), {'book_id': self.book.id}, format='json').json()
+        self.assertEqual(self.get(detail, cached=False)['available_copies'], 1)
+        self.client.post(reverse('return_book', args=[loan['id']]))
+        self.assertEqual(self.get(detail, cached=False)['available_copies'], 2)
+        self.client.post(reverse('batch_borrow'), {'book_ids': [self.book.id]}, format='json')
+        self.assertEqual(self.get(detail, cached=False)['available_copies'], 1)
+
+        self.client.force_authenticate(self.admin)
+        emma = {'title': 'Emma', 'description': '', 'author': 'Jane Austen', 'category': 'Classics', 'isbn': '1'}
+        self.client.post(reverse('add_book'), emma, format='json')
+        self.assertEqual(self.get(reverse('category_list'), cached=False), ['Classics', 'Science Fiction'])
+
+    def test_borrows_leave_the_catalog_cached(self):
+        student = User.objects.create(username='reader', role='student')
+        Student.objects.create(user=student, roll_number='R1', is_approved=True)
+        other = make_book(title='Emma', category='Classics', isbn='1', available_copies=1)
+        url = reverse('list_books')
+        self.get(url, cached=False)
+        self.client.get(url, {'facets': 'true'})
+        self.client.get(reverse('category_list'), {'counts': 'true'})
+        self.get(reverse('book_detail', args=[other.id]), cached=False)
+        etag = self.client.get(url)['ETag']
+
+        self.client.force_authenticate(student)
+        self.client.post(reverse('borrow_book'), {'book_id': self.book.id}, format='json')
+        self.client.force_authenticate(None)
+        books = self.get(url)['results']
+        self.assertEqual([book['available_copies'] for book in books], [1, 1])
+        facets = self.client.get(url, {'facets': 'true'})
+        self.assertEqual(facets['X-Cache'], 'HIT')
+        self.assertIn({'category': 'Science Fiction', 'count': 1, 'available_copies': 1}, facets.json()['facets'])
+        counts = self.client.get(reverse('category_list'), {'counts': 'true'})
+        self.assertEqual(counts['X-Cache'], 'HIT')
+        self.assertIn({'name': 'Science Fiction', 'book_count': 1, 'available_copies': 1}, counts.json())
+        self.assertEqual(self.get(reverse('book_detail', args=[other.id]))['available_copies'], 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_conditional_get(self):
+        url = reverse('book_detail', args=[self.book.id])
+        response = self.client.get(url)
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        with self.assertNumQueries(0):
+            cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((cached.status_code, cached['ETag']), (304, etag))
+        self.assertEqual(self.client.get(url, {'page': 1}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        since = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(since.status_code, 304)
+
+        self.client.force_authenticate(self.admin)
+        self.client.put(url, {'num_pages': 412}, format='json')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_conditional_get_of_a_list(self):
+        # Lists read their copies afresh, so they are validated by their body
+        url = reverse('list_books')
+        etag = self.client.get(url, {'search': 'dune'})['ETag']
+        with self.assertNumQueries(1):
+            cached = self.client.get(url, {'search': 'dune'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((cached.status_code, cached['ETag']), (304, etag))
+        self.assertNotIn('Last-Modified', cached)
+        Books.objects.filter(id=self.book.id).update(available_copies=5)
+        self.assertEqual(self.client.get(url, {'search': 'dune'}, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_hits_and_misses_are_counted(self):
+        lookups = get_metrics().cache_lookups
+        before = lookups[('catalog', 'hit')], lookups[('catalog', 'miss')]
+        for _ in range(3):
+            self.client.get(reverse('category_list'))
+        self.assertEqual((lookups[('catalog', 'hit')] - before[0], lookups[('catalog', 'miss')] - before[1]), (2, 1))
+
+    def test_file_based_cache(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        backend = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory}
+        with override_settings(CACHES={'default': backend}):
+            self.get(reverse('category_list'), cached=False)
+            self.get(reverse('category_list'))
+            self.assertTrue(os.listdir(directory))
+
+
+class CategoryIndexTests(APITestCase):
+    def setUp(self):
+        self.fiction = make_book(title='Emma', category='Fiction', isbn='1', available_copies=2)
+        Books.objects.bulk_create([
+            Books(title='Dune', description='', category=' fiction ', author='Frank Herbert', isbn='2',
+                  available_copies=1),
+            Books(title='Cosmos', description='', category='Science', author='Carl Sagan', isbn='3',
+                  available_copies=4),
+            Books(title='Untitled', description='', category='  ', author='Nobody', isbn='4'),
+        ])
+
+    def assertIndexMatchesCatalog(self):
+        self.assertEqual(category_counts(), sorted(legacy_counts(Books.objects.all()), key=lambda row: row['name']))
+
+    def test_counts_follow_every_write_path(self):
+        self.assertEqual(category_counts(), [
+            {'name': 'Fiction', 'book_count': 2, 'available_copies': 3},
+            {'name': 'Science', 'book_count': 1, 'available_copies': 4},
+        ])
+        Books.objects.filter(isbn='3').update(available_copies=F('available_copies') - 1)
+        self.fiction.category = 'Classics'
+        self.fiction.save()
+        Books.objects.filter(isbn='2').delete()
+        self.assertEqual(category_counts(), [
+            {'name': 'Classics', 'book_count': 1, 'available_copies': 2},
+            {'name': 'Science', 'book_count': 1, 'available_copies': 3},
+        ])
+        self.assertIndexMatchesCatalog()
+
+        # A category that emptied out comes back under its new spelling
+        Books.objects.filter(isbn='4').update(category='FICTION')
+        self.assertEqual([row['name'] for row in category_counts()], ['Classics', 'FICTION', 'Science'])
+        self.assertIndexMatchesCatalog()
+
+    @requires_postgresql
+    def test_copy_updates_leave_the_index_alone(self):
+        def row_version():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT xmin::text FROM books_category WHERE normalized_name = 'fiction'")
+                return cursor.fetchone()[0]
+
+        before = row_version()
+        Books.objects.filter(category__iexact='fiction').update(available_copies=F('available_copies') - 1)
+        self.fiction.refresh_from_db()
+        self.fiction.title = 'Emma (annotated)'
+        self.fiction.save()
+        self.assertEqual(row_version(), before)
+        self.assertEqual(CategoryCopiesChange.objects.count(), 1)
+        # Reading the counts folds the change in
+        self.assertEqual(category_counts()[0], {'name': 'Fiction', 'book_count': 2, 'available_copies': 2})
+        self.assertFalse(CategoryCopiesChange.objects.exists())
+
+    def test_category_list_is_one_indexed_read(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse('category_list')).json(), ['Fiction', 'Science'])
+        # Copies changes waiting to be folded in cost one more statement
+        with CaptureQueriesContext(connection) as queries:
+            counts = self.client.get(reverse('category_list'), {'counts': 'true'}).json()
+        self.assertEqual(counts[0], {'name': 'Fiction', 'book_count': 2, 'available_copies': 3})
+        self.assertNotIn('books_books', ' '.join(query['sql'] for query in queries.captured_queries))
+
+    def test_facets(self):
+        facets = self.client.get(reverse('list_books'), {'facets': 'true'}).json()['facets']
+        self.assertEqual(facets, [
+            {'category': 'Fiction', 'count': 2, 'available_copies': 3},
+            {'category': 'Science', 'count': 1, 'available_copies': 4},
+        ])
+        facets = self.client.get(reverse('list_books'), {'facets': 'true', 'search': 'dune'}).json()['facets']
+        self.assertEqual(facets, [{'category': 'Fiction', 'count': 1, 'available_copies': 1}])
+        self.assertNotIn('facets', self.client.get(reverse('list_books')).json())
+
+
+@requires_postgresql
+class BooksQueryPlanTests(QueryPlanAssertions, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Books.objects.bulk_create([
+            Books(title=f'Title {i % 997}', description='', category=f'Category {i % 25}', author=f'Author {i % 50}',
+                  isbn=f'{i:013d}', published_year=str(1950 + i % 70), average_rating=i % 50 / 10,
+                  available_copies=i % 4)
+            for i in range(3000)
+        ])
+        analyze_tables(Books._meta.db_table)
+
+    def test_catalog_queries_use_indexes(self):
+        book = Books.objects.first()
+        with self.assertNoSequentialScans():
+            self.client.get(reverse('list_books'))
+            self.client.get(reverse('list_books'), {'category': 'Category 3'})
+            self.client.get(reverse('list_books'), {'search': 'title 12'})
+            for field in ['title', 'published_year', 'average_rating']:
+                for ordering in [field, f'-{field}']:
+                    self.client.get(reverse('list_books'), {'ordering': ordering})
+                    # First keyset page, then a seek forwards and one backwards
+                    page = self.client.get(reverse('list_books'), {'ordering': ordering, 'cursor': ''}).json()
+                    page = self.client.get(page['next']).json()
+                    self.client.get(page['previous'])
+            self.client.get(reverse('book_detail', args=[book.id]))
+            self.client.get(reverse('category_list'))
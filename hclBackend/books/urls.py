@@ -1,9 +1,14 @@
 from django.urls import path
-from .views import AddBook, ListBooksView, BookDetailView, BulkUploadBooksView, CategoryListView
+from .views import (
+    AddBook, ListBooksView, BookDetailView, BulkUploadBooksView, CategoryListView, StreamUploadBooksView,
+    ExportBooksView
+)
 urlpatterns = [
     path('list/', ListBooksView.as_view(), name='list_books'),
+    path('export/', ExportBooksView.as_view(), name='export_books'),
     path('categories/', CategoryListView.as_view(), name='category_list'),
     path('add/', AddBook.as_view(), name='add_book'),
     path('detail/<int:book_id>/', BookDetailView.as_view(), name='book_detail'),
     path('bulk-upload/', BulkUploadBooksView.as_view(), name='bulk_upload_books'),
+    path('bulk-upload/stream/', StreamUploadBooksView.as_view(), name='stream_upload_books'),
 ]
@@ -1,51 +1,95 @@
-from django.db import models
+import json
+
+from django.http import StreamingHttpResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from users.permissions import IsAdministrator
 from rest_framework.pagination import PageNumberPagination
+from hclBackend.caching import CATALOG, DASHBOARD, book_version, bump_version, versioned_response
+from hclBackend.exporting import EXPORT_FORMATS, export_response
+from hclBackend.pagination import KeysetPaginationMixin
 from rest_framework.filters import SearchFilter, OrderingFilter
+from .categories import category_counts, category_names, facet_counts
 from .models import Books
+from .importing import DEFAULT_BATCH_SIZE, MAX_BATCH_SIZE, ON_CONFLICT_CHOICES, import_books, iter_import
+from .search import search_books
+from .streaming import READERS, UploadError, input_format, open_text
 
 
-class BooksPagination(PageNumberPagination):
+class BooksPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
+def filter_books(params):
+    """The catalog filtered and ordered by ListBooksView's query parameters."""
+    books = Books.objects.all()
+
+    # Apply filtering
+    search_query = params.get('search', '').strip()
+    if search_query:
+        books = search_books(books, search_query)
+
+    category = params.get('category')
+    if category:
+        books = books.filter(category=category)
+
+    ordering = params.get('ordering')
+    if ordering:
+        # Validate ordering field
+        allowed_fields = [
+            'id', 'title', 'published_year', 'average_rating', '-id', '-title', '-published_year', '-average_rating',
+        ]
+        if ordering in allowed_fields:
+            books = books.order_by(ordering)
+    elif search_query and 'cursor' not in params:
+        books = books.order_by('-search_rank', '-id')  # Most relevant first
+    else:
+        # Relevance can't be seeked on, so cursor pages of search results are newest first too
+        books = books.order_by('-id')  # Default to newest
+    return books
+
+
+def is_filtered(params):
+    return bool(params.get('search', '').strip() or params.get('category'))
+
+
+def fresh_copies(request, data):
+    """
+    Read a cached book list's available copies again: borrows and returns
+    change them without bumping CATALOG. Facets of the whole catalog come
+    from the category index; filtered facets keep their cached copy totals.
+    """
+    ids = [book['id'] for book in data['results']]
+    copies = dict(Books.objects.filter(id__in=ids).values_list('id', 'available_copies')) if ids else {}
+    for book in data['results']:
+        book['available_copies'] = copies.get(book['id'], book['available_copies'])
+    if 'facets' in data and not is_filtered(request.query_params):
+        data['facets'] = facet_counts(Books.objects.all(), False)
+    return data
+
+
+def fresh_category_counts(request, data):
+    """Read ``?counts`` again from the category index, whose copy counts follow borrows and returns."""
+    return category_counts() if counts_requested(request) else data
+
+
+def counts_requested(request):
+    return request.query_params.get('counts', '').lower() in ('1', 'true', 'yes')
+
+
 class ListBooksView(APIView):
     permission_classes = [AllowAny]
     filter_backends = [SearchFilter, OrderingFilter]
     search_fields = ['title', 'author', 'category', 'isbn']
     ordering_fields = ['id', 'title', 'published_year', 'average_rating']
 
+    @versioned_response(CATALOG, 'CATALOG_CACHE_TTL', fresh=fresh_copies)
     def get(self, request):
-        books = Books.objects.all()
-        
-        # Apply filtering
-        search_query = request.query_params.get('search')
-        if search_query:
-            books = books.filter(
-                models.Q(title__icontains=search_query) |
-                models.Q(author__icontains=search_query) |
-                models.Q(category__icontains=search_query) |
-                models.Q(isbn__icontains=search_query)
-            )
-        
-        category = request.query_params.get('category')
-        if category:
-            books = books.filter(category=category)
-
-        ordering = request.query_params.get('ordering')
-        if ordering:
-            # Validate ordering field
-            allowed_fields = ['id', 'title', 'published_year', 'average_rating', '-id', '-title', '-published_year', '-average_rating']
-            if ordering in allowed_fields:
-                books = books.order_by(ordering)
-        else:
-            books = books.order_by('-id') # Default to newest
+        books = filter_books(request.query_params)
 
         paginator = BooksPagination()
         paginated_books = paginator.paginate_queryset(books, request)
@@ -67,7 +111,36 @@ class ListBooksView(APIView):
             for book in paginated_books
         ]
         
-        return paginator.get_paginated_response(books_data)
+        response = paginator.get_paginated_response(books_data)
+        # ?facets=true adds category counts for the whole filtered result
+        if request.query_params.get('facets', '').lower() in ('1', 'true', 'yes'):
+            response.data['facets'] = facet_counts(books, is_filtered(request.query_params))
+        return response
+
+
+class ExportBooksView(APIView):
+    """Stream the catalog as ?output=csv|ndjson, filtered like ListBooksView."""
+    permission_classes = [IsAdministrator]
+    columns = {
+        'id': 'id',
+        'title': 'title',
+        'description': 'description',
+        'category': 'category',
+        'thumbnail': 'thumbnail',
+        'num_pages': 'num_pages',
+        'average_rating': 'average_rating',
+        'author': 'author',
+        'isbn': 'isbn',
+        'published_year': 'published_year',
+        'available_copies': 'available_copies',
+    }
+
+    def get(self, request):
+        output = request.query_params.get('output', 'csv')
+        if output not in EXPORT_FORMATS:
+            return Response({'error': 'output must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(request, filter_books(request.query_params), self.columns, 'books', output)
+
 
 class AddBook(APIView):
     permission_classes = [AllowAny]
@@ -85,11 +158,13 @@ class AddBook(APIView):
             published_year=data.get('published_year'),
             available_copies=data.get('available_copies', 0)
         )
+        bump_version(CATALOG, DASHBOARD)
         return Response({'message': 'Book added successfully', 'book_id': book.id})
 
 class BookDetailView(APIView):
     permission_classes = [AllowAny] # Following user's pattern for AddBook
 
+    @versioned_response(lambda request, book_id: [CATALOG, book_version(book_id)], 'CATALOG_CACHE_TTL')
     def get(self, request, book_id):
         try:
             book = Books.objects.get(id=book_id)
@@ -127,6 +202,7 @@ class BookDetailView(APIView):
             book.available_copies = data.get('available_copies', book.available_copies)
             
             book.save()
+            bump_version(CATALOG, DASHBOARD)
             return Response({'message': 'Book updated successfully'})
         except Books.DoesNotExist:
             return Response({'error': 'Book not found'}, status=404)
@@ -135,11 +211,24 @@ class BookDetailView(APIView):
         try:
             book = Books.objects.get(id=book_id)
             book.delete()
+            bump_version(CATALOG, DASHBOARD)
             return Response({'message': 'Book deleted successfully'})
         except Books.DoesNotExist:
             return Response({'error': 'Book not found'}, status=404)
 
 
+def import_options(request):
+    """Read ``?on_conflict`` and ``?batch_size``; returns ``(on_conflict, batch_size, error)``."""
+    on_conflict = request.query_params.get('on_conflict', 'error')
+    if on_conflict not in ON_CONFLICT_CHOICES:
+        return None, None, f'on_conflict must be one of: {", ".join(ON_CONFLICT_CHOICES)}'
+    try:
+        batch_size = int(request.query_params.get('batch_size', DEFAULT_BATCH_SIZE))
+    except ValueError:
+        return None, None, 'batch_size must be an integer'
+    return on_conflict, min(max(batch_size, 1), MAX_BATCH_SIZE), None
+
+
 class BulkUploadBooksView(APIView):
     permission_classes = [IsAdministrator]
     
@@ -157,69 +246,93 @@ class BulkUploadBooksView(APIView):
                 {'error': 'At least one book is required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        created_books = []
-        failed_books = []
-        
-        for idx, book_data in enumerate(books_data):
-            try:
-                if not book_data.get('isbn'):
-                    failed_books.append({
-                        'index': idx,
-                        'title': book_data.get('title', 'Unknown'),
-                        'error': 'ISBN is required'
-                    })
-                    continue
-                
-                book = Books.objects.create(
-                    title=book_data.get('title', ''),
-                    description=book_data.get('description', ''),
-                    category=book_data.get('category', ''),
-                    thumbnail=book_data.get('thumbnail', ''),
-                    num_pages=book_data.get('num_pages', 0),
-                    average_rating=book_data.get('average_rating', 0.0),
-                    author=book_data.get('author', ''),
-                    isbn=book_data.get('isbn'),
-                    published_year=book_data.get('published_year', ''),
-                    available_copies=book_data.get('available_copies', 0)
-                )
-                created_books.append({
-                    'id': book.id,
-                    'isbn': book.isbn,
-                    'title': book.title
-                })
-            except Exception as e:
-                failed_books.append({
-                    'index': idx,
-                    'title': book_data.get('title', 'Unknown'),
-                    'isbn': book_data.get('isbn', 'Unknown'),
-                    'error': str(e)
-                })
-        
+
+        on_conflict, batch_size, error = import_options(request)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = import_books(books_data, on_conflict=on_conflict, batch_size=batch_size)
+        if report['created_books'] or report['updated_books']:
+            bump_version(CATALOG, DASHBOARD)
+            response_status = status.HTTP_201_CREATED
+        elif report['failed_books']:
+            response_status = status.HTTP_400_BAD_REQUEST
+        else:
+            response_status = status.HTTP_200_OK
+
         return Response({
             'message': 'Bulk upload completed',
-            'total': len(books_data),
-            'created': len(created_books),
-            'failed': len(failed_books),
-            'created_books': created_books,
-            'failed_books': failed_books
-        }, status=status.HTTP_201_CREATED if len(created_books) > 0 else status.HTTP_400_BAD_REQUEST)
+            'total': report['total'],
+            'created': len(report['created_books']),
+            'updated': len(report['updated_books']),
+            'skipped': len(report['skipped_books']),
+            'failed': len(report['failed_books']),
+            'created_books': report['created_books'],
+            'updated_books': report['updated_books'],
+            'skipped_books': report['skipped_books'],
+            'failed_books': report['failed_books']
+        }, status=response_status)
+
+
+class StreamUploadBooksView(APIView):
+    """
+    Import a CSV or NDJSON catalog (optionally gzipped) straight off the request stream.
+
+    The response is NDJSON written as the import runs: an ``error`` line per
+    rejected row, a ``progress`` line with running totals after each committed
+    chunk, and a final ``summary`` line (or ``fatal`` if the upload could not be
+    read to the end; chunks committed before that are kept).
+    """
+    permission_classes = [IsAdministrator]
+
+    def post(self, request):
+        input_type = input_format(request.content_type, request.query_params.get('input'))
+        if input_type is None:
+            return Response(
+                {'error': 'Send text/csv or application/x-ndjson, or pass ?input=csv|ndjson'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        on_conflict, batch_size, error = import_options(request)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = READERS[input_type](open_text(request))
+        response = StreamingHttpResponse(
+            self.stream_progress(rows, on_conflict, batch_size), content_type='application/x-ndjson'
+        )
+        # Ask proxies to pass progress lines through as they are written.
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def stream_progress(self, rows, on_conflict, batch_size):
+        totals = {'total': 0, 'created': 0, 'updated': 0, 'skipped': 0, 'failed': 0}
+        try:
+            for result in iter_import(rows, on_conflict, batch_size):
+                totals['total'] += result['rows']
+                for outcome in ('created', 'updated', 'skipped', 'failed'):
+                    totals[outcome] += len(result[outcome])
+                if result['created'] or result['updated']:
+                    bump_version(CATALOG, DASHBOARD)
+                for failure in result['failed']:
+                    yield ndjson_line({'type': 'error', **failure})
+                yield ndjson_line({'type': 'progress', **totals})
+        except UploadError as exc:
+            yield ndjson_line({'type': 'fatal', 'error': str(exc), **totals})
+            return
+        yield ndjson_line({'type': 'summary', 'message': 'Bulk upload completed', **totals})
+
+
+def ndjson_line(payload):
+    return json.dumps(payload, default=str) + '\n'
 
 
 class CategoryListView(APIView):
     permission_classes = [AllowAny]
 
+    @versioned_response(CATALOG, 'CATALOG_CACHE_TTL', fresh=fresh_category_counts)
     def get(self, request):
-        # Fetch all non-null categories
-        raw_categories = Books.objects.values_list('category', flat=True).exclude(category__isnull=True)
-        
-        # Normalize: Trim and handle case-insensitive uniqueness
-        unique_map = {}
-        for cat in raw_categories:
-            trimmed = cat.strip()
-            if trimmed:
-                unique_map[trimmed.lower()] = trimmed
-        
-        # Return as a sorted list
-        categories_list = sorted(unique_map.values())
-        return Response(categories_list)
\ No newline at end of file
+        # Read from the trigger-maintained category index (books.categories);
+        # ?counts=true adds each category's book and available-copy counts.
+        if counts_requested(request):
+            return Response(category_counts())
+        return Response(category_names())
@@ -4,7 +4,9 @@ from .models import BorrowRecord
 
 @admin.register(BorrowRecord)
 class BorrowRecordAdmin(admin.ModelAdmin):
-    list_display = ['user_id', 'book_id', 'borrow_date', 'return_date', 'status', 'fine_amount']
+    list_display = ['user', 'book', 'borrow_date', 'return_date', 'status', 'fine_amount']
     list_filter = ['status', 'borrow_date', 'return_date']
-    search_fields = ['user_id', 'book_id']
+    list_select_related = ['user', 'book']
+    search_fields = ['user__username', 'book__title', 'book__isbn']
+    raw_id_fields = ['user', 'book']
     readonly_fields = ['created_at']
\ No newline at end of file
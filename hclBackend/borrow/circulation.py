@@ -0,0 +1,142 @@
+"""
+Batched checkout and return for BatchBorrowView and BatchReturnView.
+
+A batch costs the same handful of queries whatever its size. Borrowing
+reads the requested books and the user's active loans once, to turn
+missing, sold-out and already-held books away before any write. Then, in
+one transaction, it locks the books that still have copies (in id order,
+so concurrent batches can't deadlock), takes one copy of each with a
+single UPDATE, and inserts the loans with one ``bulk_create``. Returning
+locks the active loans and closes them with one UPDATE, setting each
+fine from its due date as the overdue sweep does. It then puts the
+copies back with one UPDATE per distinct number of copies returned,
+usually just one.
+
+Each item gets an outcome, in request order:
+
+- borrow: ``borrowed``, ``not_found``, ``unavailable``, ``already_borrowed``, ``duplicate``
+- return: ``returned``, ``not_found`` (unknown, someone else's, or already returned), ``duplicate``
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, Value, When
+from django.utils import timezone
+
+from books.models import Books
+from .fines import late_fine
+from .models import BorrowRecord
+
+# Most books or loans a single batch may name
+MAX_BATCH_ITEMS = 100
+LOAN_DAYS = 14
+
+
+def borrow_books(user_id, book_ids):
+    """Borrow each of ``book_ids`` for ``user_id``; returns one result dict per id."""
+    unique_ids = list(dict.fromkeys(book_ids))
+    available = dict(Books.objects.filter(id__in=unique_ids).values_list('id', 'available_copies'))
+    outcomes, loans = {}, {}
+
+    # A loan of the same book can be created concurrently, failing the
+    # insert; the transaction is rolled back, so read the user's loans again.
+    for _ in range(2):
+        held = set(BorrowRecord.objects.filter(
+            user_id=user_id, book_id__in=unique_ids, status__in=BorrowRecord.ACTIVE_STATUSES
+        ).values_list('book_id', flat=True))
+        for book_id in unique_ids:
+            if book_id not in available:
+                outcomes[book_id] = 'not_found'
+            elif book_id in held:
+                outcomes[book_id] = 'already_borrowed'
+            elif available[book_id] <= 0:
+                outcomes[book_id] = 'unavailable'
+        candidates = [book_id for book_id in unique_ids if book_id not in outcomes]
+        if not candidates:
+            break
+        try:
+            with transaction.atomic():
+                loans = take_copies(user_id, candidates)
+            break
+        except IntegrityError:
+            outcomes = {}
+    else:
+        outcomes.update((book_id, 'already_borrowed') for book_id in candidates)
+
+    results, seen = [], set()
+    for book_id in book_ids:
+        if book_id in seen:
+            results.append({'book_id': book_id, 'status': 'duplicate'})
+            continue
+        seen.add(book_id)
+        loan = loans.get(book_id)
+        if loan is None:
+            results.append({'book_id': book_id, 'status': outcomes.get(book_id, 'unavailable')})
+        else:
+            results.append({'book_id': book_id, 'status': 'borrowed', 'id': loan.id, 'due_date': loan.due_date})
+    return results
+
+
+def take_copies(user_id, book_ids):
+    """Take one copy of each book that still has one and lend it to ``user_id``; returns ``{book_id: loan}``."""
+    takeable = list(Books.objects.select_for_update().filter(
+        id__in=book_ids, available_copies__gt=0
+    ).order_by('id').values_list('id', flat=True))
+    if not takeable:
+        return {}
+    Books.objects.filter(id__in=takeable).update(available_copies=F('available_copies') - 1)
+    due_date = timezone.now().date() + timedelta(days=LOAN_DAYS)
+    loans = BorrowRecord.objects.bulk_create([
+        BorrowRecord(user_id=user_id, book_id=book_id, status='borrowed', due_date=due_date)
+        for book_id in takeable
+    ])
+    return {loan.book_id: loan for loan in loans}
+
+
+def return_loans(loans, borrow_ids):
+    """
+    Return each of ``borrow_ids`` that is an active loan in the ``loans``
+    queryset; returns ``(results, user_ids, book_ids)``: the borrowers whose
+    loans changed and the books whose copies came back.
+    """
+    unique_ids = list(dict.fromkeys(borrow_ids))
+    today = timezone.now().date()
+    with transaction.atomic():
+        active = list(loans.select_for_update().filter(
+            id__in=unique_ids, status__in=BorrowRecord.ACTIVE_STATUSES
+        ).order_by('id').values_list('id', 'user_id', 'book_id', 'due_date'))
+        if active:
+            fines = {loan_id: late_fine(due_date, today) for loan_id, _, _, due_date in active}
+            fine = Case(
+                *[When(due_date=due_date, then=Value(late_fine(due_date, today)))
+                  for due_date in {due_date for *_, due_date in active}],
+                default=Value(late_fine(None, today)),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )
+            BorrowRecord.objects.filter(id__in=list(fines)).update(
+                status='returned', return_date=today, fine_amount=fine
+            )
+            return_copies(Counter(book_id for _, _, book_id, _ in active if book_id is not None))
+
+    returned = {loan_id: fines[loan_id] for loan_id, *_ in active}
+    results, seen = [], set()
+    for borrow_id in borrow_ids:
+        if borrow_id in seen:
+            results.append({'borrow_id': borrow_id, 'status': 'duplicate'})
+        elif borrow_id in returned:
+            results.append({'borrow_id': borrow_id, 'status': 'returned', 'fine_amount': str(returned[borrow_id])})
+        else:
+            results.append({'borrow_id': borrow_id, 'status': 'not_found'})
+        seen.add(borrow_id)
+    user_ids = {user_id for _, user_id, _, _ in active}
+    return results, user_ids, {book_id for _, _, book_id, _ in active if book_id is not None}
+
+
+def return_copies(copies):
+    """Put ``{book_id: copies}`` back on the shelf, one UPDATE per distinct number of copies."""
+    by_count = defaultdict(list)
+    for book_id, count in copies.items():
+        by_count[count].append(book_id)
+    for count, book_ids in by_count.items():
+        Books.objects.filter(id__in=book_ids).update(available_copies=F('available_copies') + count)
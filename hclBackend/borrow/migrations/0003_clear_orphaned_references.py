@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+def clear_orphaned_references(apps, schema_editor):
+    """
+    Prepare for the foreign keys added in 0004: books deleted through
+    BookDetailView left records pointing at missing ids, so those lose their
+    book reference; records of users that no longer exist are removed.
+    """
+    BorrowRecord = apps.get_model('borrow', 'BorrowRecord')
+    Books = apps.get_model('books', 'Books')
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+
+    BorrowRecord.objects.exclude(
+        book_id__in=Books.objects.values('id')
+    ).exclude(book_id__isnull=True).update(book_id=None)
+    BorrowRecord.objects.exclude(user_id__in=User.objects.values('id')).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrow', '0002_borrowrecord_due_date'),
+        ('books', '0003_books_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='borrowrecord',
+            name='book_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(clear_orphaned_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrow', '0003_clear_orphaned_references'),
+        ('books', '0003_books_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='borrowrecord',
+            old_name='user_id',
+            new_name='user',
+        ),
+        migrations.AlterField(
+            model_name='borrowrecord',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='borrow_records', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RenameField(
+            model_name='borrowrecord',
+            old_name='book_id',
+            new_name='book',
+        ),
+        migrations.AlterField(
+            model_name='borrowrecord',
+            name='book',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='borrow_records', to='books.books'),
+        ),
+    ]
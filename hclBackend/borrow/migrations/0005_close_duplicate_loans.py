@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+
+def close_duplicate_loans(apps, schema_editor):
+    """
+    The old read-then-write borrow could record the same active loan twice.
+    Keep the oldest loan of each duplicate set, mark the others returned and
+    give their copies back so that unique_active_borrow can be created.
+    """
+    BorrowRecord = apps.get_model('borrow', 'BorrowRecord')
+    Books = apps.get_model('books', 'Books')
+
+    active = BorrowRecord.objects.filter(status__in=['borrowed', 'overdue'], book__isnull=False)
+    duplicates = active.values('user_id', 'book_id').annotate(
+        first_id=Min('id'), loans=Count('id')
+    ).filter(loans__gt=1)
+
+    today = timezone.now().date()
+    for duplicate in duplicates:
+        closed = active.filter(
+            user_id=duplicate['user_id'], book_id=duplicate['book_id']
+        ).exclude(id=duplicate['first_id']).update(status='returned', return_date=today)
+        Books.objects.filter(id=duplicate['book_id']).update(available_copies=F('available_copies') + closed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrow', '0004_borrowrecord_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(close_duplicate_loans, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('borrow', '0005_close_duplicate_loans'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='borrowrecord',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['borrowed', 'overdue'])), fields=('user', 'book'), name='unique_active_borrow'),
+        ),
+    ]
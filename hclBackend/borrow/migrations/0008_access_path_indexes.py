@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+from hclBackend.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('books', '0004_access_path_indexes'),
+        ('borrow', '0007_borrow_status_due_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='borrowrecord',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='borrow_user_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='borrowrecord',
+            index=models.Index(fields=['user', 'status', 'created_at', 'id'], name='borrow_user_status_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='borrowrecord',
+            index=models.Index(fields=['created_at', 'id'], name='borrow_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='borrowrecord',
+            index=models.Index(condition=models.Q(('status__in', ['borrowed', 'overdue'])), fields=['status', 'user'], name='borrow_active_idx'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.db import models
 
 # Create your models here.
@@ -8,8 +9,22 @@ class BorrowRecord(models.Model):
         ('returned', 'Returned'),
         ('overdue', 'Overdue'),
     ]
-    user_id = models.IntegerField()
-    book_id = models.IntegerField()
+    # Loans whose copy is still out of the library
+    ACTIVE_STATUSES = ('borrowed', 'overdue')
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='borrow_records'
+    )
+    # Nullable so that deleting a book keeps its borrowing history
+    book = models.ForeignKey(
+        'books.Books',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='borrow_records'
+    )
     borrow_date = models.DateField(auto_now_add=True)
     due_date = models.DateField(null=True, blank=True)
     return_date = models.DateField(null=True, blank=True)
@@ -17,5 +32,29 @@ class BorrowRecord(models.Model):
     status = models.CharField(max_length=20, choices=STATUS, default='borrowed')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Overdue sweeps and overdue listings: status = ... ordered/filtered by due_date
+            models.Index(fields=['status', 'due_date'], name='borrow_status_due_idx'),
+            # A user's loans newest first, optionally by status (borrow list, history, stats)
+            models.Index(fields=['user', 'created_at', 'id'], name='borrow_user_created_idx'),
+            models.Index(fields=['user', 'status', 'created_at', 'id'], name='borrow_user_status_idx'),
+            # Everyone's loans newest first (admin borrow list, dashboard recent borrows)
+            models.Index(fields=['created_at', 'id'], name='borrow_created_idx'),
+            # Active loans only: dashboard counts and active borrowers
+            models.Index(
+                fields=['status', 'user'],
+                condition=models.Q(status__in=['borrowed', 'overdue']),
+                name='borrow_active_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'book'],
+                condition=models.Q(status__in=['borrowed', 'overdue']),
+                name='unique_active_borrow',
+            ),
+        ]
+
     def __str__(self):
         return f"User {self.user_id} borrowed Book {self.book_id}"
\ No newline at end of file
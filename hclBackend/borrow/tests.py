@@ -1,3 +1,426 @@
-from django.test import TestCase
+import io
+import json
+import random
+import threading
+import unittest
+from datetime import timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, Sum
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient, APITestCase
+
+from books.models import Books
+from hclBackend.benchmarking import analyze_tables
+from hclBackend.dataset import Dataset
+from hclBackend.explain import QueryPlanAssertions, requires_postgresql
+from hclBackend.factories import make_books, make_records, make_student
+from users.models import Student, User
+from .circulation import MAX_BATCH_ITEMS
+from .models import BorrowRecord
+
+
+class BorrowQueryCountTests(APITestCase):
+    """Listing endpoints must run a fixed number of queries whatever the page size."""
+
+    def setUp(self):
+        self.student = make_student('reader')
+        self.client.force_authenticate(self.student)
+
+    def assertConstantQueries(self, url, expected, params=None):
+        make_records(self.student, make_books(2))
+        with self.assertNumQueries(expected):
+            self.client.get(url, params)
+        make_records(self.student, make_books(8, start=2), overdue=True)
+        with self.assertNumQueries(expected):
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_borrow_list(self):
+        data = self.assertConstantQueries(reverse('borrow_book'), 2, {'page_size': 10})
+        self.assertEqual(len(data['results']), 10)
+        self.assertEqual(data['results'][0]['book']['title'], 'Book 9')
+
+    def test_borrow_list_cursor_mode_skips_count(self):
+        data = self.assertConstantQueries(reverse('borrow_book'), 1, {'cursor': '', 'page_size': 10})
+        self.assertEqual(len(data['results']), 10)
+
+    def test_history(self):
+        data = self.assertConstantQueries(reverse('borrow_history'), 2, {'page_size': 10})
+        self.assertEqual(data['results'][0]['book_title'], 'Book 9')
+
+    def test_student_stats(self):
+        data = self.assertConstantQueries(reverse('student_stats'), 3)
+        self.assertEqual(data['borrowedCount'], 10)
+        self.assertEqual(data['overdueCount'], 8)
+        self.assertEqual(len(data['activities']), 5)
+
+    def test_deleted_book_keeps_history(self):
+        record = make_records(self.student, make_books(1))[0]
+        record.book.delete()
+        data = self.client.get(reverse('borrow_history')).json()
+        self.assertEqual(data['results'][0]['book_id'], None)
+        self.assertEqual(data['results'][0]['book_title'], 'Unknown')
+
+
+class BorrowReturnTests(APITestCase):
+    def setUp(self):
+        self.student = make_student('reader')
+        self.client.force_authenticate(self.student)
+        self.book = make_books(1)[0]
+
+    def borrow(self, book_id):
+        return self.client.post(reverse('borrow_book'), {'book_id': book_id}, format='json')
+
+    def test_borrow_and_return_adjust_copies(self):
+        response = self.borrow(self.book.id)
+        self.assertEqual(response.status_code, 201)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+
+        self.assertEqual(self.client.post(reverse('return_book', args=[response.data['id']])).status_code, 200)
+        self.assertEqual(self.client.post(reverse('return_book', args=[response.data['id']])).status_code, 404)
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 3)
+
+    def test_duplicate_active_borrow_rejected(self):
+        self.assertEqual(self.borrow(self.book.id).status_code, 201)
+        response = self.borrow(self.book.id)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'You already have this book borrowed')
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.available_copies, 2)
+
+    def test_unavailable_and_missing_books(self):
+        Books.objects.filter(id=self.book.id).update(available_copies=0)
+        self.assertEqual(self.borrow(self.book.id).data['error'], 'Book is not available')
+        self.assertEqual(self.borrow(self.book.id + 100).status_code, 404)
+        self.assertFalse(BorrowRecord.objects.exists())
+
+    def test_unapproved_student_cannot_borrow(self):
+        Student.objects.filter(user=self.student).update(is_approved=False)
+        self.assertEqual(self.borrow(self.book.id).status_code, 403)
+
+
+class BatchCirculationTests(APITestCase):
+    def setUp(self):
+        self.student = make_student('reader')
+        self.client.force_authenticate(self.student)
+        self.books = make_books(30)
+
+    def borrow(self, book_ids):
+        return self.client.post(reverse('batch_borrow'), {'book_ids': book_ids}, format='json')
+
+    def give_back(self, borrow_ids):
+        return self.client.post(reverse('batch_return'), {'borrow_ids': borrow_ids}, format='json')
+
+    def copies(self, book):
+        return Books.objects.values_list('available_copies', flat=True).get(id=book.id)
+
+    def test_per_item_outcomes(self):
+        held, sold_out, free = self.books[:3]
+        make_records(self.student, [held])
+        Books.objects.filter(id=sold_out.id).update(available_copies=0)
+
+        response = self.borrow([free.id, held.id, sold_out.id, free.id, 999999])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['borrowed', 'already_borrowed', 'unavailable', 'duplicate', 'not_found'],
+        )
+        self.assertEqual((response.data['borrowed'], response.data['failed']), (1, 4))
+        self.assertEqual(self.copies(free), 2)
+        self.assertEqual(self.copies(held), 3)
+
+        # Nothing borrowed is a per-item answer too, as for returns
+        response = self.borrow([held.id, sold_out.id])
+        self.assertEqual((response.status_code, response.data['borrowed']), (200, 0))
+
+    def test_return_settles_fines_and_restores_copies(self):
+        loans = make_records(self.student, self.books[:2]) + make_records(self.student, self.books[2:4], overdue=True)
+        Books.objects.filter(id__in=[book.id for book in self.books[:4]]).update(available_copies=2)
+        other = make_records(make_student('other'), self.books[4:5])
+
+        response = self.give_back([loan.id for loan in loans] + [loans[0].id, other[0].id])
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['returned'] * 4 + ['duplicate', 'not_found'])
+        self.assertEqual([result['fine_amount'] for result in results[:4]], ['0.00', '0.00', '3.00', '3.00'])
+        self.assertEqual([self.copies(book) for book in self.books[:4]], [3] * 4)
+        self.assertEqual(BorrowRecord.objects.filter(status='returned').count(), 4)
+        # Nothing left to return is still a per-item answer
+        response = self.give_back([loans[0].id])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['returned'], response.data['results']),
+                         (0, [{'borrow_id': loans[0].id, 'status': 'not_found'}]))
+
+    def test_admin_returns_anyones_loans(self):
+        loans = make_records(make_student('other'), self.books[:2])
+        admin = User.objects.create(username='admin', role='administrator')
+        self.client.force_authenticate(admin)
+        self.assertEqual(self.give_back([loan.id for loan in loans]).data['returned'], 2)
+
+    def test_rejects_bad_batches(self):
+        for book_ids in [[], 'abc', [1, 'two'], [True], list(range(MAX_BATCH_ITEMS + 1))]:
+            self.assertEqual(self.borrow(book_ids).status_code, 400, book_ids)
+        Student.objects.filter(user=self.student).update(is_approved=False)
+        self.assertEqual(self.borrow([self.books[0].id]).status_code, 403)
+
+    def test_query_count_does_not_grow_with_the_batch(self):
+        counts = []
+        for books in (self.books[:2], self.books[2:30]):
+            with CaptureQueriesContext(connection) as borrowed:
+                response = self.borrow([book.id for book in books])
+            self.assertEqual(response.data['borrowed'], len(books))
+            with CaptureQueriesContext(connection) as returned:
+                response = self.give_back([result['id'] for result in response.data['results']])
+            self.assertEqual(response.data['returned'], len(books))
+            counts.append((len(borrowed), len(returned)))
+        self.assertEqual(counts[0], counts[1])
+        self.assertEqual(Books.objects.filter(available_copies=3).count(), 30)
+
+
+@unittest.skipIf(connection.vendor == 'sqlite', 'SQLite serialises writers; run against PostgreSQL')
+class ConcurrentBorrowTests(TransactionTestCase):
+    COPIES = 25
+    STUDENTS = 100
+    ATTEMPTS_PER_STUDENT = 10
+    THREADS = 16
+
+    def test_hot_book_never_oversells(self):
+        book = make_books(1)[0]
+        Books.objects.filter(id=book.id).update(available_copies=self.COPIES)
+        users = User.objects.bulk_create([
+            User(username=f'rush{index}', role='student') for index in range(self.STUDENTS)
+        ])
+        Student.objects.bulk_create([
+            Student(user=user, roll_number=f'RUSH{user.id}', is_approved=True) for user in users
+        ])
+
+        attempts = [user for user in users for _ in range(self.ATTEMPTS_PER_STUDENT)]
+        random.Random(7).shuffle(attempts)
+        statuses = []
+        start = threading.Barrier(self.THREADS)
+
+        def hammer(batch):
+            client = APIClient()
+            start.wait()
+            try:
+                for user in batch:
+                    client.force_authenticate(user)
+                    response = client.post(reverse('borrow_book'), {'book_id': book.id}, format='json')
+                    statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=hammer, args=(attempts[i::self.THREADS],)) for i in range(self.THREADS)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        book.refresh_from_db()
+        self.assertEqual(len(statuses), len(attempts))
+        self.assertEqual(statuses.count(201), self.COPIES)
+        self.assertEqual(set(statuses), {201, 400})
+        self.assertEqual(book.available_copies, 0)
+        self.assertEqual(BorrowRecord.objects.filter(book=book, status='borrowed').count(), self.COPIES)
+
+
+class ExportBorrowRecordsTests(APITestCase):
+    def setUp(self):
+        self.student = make_student('reader')
+        self.other = make_student('other')
+        make_records(self.student, make_books(2))
+        make_records(self.other, make_books(1, start=2), overdue=True)
+        BorrowRecord.objects.filter(user=self.student, book__title='Book 0').update(status='returned')
+
+    def export(self, user, **params):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('export_borrow_records'), {'output': 'ndjson', **params})
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_students_only_see_their_own_records(self):
+        rows = self.export(self.student)
+        self.assertEqual([row['book_title'] for row in rows], ['Book 1', 'Book 0'])
+        self.assertEqual(rows[0]['username'], 'reader')
+        self.assertEqual([row['status'] for row in self.export(self.student, status='returned')], ['returned'])
+
+    def test_admin_filters(self):
+        admin = User.objects.create(username='librarian', role='administrator')
+        self.assertEqual(len(self.export(admin)), 3)
+        rows = self.export(admin, user_id=self.other.id)
+        self.assertEqual([row['book_isbn'] for row in rows], [f'{2:013d}'])
+        self.assertEqual(rows[0]['due_date'], str(timezone.now().date() - timedelta(days=3)))
+
+
+@override_settings(FINE_PER_DAY='2.50')
+class OverdueSweepTests(APITestCase):
+    def setUp(self):
+        self.today = timezone.now().date()
+        self.student = make_student('reader')
+        self.other = make_student('other')
+        books = make_books(4)
+        self.late = make_records(self.student, books[:2], overdue=True)
+        self.on_time = make_records(self.student, books[2:3])[0]
+        self.returned = make_records(self.other, books[3:])[0]
+        BorrowRecord.objects.filter(id=self.returned.id).update(status='returned', fine_amount=4)
+        # Loans come back from make_records already overdue; start them as the borrow view would.
+        BorrowRecord.objects.filter(status='overdue').update(status='borrowed')
+
+    def sweep(self, *args):
+        out = io.StringIO()
+        call_command('sweep_overdue', *args, stdout=out)
+        return out.getvalue()
+
+    def test_marks_overdue_accrues_and_rolls_up(self):
+        self.sweep('--chunk-size', '1')
+        late = BorrowRecord.objects.filter(id__in=[record.id for record in self.late])
+        self.assertEqual(set(late.values_list('status', 'fine_amount')), {('overdue', Decimal('7.50'))})
+        self.on_time.refresh_from_db()
+        self.assertEqual((self.on_time.status, self.on_time.fine_amount), ('borrowed', 0))
+        self.assertEqual(Student.objects.get(user=self.student).total_fines, Decimal('15.00'))
+        self.assertEqual(Student.objects.get(user=self.other).total_fines, Decimal('4.00'))
+
+    def test_idempotent_and_follows_the_clock(self):
+        self.assertIn('2 marked overdue, 2 fines updated, 2 student totals updated', self.sweep())
+        self.assertIn('0 marked overdue, 0 fines updated, 0 student totals updated', self.sweep())
+
+        self.sweep('--date', str(self.today + timedelta(days=1)))
+        self.assertEqual(Student.objects.get(user=self.student).total_fines, Decimal('20.00'))
+
+    def test_overdue_counts_do_not_wait_for_the_sweep(self):
+        self.client.force_authenticate(self.student)
+        self.assertEqual(self.client.get(reverse('student_stats')).data['overdueCount'], 2)
+        self.sweep()
+        self.assertEqual(self.client.get(reverse('student_stats')).data['overdueCount'], 2)
+
+    def test_swept_loans_can_be_renewed(self):
+        self.sweep()
+        self.client.force_authenticate(self.student)
+        response = self.client.post(reverse('renew_book', args=[self.late[0].id]))
+        self.assertEqual(response.status_code, 200)
+        self.late[0].refresh_from_db()
+        self.assertEqual(
+            (self.late[0].status, self.late[0].due_date, self.late[0].fine_amount),
+            ('borrowed', self.today + timedelta(days=14), 0),
+        )
+        self.client.post(reverse('return_book', args=[self.late[1].id]))
+        self.assertEqual(self.client.post(reverse('renew_book', args=[self.late[1].id])).status_code, 404)
+        self.sweep()
+        self.assertEqual(Student.objects.get(user=self.student).total_fines, Decimal('7.50'))
+
+    def test_return_settles_the_fine(self):
+        self.client.force_authenticate(self.student)
+        self.client.post(reverse('return_book', args=[self.late[0].id]))
+        self.late[0].refresh_from_db()
+        self.assertEqual((self.late[0].status, self.late[0].fine_amount), ('returned', Decimal('7.50')))
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.student = make_student('reader')
+        self.other = make_student('other')
+        self.loan = make_records(self.student, make_books(1))[0]
+
+    def etags(self, user):
+        self.client.force_authenticate(user)
+        etags = []
+        for route in ('borrow_history', 'student_stats'):
+            response = self.client.get(reverse(route))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Cache-Control'], 'private, no-cache')
+            self.assertIn('Authorization', response['Vary'])
+            with self.assertNumQueries(0):
+                revalidated = self.client.get(reverse(route), HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(revalidated.status_code, 304)
+            etags.append(response['ETag'])
+        return etags
+
+    def test_revalidates_until_the_users_loans_change(self):
+        first = self.etags(self.student)
+        self.assertEqual(self.etags(self.student), first)
+        self.assertNotEqual(self.etags(self.other), first)
+
+        self.client.force_authenticate(self.student)
+        self.client.post(reverse('renew_book', args=[self.loan.id]))
+        renewed = self.etags(self.student)
+        self.assertTrue(set(renewed).isdisjoint(first))
+
+        call_command('sweep_overdue', '--date', str(timezone.now().date() + timedelta(days=30)), stdout=io.StringIO())
+        self.assertTrue(set(self.etags(self.student)).isdisjoint(renewed))
+
+
+class SyntheticDatasetTests(APITestCase):
+    def dataset(self, batch_size=50):
+        dataset = Dataset(books=60, students=20, loans=120, seed=7, as_of=timezone.now().date(),
+                          batch_size=batch_size, fine_rate=Decimal('2.00'))
+        dataset.user_base = dataset.student_base = dataset.book_base = 0
+        return dataset
+
+    def test_rows_do_not_depend_on_batching(self):
+        def loans(dataset):
+            rows = [row for start, stop in dataset.batches(20, dataset.loans_per_student)
+                    for row in dataset.loan_rows(start, stop)]
+            return [(row.user_id, row.book_id, row.status, row.due_date, row.fine_amount) for row in rows]
+
+        self.assertEqual(loans(self.dataset(batch_size=7)), loans(self.dataset(batch_size=500)))
+        books = [(book.isbn, book.title) for book in self.dataset(batch_size=7).book_rows(0, 60)]
+        self.assertEqual(books, [(book.isbn, book.title) for book in self.dataset().book_rows(0, 60)])
+
+    def test_load_dummy_data_scale(self):
+        out = io.StringIO()
+        call_command('load_dummy_data', '--scale', '40', '--students', '15', '--batch-size', '25', stdout=out)
+        self.assertIn('students: 15', out.getvalue())
+        self.assertEqual(Books.objects.count(), 40)
+        self.assertTrue(User.objects.filter(username='admin', role='administrator').exists())
+
+        active = BorrowRecord.objects.filter(status__in=['borrowed', 'overdue'])
+        self.assertFalse(active.values('user', 'book').annotate(n=Count('id')).filter(n__gt=1).exists())
+        self.assertFalse(active.filter(return_date__isnull=False).exists())
+        for student in Student.objects.all():
+            fines = BorrowRecord.objects.filter(user_id=student.user_id).aggregate(total=Sum('fine_amount'))
+            self.assertEqual(student.total_fines, fines['total'] or 0)
+
+
+@requires_postgresql
+class BorrowQueryPlanTests(QueryPlanAssertions, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create([User(username=f'plan{i}', role='student') for i in range(300)])
+        Student.objects.bulk_create([Student(user=user, roll_number=f'P{user.id}', is_approved=True) for user in users])
+        books = make_books(500)
+        today = timezone.now().date()
+        statuses = ['returned'] * 8 + ['borrowed', 'overdue']
+        BorrowRecord.objects.bulk_create([
+            BorrowRecord(user=users[i % 300], book=books[(i // 300 + i) % 500], status=statuses[i % 10],
+                         due_date=today + timedelta(days=i % 30 - 15))
+            for i in range(6000)
+        ])
+        analyze_tables(BorrowRecord._meta.db_table, Books._meta.db_table, Student._meta.db_table)
+        cls.student = users[0]
+
+    def test_student_queries_use_indexes(self):
+        self.client.force_authenticate(self.student)
+        with self.assertNoSequentialScans():
+            page = self.client.get(reverse('borrow_book'), {'cursor': ''}).json()
+            self.client.get(page['next'])
+            self.client.get(reverse('borrow_book'), {'status': 'returned'})
+            self.client.get(reverse('borrow_history'))
+            self.client.get(reverse('student_stats'))
+            self.client.post(reverse('borrow_book'), {'book_id': Books.objects.last().id}, format='json')
+
+    def test_admin_queries_use_indexes(self):
+        self.client.force_authenticate(User.objects.create(username='librarian', role='administrator'))
+        with self.assertNoSequentialScans():
+            page = self.client.get(reverse('borrow_book'), {'cursor': ''}).json()
+            self.client.get(page['next'])
+            self.client.get(reverse('borrow_book'), {'user_id': self.student.id})
+            self.client.get(reverse('borrow_book'), {'user_id': self.student.id, 'status': 'overdue'})
@@ -1,9 +1,15 @@
 from django.urls import path
-from .views import BorrowBookView, ReturnBookView, RenewBookView, BorrowHistoryView, StudentOverviewStatsView
+from .views import (
+    BorrowBookView, ReturnBookView, RenewBookView, BorrowHistoryView, StudentOverviewStatsView, ExportBorrowRecordsView,
+    BatchBorrowView, BatchReturnView,
+)
 
 urlpatterns = [
     path('borrow/', BorrowBookView.as_view(), name='borrow_book'),
+    path('borrow/batch/', BatchBorrowView.as_view(), name='batch_borrow'),
+    path('export/', ExportBorrowRecordsView.as_view(), name='export_borrow_records'),
     path('return/<int:borrow_id>/', ReturnBookView.as_view(), name='return_book'),
+    path('return/batch/', BatchReturnView.as_view(), name='batch_return'),
     path('renew/<int:borrow_id>/', RenewBookView.as_view(), name='renew_book'),
     path('history/', BorrowHistoryView.as_view(), name='borrow_history'),
     path('stats/', StudentOverviewStatsView.as_view(), name='student_stats'),
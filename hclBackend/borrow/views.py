@@ -1,50 +1,82 @@
 from datetime import timedelta
 from django.utils import timezone
+from .circulation import MAX_BATCH_ITEMS, borrow_books, return_loans
+from .fines import late_fine, overdue_on
 from .models import BorrowRecord
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
+from hclBackend.caching import (
+    CATALOG, DASHBOARD, LOANS, book_version, bump_version, conditional_response, day_version, user_loans,
+)
+from hclBackend.exporting import EXPORT_FORMATS, export_response
+from hclBackend.pagination import KeysetPaginationMixin
 from rest_framework.permissions import IsAuthenticated
+from users.authentication import is_approved
 from users.permissions import IsStudent, IsAdministrator
 from django.contrib.auth import get_user_model
 from books.models import Books
 from users.models import Student
-from django.db.models import Sum, Q
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Q
 import django.db.models as models
 
 User = get_user_model()
 
-class BorrowPagination(PageNumberPagination):
+
+class BookUnavailable(Exception):
+    pass
+
+
+def take_copy(book_id):
+    """Atomically take one copy of a book; False if none are left."""
+    return Books.objects.filter(id=book_id, available_copies__gt=0).update(
+        available_copies=F('available_copies') - 1
+    ) == 1
+
+
+def return_copy(book_id):
+    Books.objects.filter(id=book_id).update(available_copies=F('available_copies') + 1)
+
+
+class BorrowPagination(KeysetPaginationMixin, PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+
+def filter_borrow_records(request):
+    """Borrow records visible to the user, filtered by BorrowBookView's query parameters."""
+    if request.user.role == 'administrator':
+        user_id = request.query_params.get('user_id')
+        if user_id:
+            borrow_records = BorrowRecord.objects.filter(user_id=user_id).order_by('-created_at')
+        else:
+            borrow_records = BorrowRecord.objects.all().order_by('-created_at')
+    else:
+        borrow_records = BorrowRecord.objects.filter(user_id=request.user.id).order_by('-created_at')
+
+    # Apply filtering by status if provided
+    status_filter = request.query_params.get('status')
+    if status_filter:
+        borrow_records = borrow_records.filter(status=status_filter)
+    return borrow_records
+
+
 class BorrowBookView(APIView):
 
     def get(self, request):
-        if request.user.role == 'administrator':
-            user_id = request.query_params.get('user_id')
-            if user_id:
-                borrow_records = BorrowRecord.objects.filter(user_id=user_id).order_by('-created_at')
-            else:
-                borrow_records = BorrowRecord.objects.all().order_by('-created_at')
-        else:
-            borrow_records = BorrowRecord.objects.filter(user_id=request.user.id).order_by('-created_at')
-        
-        # Apply filtering by status if provided
-        status_filter = request.query_params.get('status')
-        if status_filter:
-            borrow_records = borrow_records.filter(status=status_filter)
+        borrow_records = filter_borrow_records(request).select_related('book')
 
         paginator = BorrowPagination()
         paginated_records = paginator.paginate_queryset(borrow_records, request)
 
         records_data = []
-        # FIX: Iterate over paginated_records instead of borrow_records
         for record in paginated_records:
-            try:
-                book = Books.objects.get(id=record.book_id)
+            book = record.book
+            book_data = None
+            if book is not None:
                 book_data = {
                     "id": book.id,
                     "title": book.title,
@@ -58,8 +90,6 @@ class BorrowBookView(APIView):
                     "published_year": book.published_year,
                     "available_copies": book.available_copies,
                 }
-            except Books.DoesNotExist:
-                book_data = None
 
             records_data.append(
                 {
@@ -81,59 +111,59 @@ class BorrowBookView(APIView):
     def post(self, request):
         """Borrow a book"""
         book_id = request.data.get("book_id")
-        user_id = request.data.get("user_id")
 
         if not book_id:
             return Response(
                 {"error": "book_id is required"}, status=status.HTTP_400_BAD_REQUEST
             )
 
+        # Check if student is approved (a token claim; see users.authentication)
+        if not is_approved(request.user):
+            return Response(
+                {"error": "Your account is pending approval by an administrator. You cannot borrow books yet."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        # Cheap unlocked read so that requests for missing or sold-out books
+        # never start a write transaction.
         try:
-            book = Books.objects.get(id=book_id)
-        except Books.DoesNotExist:
+            available_copies = Books.objects.filter(id=book_id).values_list('available_copies', flat=True).first()
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "book_id must be an integer"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        if available_copies is None:
             return Response(
                 {"error": "Book not found"}, status=status.HTTP_404_NOT_FOUND
             )
-
-        if book.available_copies <= 0:
+        if available_copies <= 0:
             return Response(
                 {"error": "Book is not available"}, status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Check if student is approved
+
+        # Insert the loan, then take a copy with a conditional UPDATE. The
+        # unique_active_borrow constraint rejects duplicate loans and the
+        # book row is only locked between the UPDATE and the commit.
         try:
-            student = Student.objects.get(user__id=user_id)
-            if not student.is_approved:
-                return Response(
-                    {"error": "Your account is pending approval by an administrator. You cannot borrow books yet."},
-                    status=status.HTTP_403_FORBIDDEN
+            with transaction.atomic():
+                borrow_record = BorrowRecord.objects.create(
+                    user_id=request.user.id,
+                    book_id=book_id,
+                    status="borrowed",
+                    due_date=timezone.now().date() + timedelta(days=14)
                 )
-        except Student.DoesNotExist:
-            if request.user.role == 'student':
-                return Response(
-                    {"error": "Student profile not found"},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-        
-        existing_borrow = BorrowRecord.objects.filter(
-            user_id=request.user.id, book_id=book_id, status="borrowed"
-        ).exists()
-
-        if existing_borrow:
+                if not take_copy(book_id):
+                    raise BookUnavailable()
+        except BookUnavailable:
+            return Response(
+                {"error": "Book is not available"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        except IntegrityError:
             return Response(
                 {"error": "You already have this book borrowed"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        borrow_record = BorrowRecord.objects.create(
-            user_id=request.user.id, 
-            book_id=book_id, 
-            status="borrowed",
-            due_date=timezone.now().date() + timedelta(days=14)
-        )
-
-        book.available_copies -= 1
-        book.save()
+        bump_version(book_version(book_id), DASHBOARD, user_loans(request.user.id))
 
         response_data = {
             "id": borrow_record.id,
@@ -150,23 +180,119 @@ class BorrowBookView(APIView):
 
         return Response(response_data, status=status.HTTP_201_CREATED)
 
+
+def batch_ids(request, name):
+    """The list of integer ids in ``request.data[name]``, or an error Response."""
+    ids = request.data.get(name)
+    if not isinstance(ids, list) or not ids:
+        return Response({"error": f"{name} must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(ids) > MAX_BATCH_ITEMS:
+        return Response(
+            {"error": f"At most {MAX_BATCH_ITEMS} {name} per request"}, status=status.HTTP_400_BAD_REQUEST
+        )
+    if not all(isinstance(value, int) and not isinstance(value, bool) for value in ids):
+        return Response({"error": f"{name} must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+    return ids
+
+
+class BatchBorrowView(APIView):
+    """Borrow several books at once; see borrow.circulation."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        book_ids = batch_ids(request, "book_ids")
+        if isinstance(book_ids, Response):
+            return book_ids
+        if not is_approved(request.user):
+            return Response(
+                {"error": "Your account is pending approval by an administrator. You cannot borrow books yet."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        results = borrow_books(request.user.id, book_ids)
+        borrowed = [result["book_id"] for result in results if result["status"] == "borrowed"]
+        if borrowed:
+            bump_version(*[book_version(book_id) for book_id in borrowed], DASHBOARD, user_loans(request.user.id))
+        return Response(
+            {"borrowed": len(borrowed), "failed": len(results) - len(borrowed), "results": results},
+            status=status.HTTP_200_OK,
+        )
+
+
+class BatchReturnView(APIView):
+    """Return several loans at once; administrators may return anyone's."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        borrow_ids = batch_ids(request, "borrow_ids")
+        if isinstance(borrow_ids, Response):
+            return borrow_ids
+
+        loans = BorrowRecord.objects.all()
+        if request.user.role != 'administrator':
+            loans = loans.filter(user_id=request.user.id)
+        results, user_ids, book_ids = return_loans(loans, borrow_ids)
+        if user_ids:
+            bump_version(
+                DASHBOARD, *[user_loans(user_id) for user_id in user_ids],
+                *[book_version(book_id) for book_id in book_ids],
+            )
+        returned = sum(result["status"] == "returned" for result in results)
+        return Response(
+            {"returned": returned, "failed": len(results) - returned, "results": results},
+            status=status.HTTP_200_OK,
+        )
+
+
+class ExportBorrowRecordsView(APIView):
+    """Stream borrow records as ?output=csv|ndjson, filtered like BorrowBookView.get."""
+    permission_classes = [IsAuthenticated]
+    columns = {
+        "id": "id",
+        "user_id": "user_id",
+        "username": "user__username",
+        "book_id": "book_id",
+        "book_title": "book__title",
+        "book_isbn": "book__isbn",
+        "borrow_date": "borrow_date",
+        "due_date": "due_date",
+        "return_date": "return_date",
+        "fine_amount": "fine_amount",
+        "status": "status",
+        "created_at": "created_at",
+    }
+
+    def get(self, request):
+        output = request.query_params.get("output", "csv")
+        if output not in EXPORT_FORMATS:
+            return Response({"error": "output must be csv or ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+        return export_response(request, filter_borrow_records(request), self.columns, "borrow_records", output)
+
+
 class ReturnBookView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, borrow_id):
-        try:
-            record = BorrowRecord.objects.get(id=borrow_id, user_id=request.user.id, status='borrowed')
-            record.status = 'returned'
-            record.return_date = timezone.now().date()
-            record.save()
-            
-            book = Books.objects.get(id=record.book_id)
-            book.available_copies += 1
-            book.save()
-            
-            return Response({"message": "Book returned successfully"})
-        except BorrowRecord.DoesNotExist:
+        active = BorrowRecord.objects.filter(
+            id=borrow_id, user_id=request.user.id, status__in=BorrowRecord.ACTIVE_STATUSES
+        )
+        loan = active.values_list('book_id', 'due_date').first()
+        book_id, due_date = loan or (None, None)
+        today = timezone.now().date()
+
+        # The status UPDATE only matches while the loan is still active, so two
+        # concurrent returns of the same loan give back a single copy.
+        with transaction.atomic():
+            returned = active.update(
+                status='returned', return_date=today, fine_amount=late_fine(due_date, today)
+            )
+            if returned and book_id is not None:
+                return_copy(book_id)
+
+        if not returned:
             return Response({"error": "Borrow record not found or already returned"}, status=404)
+        bump_version(book_version(book_id), DASHBOARD, user_loans(request.user.id))
+        return Response({"message": "Book returned successfully"})
 
 
 class RenewBookView(APIView):
@@ -174,36 +300,46 @@ class RenewBookView(APIView):
 
     def post(self, request, borrow_id):
         try:
-            record = BorrowRecord.objects.get(id=borrow_id, user_id=request.user.id, status='borrowed')
-            record.due_date = timezone.now().date() + timedelta(days=14)
+            record = BorrowRecord.objects.get(
+                id=borrow_id, user_id=request.user.id, status__in=BorrowRecord.ACTIVE_STATUSES
+            )
+            # Loans the overdue sweep has reached are renewable too; like a
+            # return, the fine follows the new due date.
+            today = timezone.now().date()
+            record.status = 'borrowed'
+            record.due_date = today + timedelta(days=14)
+            record.fine_amount = late_fine(record.due_date, today)
             record.save()
-            
+            bump_version(DASHBOARD, user_loans(request.user.id))
+
             return Response({"message": "Book renewed successfully", "new_due_date": record.due_date})
         except BorrowRecord.DoesNotExist:
             return Response({"error": "Borrow record not found"}, status=404)
 
 
+def loan_versions(request):
+    """What a user's history and stats are built from: their loans, sweeps, book titles and the date."""
+    return [LOANS, user_loans(request.user.id), CATALOG, day_version()]
+
+
 class BorrowHistoryView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @conditional_response(loan_versions)
     def get(self, request):
-        borrow_records = BorrowRecord.objects.filter(user_id=request.user.id).order_by('-created_at')
-        
+        borrow_records = BorrowRecord.objects.filter(
+            user_id=request.user.id
+        ).select_related('book').order_by('-created_at')
+
         paginator = BorrowPagination()
         paginated_records = paginator.paginate_queryset(borrow_records, request)
 
         records_data = []
         for record in paginated_records:
-            try:
-                book = Books.objects.get(id=record.book_id)
-                book_title = book.title
-            except Books.DoesNotExist:
-                book_title = "Unknown"
-
             records_data.append({
                 "id": record.id,
                 "book_id": record.book_id,
-                "book_title": book_title,
+                "book_title": record.book.title if record.book is not None else "Unknown",
                 "borrow_date": record.borrow_date,
                 "return_date": record.return_date,
                 "due_date": record.due_date,
@@ -214,19 +350,21 @@ class BorrowHistoryView(APIView):
 
         return paginator.get_paginated_response(records_data)
 
+
 class StudentOverviewStatsView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @conditional_response(loan_versions)
     def get(self, request):
-        now = timezone.now().date()
         borrows = BorrowRecord.objects.filter(user_id=request.user.id)
-        
-        borrowed_count = borrows.filter(status='borrowed').count()
-        overdue_count = borrows.filter(
-            models.Q(status='overdue') | 
-            (models.Q(status='borrowed') & models.Q(due_date__lt=now))
-        ).count()
-        
+
+        counts = borrows.aggregate(
+            borrowed=models.Count('id', filter=models.Q(status__in=BorrowRecord.ACTIVE_STATUSES)),
+            overdue=models.Count('id', filter=overdue_on(timezone.now().date())),
+        )
+        borrowed_count = counts['borrowed']
+        overdue_count = counts['overdue']
+
         # Sum total fines from Student model
         try:
             student = Student.objects.get(user__id=request.user.id)
@@ -235,18 +373,15 @@ class StudentOverviewStatsView(APIView):
             total_fines = 0.0
 
         # Recent activities
-        recent = borrows.order_by('-created_at')[:5]
-        activities = []
-        for r in recent:
-            try:
-                book = Books.objects.get(id=r.book_id)
-                activities.append({
-                    "title": book.title,
-                    "status": r.status,
-                    "date": r.created_at.strftime("%b %d, %Y")
-                })
-            except:
-                continue
+        recent = borrows.filter(book__isnull=False).select_related('book').order_by('-created_at')[:5]
+        activities = [
+            {
+                "title": r.book.title,
+                "status": r.status,
+                "date": r.created_at.strftime("%b %d, %Y")
+            }
+            for r in recent
+        ]
 
         return Response({
             "borrowedCount": borrowed_count,
@@ -0,0 +1,10 @@
+import pytest
+from django.core.cache import cache
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Cached catalog responses and version counters must not leak between tests."""
+    cache.clear()
+    yield
+    cache.clear()
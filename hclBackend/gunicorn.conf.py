@@ -0,0 +1,10 @@
+# Loaded by gunicorn from the working directory (see Dockerfile).
+import os
+import tempfile
+
+
+def on_starting(server):
+    # Per-worker metric snapshots from a previous run would otherwise be
+    # added to this run's totals (see hclBackend/metrics.py).
+    from hclBackend.metrics import clear_directory
+    clear_directory(os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "hcl-metrics")))
@@ -0,0 +1,84 @@
+"""
+Helpers shared by the ``benchmark_*`` management commands.
+
+Benchmarks never touch the configured database: they run against a freshly
+migrated test database that is destroyed afterwards. ``benchmark_endpoints``
+reports can be saved and compared with ``compare_reports`` to catch
+regressions.
+"""
+import contextlib
+import math
+import time
+
+from django.db import connection
+
+
+@contextlib.contextmanager
+def isolated_database(verbosity=0):
+    """Run the block against a throwaway, fully migrated test database."""
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield connection.settings_dict['NAME']
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def analyze_tables(*tables):
+    """Refresh planner statistics after a bulk load."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for table in tables:
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+        elif connection.vendor == 'sqlite':
+            cursor.execute('ANALYZE')
+
+
+def timed(func, *args, **kwargs):
+    """Call ``func`` and return ``(elapsed_seconds, result)``."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an unsorted sequence."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    return {
+        'n': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 3),
+        'p95_ms': round(percentile(samples, 95) * 1000, 3),
+        'p99_ms': round(percentile(samples, 99) * 1000, 3),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+        'max_ms': round(max(samples) * 1000, 3) if samples else 0.0,
+    }
+
+
+def compare_reports(baseline, current, threshold=0.2, min_delta_ms=1.0):
+    """
+    Regressions of ``current`` against ``baseline`` (both ``benchmark_endpoints``
+    reports): an endpoint whose p50 or p95 grew by more than ``threshold``
+    (relative) and ``min_delta_ms`` (absolute), that issues more queries, or
+    that returns more errors. Endpoints missing from either report are ignored.
+    """
+    regressions = []
+    for label, before in baseline['endpoints'].items():
+        after = current['endpoints'].get(label)
+        if after is None:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            if after[metric] > before[metric] * (1 + threshold) and after[metric] - before[metric] >= min_delta_ms:
+                regressions.append({'endpoint': label, 'metric': metric, 'baseline': before[metric],
+                                    'current': after[metric]})
+        for metric in ('queries', 'errors'):
+            if after[metric] > before[metric]:
+                regressions.append({'endpoint': label, 'metric': metric, 'baseline': before[metric],
+                                    'current': after[metric]})
+    return regressions
@@ -0,0 +1,214 @@
+"""
+Version counters for cached data.
+
+Cached entries embed the current version of the data they were built from
+in their key, and writers bump that version instead of hunting down every
+affected key, so invalidation is a single cache write. Versions are
+``time.time_ns()`` stamps of the last change.
+
+Versions live in the default cache, so they are only shared between
+gunicorn workers when that cache is shared (``CACHE_BACKEND=file`` or
+``redis``). With the per-process local-memory cache a worker never hears
+of another worker's bumps, so there versions expire after
+``LOCAL_VERSION_TTL`` seconds and are stamped afresh: cached responses,
+ETags and Last-Modified lag a change made in another worker by at most
+that long.
+
+``versioned_response`` caches whole GET responses of public read views on
+top of a version, keyed on the request's normalised query parameters.
+Both it and ``conditional_response`` (for per-user views, which are not
+cached) derive ETag and Last-Modified from the versions alone, so a
+conditional GET for unchanged data gets a 304 without running a query.
+The exception is cached data with a field that changes too often to bump
+a shared version for, such as a book's available copies: that field is
+refreshed on every request, and the ETag is the hash of the result.
+"""
+import functools
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.response import Response
+
+from hclBackend.metrics import get_metrics
+
+# Admin dashboard snapshot: loans, returns, approvals and catalog changes
+DASHBOARD = 'dashboard'
+# Public catalog responses: book writes (borrows and returns bump book_version())
+CATALOG = 'catalog'
+# Everyone's loans and fines (overdue sweeps); see also user_loans()
+LOANS = 'loans'
+
+# Query parameters that don't change a response
+IGNORED_PARAMS = {'profile'}
+
+
+def version_key(name):
+    return f'version:{name}'
+
+
+def version_timeout():
+    return None if settings.CACHE_SHARED else settings.LOCAL_VERSION_TTL
+
+
+def get_version(name):
+    key = version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=version_timeout())
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*names):
+    now = time.time_ns()
+    cache.set_many({version_key(name): now for name in names}, timeout=version_timeout())
+
+
+def get_versions(*names):
+    """Like ``get_version`` for several names at once, in one cache round trip."""
+    keys = [version_key(name) for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=version_timeout())
+            found[key] = cache.get(key)
+    return [found[key] for key in keys]
+
+
+def user_loans(user_id):
+    """Version of one user's loans, history and stats."""
+    return f'{LOANS}:{user_id}'
+
+
+def book_version(book_id):
+    """Version of one book's available copies, which borrows and returns change."""
+    return f'book:{book_id}'
+
+
+def day_version():
+    """Version of what changes with the date alone, such as which loans are overdue."""
+    return f'day:{timezone.now().date().isoformat()}'
+
+
+def response_key(prefix, versions, request, view_args):
+    """
+    Cache key for a GET response: the versions it is built from, the view, its
+    URL arguments and the query parameters, sorted and trimmed so equivalent
+    URLs share an entry. The host is part of the key because paginated
+    responses contain absolute links.
+    """
+    params = sorted(
+        (key, [value.strip() for value in request.GET.getlist(key)])
+        for key in request.GET if key not in IGNORED_PARAMS
+    )
+    raw = json.dumps([versions, request.get_host(), view_args, params], sort_keys=True, default=str)
+    return f'{prefix}:{hashlib.sha1(raw.encode()).hexdigest()}'
+
+
+def conditional_get(request, key, versions, cache_control, body=None):
+    """
+    Validators for a response built from ``versions``: ``(not_modified, headers)``.
+
+    The response body is a function of the key, so its hash is a strong
+    ETag, and the newest version is the Last-Modified time; neither needs the
+    body. Pass ``body`` when it is not, because part of it was read afresh:
+    the ETag then hashes the body too and there is no Last-Modified.
+    ``not_modified`` is a 304 when the client's copy is current.
+    """
+    if body is None:
+        last_modified = max(versions) // 1_000_000_000
+        headers = {'ETag': f'"{key.rsplit(":", 1)[-1]}"', 'Last-Modified': http_date(last_modified)}
+    else:
+        last_modified = None
+        raw = json.dumps([key, body], sort_keys=True, default=str)
+        headers = {'ETag': f'"{hashlib.sha1(raw.encode()).hexdigest()}"'}
+    headers['Cache-Control'] = cache_control
+    not_modified = get_conditional_response(request, etag=headers['ETag'], last_modified=last_modified)
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified[header] = value
+        patch_vary_headers(not_modified, ['Authorization'])
+    return not_modified, headers
+
+
+def conditional_response(versions, cache_control='private, no-cache'):
+    """
+    Answer conditional GETs of a per-user view with 304 before it runs.
+
+    ``versions(request)`` names the versions the response is built from;
+    the response itself is not cached.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            names = versions(request)
+            current = get_versions(*names)
+            key = response_key('etag', [names, current], request, [method.__qualname__, args, kwargs])
+            not_modified, headers = conditional_get(request, key, current, cache_control)
+            if not_modified is not None:
+                return not_modified
+            response = method(view, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                for header, value in headers.items():
+                    response[header] = value
+            patch_vary_headers(response, ['Authorization'])
+            return response
+        return wrapper
+    return decorator
+
+
+def versioned_response(names, timeout, cache_control='public, no-cache', fresh=None):
+    """
+    Cache a public view method's 200 responses until one of ``names`` is
+    bumped or ``timeout`` (a settings name) seconds pass, and answer
+    conditional GETs with 304 before the cache is even read. ``names`` is a
+    version name, or a callable taking the view's arguments, such as
+    ``(request, book_id)``, and returning several; the first one labels the
+    cache lookups. Responses carry ``X-Cache: HIT`` or ``MISS``, and lookups
+    are counted in /metrics.
+
+    ``fresh(request, data)``, if given, returns cached data with the fields
+    that change without a version bump read again. Those responses are
+    validated against their body, so their 304s come after it runs.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(view, request, *args, **kwargs):
+            version_names = names(request, *args, **kwargs) if callable(names) else [names]
+            label = version_names[0]
+            versions = get_versions(*version_names)
+            key = response_key(label, versions, request, [method.__qualname__, args, kwargs])
+            if fresh is None:
+                not_modified, headers = conditional_get(request, key, versions, cache_control)
+                if not_modified is not None:
+                    return not_modified
+
+            data = cache.get(key)
+            if data is not None:
+                get_metrics().count_cache(label, 'hit')
+                response = Response(data if fresh is None else fresh(request, data), status=status.HTTP_200_OK)
+                response['X-Cache'] = 'HIT'
+            else:
+                get_metrics().count_cache(label, 'miss')
+                response = method(view, request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK:
+                    cache.set(key, response.data, getattr(settings, timeout))
+                response['X-Cache'] = 'MISS'
+
+            if response.status_code == status.HTTP_200_OK:
+                if fresh is not None:
+                    not_modified, headers = conditional_get(request, key, versions, cache_control, response.data)
+                    if not_modified is not None:
+                        return not_modified
+                for header, value in headers.items():
+                    response[header] = value
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,248 @@
+"""
+Deterministic synthetic library data for ``load_dummy_data --scale``.
+
+Every row draws from its own ``random.Random`` seeded by (seed, table, row
+number) and rows get explicit primary keys, so the same seed produces
+the same rows whatever the batch size or number of worker processes, and
+loans can reference users and books without looking them up. Popularity is
+skewed: a few categories, authors and books account for most rows, as in a
+real catalog, and loan history spans several years with a tail of overdue
+and late-returned loans.
+
+Rows are written with ``bulk_create``. Worker processes (``workers > 1``)
+each insert whole batches through their own connection; this needs the
+``fork`` start method and a database that accepts concurrent writers, so
+SQLite always loads in one process.
+"""
+import contextlib
+import multiprocessing
+import random
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.db.models import Max
+
+from books.models import Books
+from borrow.fines import daily_rate, late_fine, roll_up_student_fines
+from borrow.models import BorrowRecord
+from users.models import Student, User
+
+SYLLABLES = [
+    'an', 'bel', 'cor', 'da', 'el', 'fin', 'gar', 'hol', 'is', 'jor', 'ka', 'lum', 'mar', 'nor', 'os', 'pra',
+    'quin', 'ros', 'sel', 'tor', 'ul', 'ven', 'wyn', 'xa', 'yor', 'zen', 'bri', 'cal', 'dor', 'esk',
+]
+FIRST_NAMES = [
+    'Aditya', 'Priya', 'Raj', 'Sara', 'Vikram', 'Anita', 'Rahul', 'Maria', 'John', 'Wei', 'Fatima', 'Carlos',
+    'Olga', 'Kenji', 'Meera', 'Arjun', 'Divya', 'Karthik', 'Lakshmi', 'Nikhil',
+]
+LAST_NAMES = [
+    'Kumar', 'Singh', 'Patel', 'Ahmed', 'Sharma', 'Iyer', 'Nair', 'Reddy', 'Chen', 'Garcia', 'Khan', 'Smith',
+    'Tanaka', 'Menon', 'Das', 'Rao',
+]
+# Most popular first; weights fall off as 1 / rank
+CATEGORIES = [
+    'Fiction', 'Technology', 'Science', 'History', 'Business', 'Fantasy', 'Biography', 'Self-Help',
+    'Science Fiction', 'Psychology', 'Romance', 'Finance', 'Mathematics', 'Poetry', 'Philosophy', 'Art',
+]
+DEPARTMENTS = ['CSE', 'ECE', 'EEE', 'Mechanical', 'Civil', 'Chemical', 'Production', 'Metallurgy', 'Architecture']
+
+LOAN_DAYS = 14
+DEFAULT_PASSWORD = 'password123'
+
+
+def skewed_index(rng, size):
+    """An index in ``range(size)`` where low indexes are far more likely (log-uniform)."""
+    return min(int(size ** rng.random()) - 1, size - 1)
+
+
+def weighted(items):
+    weights = [1 / rank for rank in range(1, len(items) + 1)]
+    return items, weights
+
+
+@contextlib.contextmanager
+def historical_timestamps(*fields):
+    """Let bulk_create keep explicit values for ``auto_now_add`` fields."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Dataset:
+    """
+    A seeded library of ``books`` books, ``students`` students and about
+    ``loans`` borrow records, with history ending on ``as_of``.
+    """
+
+    def __init__(self, books, students, loans, seed=42, as_of=None, years=3, batch_size=5000,
+                 password=DEFAULT_PASSWORD, fine_rate=None):
+        self.books = books
+        self.students = students
+        self.loans_per_student = loans / students if students else 0
+        self.seed = seed
+        self.as_of = as_of or datetime.now(dt_timezone.utc).date()
+        self.history_days = int(years * 365)
+        self.batch_size = batch_size
+        self.fine_rate = daily_rate() if fine_rate is None else fine_rate
+        # One PBKDF2 hash shared by every generated user instead of one per row
+        self.password_hash = make_password(password)
+        self.categories = weighted(CATEGORIES)
+        self.departments = weighted(DEPARTMENTS)
+        self.author_count = max(books // 20, 10)
+
+    def rng(self, table, index):
+        return random.Random(f'{self.seed}:{table}:{index}')
+
+    def batches(self, total, rows_per_item=1):
+        """``(start, stop)`` ranges of ``total`` items sized to about ``batch_size`` rows each."""
+        step = max(int(self.batch_size / max(rows_per_item, 1)), 1)
+        return [(start, min(start + step, total)) for start in range(0, total, step)]
+
+    def allocate_ids(self):
+        """Reserve primary keys above anything already in the database."""
+        self.user_base = User.objects.aggregate(top=Max('id'))['top'] or 0
+        self.student_base = Student.objects.aggregate(top=Max('id'))['top'] or 0
+        self.book_base = Books.objects.aggregate(top=Max('id'))['top'] or 0
+
+    # Row generators: each returns the model instances of one batch
+
+    def user_rows(self, start, stop):
+        users, students = [], []
+        for index in range(start, stop):
+            rng = self.rng('users', index)
+            user_id = self.user_base + index + 1
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            joined = self.as_of - timedelta(days=rng.randint(0, self.history_days))
+            joined_at = datetime.combine(joined, time(rng.randint(8, 20), rng.randint(0, 59)), dt_timezone.utc)
+            users.append(User(
+                id=user_id, username=f'reader{user_id}', email=f'reader{user_id}@nitt.edu',
+                first_name=first, last_name=last, password=self.password_hash, role='student',
+                is_active=True, date_joined=joined_at,
+            ))
+            students.append(Student(
+                id=self.student_base + index + 1, user_id=user_id, roll_number=f'R{user_id:09d}',
+                department=rng.choices(*self.departments)[0], is_approved=rng.random() < 0.95,
+                phone=f'9{rng.randint(0, 999999999):09d}', created_at=joined_at,
+            ))
+        return users, students
+
+    def book_rows(self, start, stop):
+        rows = []
+        for index in range(start, stop):
+            rng = self.rng('books', index)
+            book_id = self.book_base + index + 1
+            words = [''.join(rng.sample(SYLLABLES, rng.randint(2, 3))) for _ in range(rng.randint(1, 4))]
+            author = skewed_index(rng, self.author_count)
+            category = rng.choices(*self.categories)[0]
+            rows.append(Books(
+                id=book_id,
+                title=' '.join(word.title() for word in words),
+                description=f'A {category.lower()} title from the synthetic catalog.',
+                category=category,
+                author=f'{FIRST_NAMES[author % len(FIRST_NAMES)]} {LAST_NAMES[author % len(LAST_NAMES)]} {author}',
+                isbn=f'978{book_id:010d}',
+                published_year=str(rng.randint(1900, self.as_of.year)),
+                num_pages=rng.randint(80, 1200),
+                average_rating=None if rng.random() < 0.05 else round(rng.triangular(1, 5, 4), 1),
+                available_copies=rng.choices([0, 1, 2, 3, 5, 8], [1, 3, 4, 3, 2, 1])[0],
+            ))
+        return rows
+
+    def loan_rows(self, start, stop):
+        """Loans of students ``start``..``stop``; each student's active loans are distinct books."""
+        rows = []
+        for index in range(start, stop):
+            rng = self.rng('loans', index)
+            user_id = self.user_base + index + 1
+            count = int(rng.expovariate(1 / self.loans_per_student)) if self.loans_per_student else 0
+            active_books = set()
+            for _ in range(count):
+                book_id = self.book_base + skewed_index(rng, self.books) + 1
+                age = rng.randint(0, self.history_days)
+                borrowed = self.as_of - timedelta(days=age)
+                due = borrowed + timedelta(days=LOAN_DAYS)
+                # Recent loans may still be out; anything older has come back, some of it late.
+                if age <= 45 and book_id not in active_books and rng.random() < 0.6:
+                    active_books.add(book_id)
+                    status, returned = ('overdue' if due < self.as_of else 'borrowed'), None
+                    fine = late_fine(due, self.as_of, self.fine_rate)
+                else:
+                    status = 'returned'
+                    late_days = int(rng.expovariate(1 / 6)) if rng.random() < 0.15 else 0
+                    returned = min(borrowed + timedelta(days=rng.randint(1, LOAN_DAYS) + late_days), self.as_of)
+                    fine = late_fine(due, returned, self.fine_rate)
+                created = datetime.combine(borrowed, time(rng.randint(9, 19), rng.randint(0, 59)), dt_timezone.utc)
+                rows.append(BorrowRecord(
+                    user_id=user_id, book_id=book_id, status=status, borrow_date=borrowed, due_date=due,
+                    return_date=returned, fine_amount=fine, created_at=created,
+                ))
+        return rows
+
+    # Loading
+
+    def load(self, workers=1, log=print):
+        """Insert the dataset and return the number of rows written per table."""
+        self.allocate_ids()
+        if connection.vendor == 'sqlite' or 'fork' not in multiprocessing.get_all_start_methods():
+            workers = 1
+
+        phases = [
+            ('students', self.students, 1, insert_users),
+            ('books', self.books, 1, insert_books),
+            ('loans', self.students, self.loans_per_student, insert_loans),
+        ]
+        totals = {}
+        for name, total, rows_per_item, task in phases:
+            jobs = [(self, start, stop) for start, stop in self.batches(total, rows_per_item)]
+            if workers > 1:
+                # Forked children must not share the parent's database connection.
+                connections.close_all()
+                with multiprocessing.get_context('fork').Pool(workers, initializer=connections.close_all) as pool:
+                    counts = pool.starmap(task, jobs, chunksize=1)
+            else:
+                counts = [task(*job) for job in jobs]
+            totals[name] = sum(counts)
+            log(f'  {name}: {totals[name]}')
+
+        reset_sequences(User, Student, Books, BorrowRecord)
+        roll_up_student_fines()
+        return totals
+
+
+# Worker tasks (module level so worker processes can run them)
+
+def insert_users(dataset, start, stop):
+    users, students = dataset.user_rows(start, stop)
+    User.objects.bulk_create(users)
+    with historical_timestamps(Student._meta.get_field('created_at')):
+        Student.objects.bulk_create(students)
+    return len(students)
+
+
+def insert_books(dataset, start, stop):
+    return len(Books.objects.bulk_create(dataset.book_rows(start, stop)))
+
+
+def insert_loans(dataset, start, stop):
+    fields = [BorrowRecord._meta.get_field('borrow_date'), BorrowRecord._meta.get_field('created_at')]
+    with historical_timestamps(*fields):
+        return len(BorrowRecord.objects.bulk_create(dataset.loan_rows(start, stop)))
+
+
+def reset_sequences(*models):
+    """Move id sequences past the explicit ids inserted (PostgreSQL; a no-op on SQLite)."""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def scaled_sizes(scale):
+    """Default table sizes for ``--scale N``: N books, N/10 students, 3N loans."""
+    return {'books': scale, 'students': max(scale // 10, 10), 'loans': scale * 3}
@@ -0,0 +1,66 @@
+"""
+Query-plan checks for tests: run an endpoint, EXPLAIN every SELECT it
+issued and fail if any of them reads a table with a sequential scan.
+
+Plans are taken on PostgreSQL with ``enable_seqscan = off``, which makes the
+planner use an index whenever one can answer the query at all, so a
+``Seq Scan`` left in the plan means no usable index exists, independent of
+how many rows the test loaded. SQLite's plans depend too much on its
+heuristics to say the same, so tests using this skip there.
+"""
+import contextlib
+import unittest
+
+from django.db import connection
+
+requires_postgresql = unittest.skipUnless(
+    connection.vendor == 'postgresql', 'Query plans are checked against PostgreSQL'
+)
+
+
+@contextlib.contextmanager
+def record_selects():
+    """Collect ``(sql, params)`` for every SELECT run inside the block."""
+    statements = []
+
+    def recorder(execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            statements.append((sql, params))
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(recorder):
+        yield statements
+
+
+def explain(sql, params):
+    """Return the plan of one statement as a list of lines."""
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+
+def sequential_scans(plan):
+    """Plan lines that read a whole table without an index."""
+    return [line.strip(' ->') for line in plan if 'Seq Scan' in line]
+
+
+class QueryPlanAssertions:
+    """TestCase mixin: ``assertNoSequentialScans`` around a block of requests (PostgreSQL only)."""
+
+    @contextlib.contextmanager
+    def assertNoSequentialScans(self):
+        with record_selects() as statements:
+            yield
+        self.assertTrue(statements, 'No SELECT statements were run')
+        failures = []
+        for sql, params in statements:
+            plan = explain(sql, params)
+            scans = sequential_scans(plan)
+            if scans:
+                failures.append(f"{sql}\n  -> {'; '.join(scans)}")
+        if failures:
+            self.fail('Sequential scans found:\n' + '\n'.join(failures))
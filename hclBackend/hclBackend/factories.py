@@ -0,0 +1,45 @@
+"""Model factories shared by the apps' tests."""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from books.models import Books
+from borrow.models import BorrowRecord
+from users.models import Student, User
+
+
+def make_student(username, approved=True, **profile):
+    user = User.objects.create(username=username, role='student')
+    Student.objects.create(user=user, roll_number=f'R-{username}', is_approved=approved, **profile)
+    return user
+
+
+def make_books(count, start=0, available_copies=3):
+    return Books.objects.bulk_create([
+        Books(
+            title=f'Book {index}',
+            description='',
+            category='General',
+            author='Author',
+            isbn=f'{index:013d}',
+            available_copies=available_copies,
+        )
+        for index in range(start, start + count)
+    ])
+
+
+def make_records(user, books, overdue=False):
+    """One active loan of each of ``books`` to ``user``, overdue by three days if ``overdue``."""
+    return make_loans([user] * len(books), overdue, books)
+
+
+def make_loans(users, overdue=False, books=None):
+    """One active loan per entry of ``users``, each of a new book unless ``books`` are given."""
+    if books is None:
+        books = make_books(len(users), start=Books.objects.count(), available_copies=1)
+    today = timezone.now().date()
+    due_date = today - timedelta(days=3) if overdue else today + timedelta(days=14)
+    return BorrowRecord.objects.bulk_create([
+        BorrowRecord(user=user, book=book, status='overdue' if overdue else 'borrowed', due_date=due_date)
+        for user, book in zip(users, books)
+    ])
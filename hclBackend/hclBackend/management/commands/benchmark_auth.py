@@ -0,0 +1,76 @@
+import json
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from hclBackend.benchmarking import isolated_database, summarize, timed
+from users.authentication import ClaimsJWTAuthentication, bump_auth_version, is_approved
+from users.models import Student, User
+from users.revocation import revocations
+from users.serializers import CustomTokenObtainPairSerializer
+
+
+def legacy_authorize(authentication, request):
+    """simplejwt's user lookup plus the borrow view's former approval query."""
+    user, _ = authentication.authenticate(request)
+    if user.role == 'student':
+        return Student.objects.only('is_approved').get(user__id=user.id).is_approved
+    return True
+
+
+def claims_authorize(authentication, request):
+    user, _ = authentication.authenticate(request)
+    return user.role == 'student' and is_approved(user)
+
+
+class Command(BaseCommand):
+    help = ('Benchmark per-request authentication + authorization cost: database user lookup vs '
+            'role/approval claims in the token')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Authenticated requests per mode')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        # One process, so its cache is as good as a shared one for the claims path
+        with isolated_database(), override_settings(CACHE_SHARED=True):
+            user = User.objects.create(username='bench-student', password=make_password(None), role='student')
+            Student.objects.create(user=user, roll_number='BENCH-1', is_approved=True)
+            # A token issued before a role/approval change is verified against the database
+            stale = CustomTokenObtainPairSerializer.get_token(user)
+            bump_auth_version(user.id)
+            modes = [
+                ('database', JWTAuthentication(), legacy_authorize, RefreshToken.for_user(user)),
+                ('claims', ClaimsJWTAuthentication(), claims_authorize,
+                 CustomTokenObtainPairSerializer.get_token(user)),
+                ('claims-stale', ClaimsJWTAuthentication(), claims_authorize, stale),
+            ]
+            report = [self.measure(*mode, options['requests']) for mode in modes]
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS('✓ Authentication benchmark complete'))
+
+    def measure(self, mode, authentication, authorize, token, requests):
+        request = RequestFactory().get('/api/borrow/history/', HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+        # The revocation sync is once a second, not per request: count the request itself
+        revocations.sync(force=True)
+        with CaptureQueriesContext(connection) as queries:
+            authorize(authentication, request)
+        samples = [timed(authorize, authentication, request)[0] for _ in range(requests)]
+        stats = summarize(samples)
+        row = {
+            'mode': mode, 'queries': len(queries),
+            'p50_us': round(stats['p50_ms'] * 1000, 1), 'p99_us': round(stats['p99_ms'] * 1000, 1),
+            'mean_us': round(stats['mean_ms'] * 1000, 1),
+        }
+        self.stdout.write(
+            f"  {mode:<13} queries={row['queries']}  p50={row['p50_us']:>8.1f}us  "
+            f"p99={row['p99_us']:>8.1f}us  mean={row['mean_us']:>8.1f}us"
+        )
+        return row
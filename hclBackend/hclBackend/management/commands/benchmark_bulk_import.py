@@ -0,0 +1,89 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError
+
+from books.importing import DEFAULT_BATCH_SIZE, IMPORT_DEFAULTS, import_books
+from books.models import Books
+from hclBackend.benchmarking import isolated_database, timed
+
+CATEGORIES = ['Fiction', 'Technology', 'History', 'Science', 'Biography', 'Fantasy', 'Business', 'Poetry']
+
+
+def legacy_import(rows):
+    """The pre-batching BulkUploadBooksView loop: one autocommitted INSERT per row."""
+    created = 0
+    for data in rows:
+        try:
+            Books.objects.create(**{**IMPORT_DEFAULTS, **data})
+            created += 1
+        except IntegrityError:
+            pass
+    return created
+
+
+class Command(BaseCommand):
+    help = 'Benchmark BulkUploadBooksView import throughput: per-row inserts vs batched bulk_create'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[10_000, 100_000, 1_000_000],
+                            help='Rows per import')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--legacy-max', type=int, default=10_000,
+                            help='Largest size to also run through the per-row loop (it is slow)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        report = []
+        # Every run gets its own ISBN range so the imports never collide.
+        next_isbn = 9780000000000
+
+        with isolated_database():
+            for size in sorted(options['sizes']):
+                rows = self.build_rows(rng, next_isbn, size)
+                next_isbn += size
+                runs = [
+                    ('batched', lambda: import_books(rows, batch_size=batch_size)),
+                    ('update', lambda: import_books(rows, on_conflict='update', batch_size=batch_size)),
+                ]
+                if size <= options['legacy_max']:
+                    legacy_rows = self.build_rows(rng, next_isbn, size)
+                    next_isbn += size
+                    runs.insert(0, ('per_row', lambda: legacy_import(legacy_rows)))
+
+                for mode, run in runs:
+                    elapsed, _ = timed(run)
+                    row = {
+                        'rows': size,
+                        'mode': mode,
+                        'elapsed_s': round(elapsed, 3),
+                        'rows_per_s': round(size / elapsed) if elapsed else None,
+                    }
+                    report.append(row)
+                    self.stdout.write(
+                        f"  {size:>9} rows  {mode:<8} {row['elapsed_s']:>9.2f}s  {row['rows_per_s']:>9} rows/s"
+                    )
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS('✓ Bulk import benchmark complete'))
+
+    def build_rows(self, rng, first_isbn, size):
+        return [
+            {
+                'title': f'Benchmark Book {first_isbn + index}',
+                'description': 'Synthetic benchmark book.',
+                'category': rng.choice(CATEGORIES),
+                'author': f'Author {rng.randint(1, 5000)}',
+                'isbn': f'{first_isbn + index}',
+                'published_year': str(rng.randint(1900, 2025)),
+                'num_pages': rng.randint(50, 1200),
+                'average_rating': round(rng.uniform(1, 5), 1),
+                'available_copies': rng.randint(0, 10),
+            }
+            for index in range(size)
+        ]
@@ -0,0 +1,439 @@
+import json
+import random
+import statistics
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timezone as dt_timezone
+from importlib import import_module
+from urllib.parse import urlencode
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import override_settings
+from django.urls import URLPattern, reverse
+from rest_framework.test import APIClient
+
+from books.models import Books
+from borrow.circulation import MAX_BATCH_ITEMS
+from borrow.models import BorrowRecord
+from hclBackend.benchmarking import analyze_tables, compare_reports, isolated_database, summarize, timed
+from hclBackend.caching import CATALOG, DASHBOARD, LOANS, bump_version
+from hclBackend.dataset import Dataset, scaled_sizes
+from users.models import Administrator, Student, User
+from users.serializers import CustomTokenObtainPairSerializer
+
+BENCH_PASSWORD = 'bench-password'
+BENCHMARKED_URLCONFS = ['books.urls', 'borrow.urls', 'admin.urls', 'users.urls']
+# Students per import request at most: each one costs a full PBKDF2 hash
+STUDENT_IMPORT_ROWS = 10
+
+# ``build`` names the Command method returning one (url args, query params, body) per iteration.
+Endpoint = namedtuple('Endpoint', 'label route method role build content_type', defaults=['json'])
+
+# Order matters: writes run after the reads they would disturb, and later
+# endpoints consume rows created by earlier ones (borrow -> renew -> return).
+ENDPOINTS = [
+    Endpoint('GET list_books', 'list_books', 'GET', 'anonymous', 'list_first_page'),
+    Endpoint('GET list_books?search', 'list_books', 'GET', 'anonymous', 'list_search'),
+    Endpoint('GET list_books?category&cursor', 'list_books', 'GET', 'anonymous', 'list_category'),
+    Endpoint('GET list_books?ordering', 'list_books', 'GET', 'anonymous', 'list_ordered'),
+    Endpoint('GET list_books?search&facets', 'list_books', 'GET', 'anonymous', 'list_search_facets'),
+    Endpoint('GET category_list', 'category_list', 'GET', 'anonymous', 'no_arguments'),
+    Endpoint('GET category_list?counts', 'category_list', 'GET', 'anonymous', 'category_counts'),
+    Endpoint('GET book_detail', 'book_detail', 'GET', 'anonymous', 'existing_book'),
+    Endpoint('GET export_books', 'export_books', 'GET', 'admin', 'export_rare_category'),
+    Endpoint('GET borrow_book', 'borrow_book', 'GET', 'student', 'no_arguments'),
+    Endpoint('GET borrow_book (admin)', 'borrow_book', 'GET', 'admin', 'no_arguments'),
+    Endpoint('GET borrow_history', 'borrow_history', 'GET', 'student', 'no_arguments'),
+    Endpoint('GET student_stats', 'student_stats', 'GET', 'student', 'no_arguments'),
+    Endpoint('GET export_borrow_records', 'export_borrow_records', 'GET', 'student', 'no_arguments'),
+    Endpoint('GET export_borrow_records?status', 'export_borrow_records', 'GET', 'admin', 'export_overdue'),
+    Endpoint('GET pending_registrations', 'pending_registrations', 'GET', 'admin', 'no_arguments'),
+    Endpoint('GET students_dues', 'students_dues', 'GET', 'admin', 'no_arguments'),
+    Endpoint('GET students_dues?has_overdue', 'students_dues', 'GET', 'admin', 'dues_overdue'),
+    Endpoint('GET admin_dashboard_stats', 'admin_dashboard_stats', 'GET', 'admin', 'no_arguments'),
+    Endpoint('GET admin_dashboard_stats?fresh', 'admin_dashboard_stats', 'GET', 'admin', 'dashboard_fresh'),
+    Endpoint('GET profile_list', 'profile_list', 'GET', 'admin', 'no_arguments'),
+    Endpoint('GET profile_detail', 'profile_detail', 'GET', 'admin', 'stored_profile'),
+    Endpoint('POST token_obtain_pair', 'token_obtain_pair', 'POST', 'anonymous', 'login'),
+    Endpoint('POST token_refresh', 'token_refresh', 'POST', 'anonymous', 'fresh_refresh_token'),
+    Endpoint('POST borrow_book', 'borrow_book', 'POST', 'student', 'borrowable_book'),
+    Endpoint('POST renew_book', 'renew_book', 'POST', 'student', 'borrowed_loan'),
+    Endpoint('POST return_book', 'return_book', 'POST', 'student', 'active_loan'),
+    Endpoint('POST batch_borrow', 'batch_borrow', 'POST', 'student', 'borrowable_batch'),
+    Endpoint('POST batch_return (admin)', 'batch_return', 'POST', 'admin', 'active_loan_batch'),
+    Endpoint('POST register', 'register', 'POST', 'anonymous', 'new_registration'),
+    Endpoint('POST logout', 'logout', 'POST', 'anonymous', 'fresh_refresh_token'),
+    Endpoint('POST import_students', 'import_students', 'POST', 'admin', 'student_import', 'text/csv'),
+    Endpoint('POST approve_reject_student (approve)', 'approve_reject_student', 'POST', 'admin', 'approve'),
+    Endpoint('POST approve_reject_student (reject)', 'approve_reject_student', 'POST', 'admin', 'reject'),
+    Endpoint('POST bulk_registration_action (approve)', 'bulk_registration_action', 'POST', 'admin', 'bulk_approve'),
+    Endpoint('POST bulk_registration_action (reject)', 'bulk_registration_action', 'POST', 'admin', 'bulk_reject'),
+    Endpoint('POST add_book', 'add_book', 'POST', 'admin', 'new_book'),
+    Endpoint('PUT book_detail', 'book_detail', 'PUT', 'admin', 'book_update'),
+    Endpoint('DELETE book_detail', 'book_detail', 'DELETE', 'admin', 'added_book'),
+    Endpoint('POST bulk_upload_books', 'bulk_upload_books', 'POST', 'admin', 'bulk_upload'),
+    Endpoint('POST stream_upload_books', 'stream_upload_books', 'POST', 'admin', 'stream_upload', 'text/csv'),
+]
+
+
+def benchmarked_routes():
+    """Names of every route in the app URLconfs the suite must cover."""
+    return {
+        pattern.name
+        for module in BENCHMARKED_URLCONFS
+        for pattern in import_module(module).urlpatterns
+        if isinstance(pattern, URLPattern)
+    }
+
+
+def uncovered_routes():
+    return sorted(benchmarked_routes() - {endpoint.route for endpoint in ENDPOINTS})
+
+
+class Command(BaseCommand):
+    help = ('Measure latency percentiles, query count and SQL time of every API route against a seeded '
+            'dataset, optionally failing on regressions against a saved baseline')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10_000, help='Dataset size (see load_dummy_data --scale)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--workers', type=int, default=1, help='Processes used to load the dataset')
+        parser.add_argument('--iterations', type=int, default=50, help='Measured requests per endpoint')
+        parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests per endpoint')
+        parser.add_argument('--upload-rows', type=int, default=100, help='Rows per bulk request')
+        parser.add_argument('--only', nargs='+', default=[], metavar='TEXT',
+                            help='Only run endpoints whose label contains one of these strings')
+        parser.add_argument('--output', help='Write the JSON report to this file (e.g. to save a baseline)')
+        parser.add_argument('--baseline', help='Compare against a previously saved report')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative slowdown of p50/p95 before failing (0.2 = 20%%)')
+        parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                            help='Ignore slowdowns smaller than this many milliseconds')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as handle:
+                baseline = json.load(handle)
+
+        with isolated_database():
+            self.seed(options)
+            report = self.run(options)
+
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+            self.stdout.write(f"Report written to {options['output']}")
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+
+        missing = uncovered_routes()
+        if missing:
+            self.stderr.write(self.style.WARNING(f"Routes without a benchmark: {', '.join(missing)}"))
+        if baseline is not None:
+            regressions = compare_reports(baseline, report, options['threshold'], options['min_delta_ms'])
+            for regression in regressions:
+                self.stderr.write(self.style.ERROR(
+                    f"  {regression['endpoint']}: {regression['metric']} "
+                    f"{regression['baseline']} -> {regression['current']}"
+                ))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f"✓ No regressions against {options['baseline']}"))
+        self.stdout.write(self.style.SUCCESS('✓ Endpoint benchmark complete'))
+
+    # Setup
+
+    def seed(self, options):
+        sizes = scaled_sizes(options['scale'])
+        self.stdout.write(
+            f"Loading {sizes['books']} books, {sizes['students']} students and ~{sizes['loans']} loans..."
+        )
+        Dataset(**sizes, seed=options['seed']).load(workers=options['workers'], log=lambda message: None)
+        analyze_tables(Books._meta.db_table, BorrowRecord._meta.db_table, Student._meta.db_table,
+                       User._meta.db_table)
+        bump_version(CATALOG, DASHBOARD, LOANS)
+
+    def prepare(self, options):
+        self.rng = random.Random(options['seed'])
+        self.upload_rows = options['upload_rows']
+        self.batch_items = min(self.upload_rows, MAX_BATCH_ITEMS)
+        password = make_password(BENCH_PASSWORD)
+        admin = User.objects.create(username='bench-admin', password=password, role='administrator')
+        Administrator.objects.create(user=admin)
+        # The busiest approved reader, so history and stats pages are the worst case.
+        busiest = BorrowRecord.objects.filter(user__student_profile__is_approved=True).values('user_id').annotate(
+            loans=Count('id')
+        ).order_by('-loans', 'user_id').first()
+        self.student = User.objects.get(id=busiest['user_id'])
+        self.student.password = password
+        self.student.save(update_fields=['password'])
+
+        self.clients = {'anonymous': APIClient()}
+        for role, user in (('admin', admin), ('student', self.student)):
+            client = APIClient()
+            token = CustomTokenObtainPairSerializer.get_token(user)
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+            self.clients[role] = client
+        self.book_ids = list(Books.objects.order_by('id').values_list('id', flat=True))
+        self.title_words = [
+            title.split()[0] for title in Books.objects.order_by('?').values_list('title', flat=True)[:200]
+        ]
+
+    # Measurement
+
+    def run(self, options):
+        self.prepare(options)
+        count = options['warmup'] + options['iterations']
+        endpoints = [
+            endpoint for endpoint in ENDPOINTS
+            if not options['only'] or any(text in endpoint.label for text in options['only'])
+        ]
+        results = {}
+        for endpoint in endpoints:
+            requests = getattr(self, endpoint.build)(count)
+            samples, queries, sql_times, statuses = [], [], [], Counter()
+            for index, (args, params, data) in enumerate(requests):
+                elapsed, (status_code, query_times) = timed(self.send, endpoint, args, params, data)
+                if index < options['warmup']:
+                    continue
+                samples.append(elapsed)
+                queries.append(len(query_times))
+                sql_times.append(sum(query_times))
+                statuses[str(status_code)] += 1
+            results[endpoint.label] = {
+                'route': endpoint.route,
+                'method': endpoint.method,
+                'statuses': dict(statuses),
+                'errors': sum(n for code, n in statuses.items() if not code.startswith('2')),
+                **summarize(samples),
+                'queries': statistics.median_low(queries) if queries else 0,
+                'queries_max': max(queries, default=0),
+                'sql_ms': round(statistics.mean(sql_times) * 1000, 3) if sql_times else 0.0,
+            }
+            self.stdout.write(f"  {endpoint.label:<45} p50={results[endpoint.label]['p50_ms']:>9.2f}ms")
+
+        return {
+            'meta': {
+                'created_at': datetime.now(dt_timezone.utc).isoformat(),
+                'database': connection.vendor,
+                'scale': options['scale'],
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+            },
+            'endpoints': results,
+        }
+
+    def send(self, endpoint, args, params, data):
+        """Issue one request, reading streamed bodies to the end; returns (status, duration of each query)."""
+        url = reverse(endpoint.route, args=args)
+        if params:
+            url = f'{url}?{urlencode(params)}'
+        body, content_type = None, None
+        if data is not None:
+            if endpoint.content_type == 'json':
+                body, content_type = json.dumps(data), 'application/json'
+            else:
+                body, content_type = data, endpoint.content_type
+        client = self.clients[endpoint.role]
+        query_times = []
+
+        def time_query(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                query_times.append(time.perf_counter() - start)
+
+        with connection.execute_wrapper(time_query):
+            if body is None:
+                response = client.generic(endpoint.method, url)
+            else:
+                response = client.generic(endpoint.method, url, body, content_type=content_type)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        return response.status_code, query_times
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"\n{'endpoint':<45} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'sql ms':>8} {'errors':>6}"
+        )
+        for label, row in report['endpoints'].items():
+            self.stdout.write(
+                f"{label:<45} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} "
+                f"{row['queries']:>8} {row['sql_ms']:>8.2f} {row['errors']:>6}"
+            )
+
+    # Request builders: each returns ``count`` (url args, query params, body) tuples
+
+    def repeat(self, count, args=(), params=None, data=None):
+        return [(list(args), params, data)] * count
+
+    def no_arguments(self, count):
+        return self.repeat(count)
+
+    def list_first_page(self, count):
+        return self.repeat(count, params={'page': 1})
+
+    def list_search(self, count):
+        return [([], {'search': self.rng.choice(self.title_words)}, None) for _ in range(count)]
+
+    def list_search_facets(self, count):
+        return [([], {'search': self.rng.choice(self.title_words), 'facets': 'true'}, None) for _ in range(count)]
+
+    def category_counts(self, count):
+        return self.repeat(count, params={'counts': 'true'})
+
+    def list_category(self, count):
+        categories = list(Books.objects.values_list('category', flat=True).distinct())
+        return [([], {'category': self.rng.choice(categories), 'cursor': ''}, None) for _ in range(count)]
+
+    def list_ordered(self, count):
+        fields = ['title', '-published_year', '-average_rating']
+        pages = min(max(len(self.book_ids) // 10, 1), 20)
+        return [([], {'ordering': self.rng.choice(fields), 'page': self.rng.randint(1, pages)}, None)
+                for _ in range(count)]
+
+    def existing_book(self, count):
+        return [([self.rng.choice(self.book_ids)], None, None) for _ in range(count)]
+
+    def export_rare_category(self, count):
+        rarest = Books.objects.values('category').annotate(n=Count('id')).order_by('n', 'category').first()
+        return self.repeat(count, params={'category': rarest['category']})
+
+    def export_overdue(self, count):
+        return self.repeat(count, params={'status': 'overdue'})
+
+    def dues_overdue(self, count):
+        return self.repeat(count, params={'has_overdue': 'true'})
+
+    def dashboard_fresh(self, count):
+        return self.repeat(count, params={'fresh': '1'})
+
+    def stored_profile(self, count):
+        with override_settings(PROFILING_ENABLED=True):
+            response = self.clients['admin'].get(
+                reverse('admin_dashboard_stats'), {'fresh': '1'}, HTTP_X_PROFILE='1'
+            )
+        return self.repeat(count, args=[response['X-Profile-Id']])
+
+    def login(self, count):
+        return self.repeat(count, data={'username': self.student.username, 'password': BENCH_PASSWORD})
+
+    def fresh_refresh_token(self, count):
+        # Refreshing or logging out revokes the refresh token, so each request gets its own
+        return [
+            ([], None, {'refresh': str(CustomTokenObtainPairSerializer.get_token(self.student))})
+            for _ in range(count)
+        ]
+
+    def borrowable_book(self, count):
+        held = set(BorrowRecord.objects.filter(
+            user=self.student, status__in=BorrowRecord.ACTIVE_STATUSES
+        ).values_list('book_id', flat=True))
+        books = Books.objects.filter(available_copies__gt=0).exclude(id__in=held).order_by('id')
+        return [([], None, {'book_id': book_id}) for book_id in books.values_list('id', flat=True)[:count]]
+
+    def borrowed_loan(self, count):
+        loans = list(BorrowRecord.objects.filter(
+            user=self.student, status='borrowed'
+        ).order_by('-id').values_list('id', flat=True)[:count])
+        return [([loans[index % len(loans)]], None, None) for index in range(count)] if loans else []
+
+    def active_loan(self, count):
+        loans = BorrowRecord.objects.filter(
+            user=self.student, status__in=BorrowRecord.ACTIVE_STATUSES
+        ).order_by('-id').values_list('id', flat=True)[:count]
+        return [([loan_id], None, None) for loan_id in loans]
+
+    def borrowable_batch(self, count):
+        books = [data['book_id'] for _, _, data in self.borrowable_book(count * self.batch_items)]
+        return [([], None, {'book_ids': books[index::count]}) for index in range(count) if books[index::count]]
+
+    def active_loan_batch(self, count):
+        loans = list(BorrowRecord.objects.filter(
+            user=self.student, status__in=BorrowRecord.ACTIVE_STATUSES
+        ).order_by('-id').values_list('id', flat=True)[:count * self.batch_items])
+        return [([], None, {'borrow_ids': loans[index::count]}) for index in range(count) if loans[index::count]]
+
+    def new_registration(self, count):
+        return [([], None, {
+            'username': f'bench-register-{index}', 'email': f'bench-register-{index}@nitt.edu',
+            'password': BENCH_PASSWORD, 'roll_number': f'BR{index:07d}', 'full_name': 'Bench Reader',
+            'department': 'CSE',
+        }) for index in range(count)]
+
+    def student_import(self, count):
+        requests = []
+        for index in range(count):
+            lines = ['username,email,roll_number,department,full_name,password']
+            for row in range(min(self.upload_rows, STUDENT_IMPORT_ROWS)):
+                name = f'bench-import-{index}-{row}'
+                lines.append(f'{name},{name}@nitt.edu,BI{index:05d}{row:03d},CSE,Bench Importer,{BENCH_PASSWORD}')
+            requests.append(([], None, '\n'.join(lines).encode()))
+        return requests
+
+    def pending_students(self, count, prefix):
+        password = make_password(BENCH_PASSWORD)
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}-{index}', password=password, role='student') for index in range(count)
+        ])
+        students = Student.objects.bulk_create([
+            Student(user=user, roll_number=f'{prefix[:3].upper()}{user.id}', is_approved=False) for user in users
+        ])
+        return [student.id for student in students]
+
+    def approve(self, count):
+        return [([student_id], None, {'action': 'approve'})
+                for student_id in self.pending_students(count, 'bench-approve')]
+
+    def reject(self, count):
+        return [([student_id], None, {'action': 'reject'})
+                for student_id in self.pending_students(count, 'bench-reject')]
+
+    def bulk_approve(self, count):
+        ids = self.pending_students(count * self.upload_rows, 'bench-bulk-approve')
+        return [([], None, {'action': 'approve', 'ids': ids[index::count]}) for index in range(count)]
+
+    def bulk_reject(self, count):
+        ids = self.pending_students(count * self.upload_rows, 'bench-bulk-reject')
+        return [([], None, {'action': 'reject', 'ids': ids[index::count]}) for index in range(count)]
+
+    def new_book(self, count):
+        return [([], None, {
+            'title': f'Benchmark Book {index}', 'description': 'Added by benchmark_endpoints.',
+            'category': 'Technology', 'author': 'Bench Author', 'isbn': f'9791{index:09d}',
+            'published_year': '2024', 'available_copies': 3,
+        }) for index in range(count)]
+
+    def book_update(self, count):
+        return [([self.rng.choice(self.book_ids)], None, {'available_copies': self.rng.randint(1, 5)})
+                for _ in range(count)]
+
+    def added_book(self, count):
+        added = Books.objects.filter(isbn__startswith='9791').order_by('id').values_list('id', flat=True)[:count]
+        return [([book_id], None, None) for book_id in added]
+
+    def upload_rows_for(self, prefix, index):
+        return [
+            {'title': f'Uploaded Book {index}-{row}', 'author': 'Bench Author', 'category': 'Science',
+             'isbn': f'{prefix}{index:05d}{row:04d}', 'published_year': '2023', 'available_copies': 2}
+            for row in range(self.upload_rows)
+        ]
+
+    def bulk_upload(self, count):
+        return [([], None, self.upload_rows_for('9792', index)) for index in range(count)]
+
+    def stream_upload(self, count):
+        requests = []
+        for index in range(count):
+            rows = self.upload_rows_for('9793', index)
+            lines = [','.join(rows[0])] + [','.join(str(value) for value in row.values()) for row in rows]
+            requests.append(([], None, '\n'.join(lines).encode()))
+        return requests
@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+import tempfile
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from hclBackend.benchmarking import summarize, timed
+from hclBackend.middleware import request_fields
+from hclBackend.request_logging import BackgroundHandler
+
+
+def legacy_log(logger, request, response):
+    """The pre-queue APIKeyMiddleware logging: re-serialised body and two synchronous f-string lines."""
+    if request.method in ['POST', 'PUT', 'PATCH']:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if request.content_type == 'application/json' and length <= 64 * 1024:
+            body = request.body.decode('utf-8') if request.body else ""
+            try:
+                body_data = json.dumps(json.loads(body) if body else {})
+            except json.JSONDecodeError:
+                body_data = json.dumps(body)
+        else:
+            body_data = f"<{length} bytes {request.content_type}>"
+        logger.info(f"📤 [{request.method}] {request.path} | Body: {body_data} | User: {request.user}")
+    logger.info(f"📥 [{response.status_code}] {request.method} {request.path}")
+
+
+def structured_log(logger, request, response):
+    logger.info('request', extra={'data': request_fields(request, response, 0.0125)})
+
+
+class Command(BaseCommand):
+    help = 'Benchmark request-thread logging cost: legacy synchronous lines vs the background JSON queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Log calls per body size and mode')
+        parser.add_argument('--body-sizes', nargs='+', type=int, default=[100, 16_384, 60_000],
+                            help='JSON body sizes in bytes (login ~100, bulk upload chunks larger)')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        report = []
+        with tempfile.TemporaryDirectory() as directory:
+            for size in options['body_sizes']:
+                request = factory.post('/api/books/bulk-upload/', self.body(size), content_type='application/json')
+                request.user = AnonymousUser()
+                response = HttpResponse(status=201)
+
+                for mode, handler, log in (
+                    ('legacy', logging.StreamHandler, legacy_log),
+                    ('background', BackgroundHandler, structured_log),
+                ):
+                    with open(os.path.join(directory, f'{mode}-{size}.log'), 'w') as stream:
+                        logger = self.isolated_logger(f'benchmark_logging.{mode}', handler(stream))
+                        samples = [timed(log, logger, request, response)[0] for _ in range(options['requests'])]
+                        drain, _ = timed(logger.handlers[0].flush)
+                        if isinstance(logger.handlers[0], BackgroundHandler):
+                            logger.handlers[0].stop()
+                    stats = summarize(samples)
+                    row = {
+                        'body_bytes': size, 'mode': mode,
+                        'p50_us': round(stats['p50_ms'] * 1000, 1), 'p99_us': round(stats['p99_ms'] * 1000, 1),
+                        'mean_us': round(stats['mean_ms'] * 1000, 1), 'flush_ms': round(drain * 1000, 1),
+                    }
+                    report.append(row)
+                    self.stdout.write(
+                        f"  {size:>7}B {mode:<10} p50={row['p50_us']:>8.1f}us  p99={row['p99_us']:>8.1f}us  "
+                        f"mean={row['mean_us']:>8.1f}us  flush={row['flush_ms']}ms"
+                    )
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS('✓ Logging benchmark complete'))
+
+    def body(self, size):
+        row = {'title': 'Benchmark Book', 'author': 'Bench Author', 'isbn': '9780000000000', 'password': 'secret'}
+        rows = [row] * max(size // len(json.dumps(row)), 1)
+        return json.dumps(rows)
+
+    def isolated_logger(self, name, handler):
+        logger = logging.getLogger(name)
+        logger.handlers = [handler]
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        if not isinstance(handler, BackgroundHandler):
+            handler.setFormatter(logging.Formatter('{levelname} {asctime} {module} {message}', style='{'))
+        return logger
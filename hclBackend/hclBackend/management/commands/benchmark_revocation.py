@@ -0,0 +1,97 @@
+import json
+import time
+import uuid
+from datetime import UTC, datetime
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+
+from hclBackend.benchmarking import isolated_database, summarize, timed
+from users.models import RevokedToken
+from users.revocation import BloomFilter, RevocationStore
+
+
+class QueryCounter:
+    """An execute wrapper counting database round trips, however many there are."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def lookup_only(jti):
+    return RevokedToken.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+
+
+class Command(BaseCommand):
+    help = ('Benchmark revoked-token checks with a large revocation set: the per-process Bloom filter '
+            'against asking the database on every request')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--revoked', type=int, default=10_000_000, help='Revoked tokens in the filter')
+        parser.add_argument('--error-rate', type=float, default=0.001, help='Target Bloom false-positive rate')
+        parser.add_argument('--checks', type=int, default=100_000, help='Checks measured per mode')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        revoked_count, checks = options['revoked'], options['checks']
+        with isolated_database():
+            store = RevocationStore(capacity=revoked_count, error_rate=options['error_rate'], sync_interval=3600)
+            store.sync()
+            bloom = store.filter = BloomFilter(revoked_count, options['error_rate'])
+
+            self.stdout.write(f"Adding {revoked_count:,} revoked jtis to the filter...")
+            start = time.perf_counter()
+            sample = []
+            for index in range(revoked_count):
+                jti = uuid.UUID(int=index).hex
+                bloom.add(jti)
+                if index < checks:
+                    sample.append(jti)
+            build_s = time.perf_counter() - start
+            # Only the sampled revocations need the authoritative row to confirm a filter hit
+            expires_at = datetime.fromtimestamp(time.time() + 3600, tz=UTC)
+            RevokedToken.objects.bulk_create(
+                [RevokedToken(jti=jti, expires_at=expires_at) for jti in sample], batch_size=1000
+            )
+
+            live = [uuid.uuid4().hex for _ in range(checks)]
+            report = {
+                'revoked': revoked_count,
+                'filter_mb': round(len(bloom.bits) / 1e6, 1),
+                'hashes': bloom.hashes,
+                'build_s': round(build_s, 1),
+                'false_positive_rate': sum(jti in bloom for jti in live) / checks,
+                'modes': [
+                    self.measure('bloom, not revoked', store.is_revoked, live),
+                    self.measure('bloom, revoked', store.is_revoked, sample),
+                    self.measure('database lookup only', lookup_only, live),
+                ],
+            }
+        self.stdout.write(
+            f"  filter={report['filter_mb']}MB  hashes={report['hashes']}  build={report['build_s']}s  "
+            f"false positives={report['false_positive_rate']:.4%}"
+        )
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS('✓ Revocation benchmark complete'))
+
+    def measure(self, mode, check, jtis):
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            samples = [timed(check, jti)[0] for jti in jtis]
+        stats = summarize(samples)
+        row = {
+            'mode': mode, 'queries_per_check': round(queries.count / len(jtis), 4),
+            'p50_us': round(stats['p50_ms'] * 1000, 1), 'p99_us': round(stats['p99_ms'] * 1000, 1),
+            'mean_us': round(stats['mean_ms'] * 1000, 1),
+        }
+        self.stdout.write(
+            f"  {mode:<20} queries/check={row['queries_per_check']:<7} p50={row['p50_us']:>6.1f}us  "
+            f"p99={row['p99_us']:>6.1f}us  mean={row['mean_us']:>6.1f}us"
+        )
+        return row
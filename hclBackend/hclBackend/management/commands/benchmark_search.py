@@ -0,0 +1,97 @@
+import json
+import random
+
+from django.core.management.base import BaseCommand
+
+from books.models import Books
+from books.search import legacy_search, search_books
+from hclBackend.benchmarking import analyze_tables, isolated_database, summarize, timed
+
+SYLLABLES = [
+    'an', 'bel', 'cor', 'da', 'el', 'fin', 'gar', 'hol', 'is', 'jor', 'ka', 'lum', 'mar', 'nor', 'os', 'pra',
+    'quin', 'ros', 'sel', 'tor', 'ul', 'ven', 'wyn', 'xa', 'yor', 'zen', 'bri', 'cal', 'dor', 'esk',
+]
+FIRST_NAMES = ['Anita', 'Rahul', 'Maria', 'John', 'Wei', 'Fatima', 'Carlos', 'Priya', 'Olga', 'Kenji']
+LAST_NAMES = ['Sharma', 'Smith', 'Garcia', 'Chen', 'Khan', 'Ivanova', 'Tanaka', 'Nair', 'Brown', 'Okafor']
+CATEGORIES = ['Fiction', 'Technology', 'History', 'Science', 'Biography', 'Fantasy', 'Business', 'Poetry']
+
+
+class Command(BaseCommand):
+    help = 'Benchmark ListBooksView search latency: legacy icontains scan vs the full-text index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100_000, 1_000_000],
+                            help='Catalog sizes to measure at (ascending)')
+        parser.add_argument('--queries', type=int, default=200, help='Search queries per size and mode')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # A few thousand distinct words with a Zipf-like frequency, like real titles.
+        self.words = sorted({''.join(rng.sample(SYLLABLES, rng.randint(2, 3))) for _ in range(5000)})
+        rng.shuffle(self.words)
+        self.weights = [1 / (rank + 1) for rank in range(len(self.words))]
+        queries = self.build_queries(rng, options['queries'])
+        report = []
+
+        with isolated_database():
+            loaded = 0
+            for size in sorted(options['sizes']):
+                self.stdout.write(f"Loading {size} books...")
+                self.load_books(rng, loaded, size, options['batch_size'])
+                loaded = size
+                analyze_tables(Books._meta.db_table)
+
+                for mode, search in (('legacy', legacy_search), ('indexed', search_books)):
+                    samples = [timed(self.run_search, search, query)[0] for query in queries]
+                    row = {'books': size, 'mode': mode, **summarize(samples)}
+                    report.append(row)
+                    self.stdout.write(
+                        f"  {mode:<8} p50={row['p50_ms']:>9.2f}ms  p99={row['p99_ms']:>9.2f}ms  "
+                        f"mean={row['mean_ms']:>9.2f}ms"
+                    )
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS('✓ Search benchmark complete'))
+
+    def build_queries(self, rng, count):
+        # Mimic SearchPage keystrokes: growing prefixes of one or two words.
+        queries = []
+        while len(queries) < count:
+            word, other = self.pick_words(rng, 2)
+            for end in range(2, len(word) + 1):
+                queries.append(word[:end])
+            queries.append(f"{word} {other[:3]}")
+        return queries[:count]
+
+    def load_books(self, rng, start, stop, batch_size):
+        for offset in range(start, stop, batch_size):
+            Books.objects.bulk_create([
+                Books(
+                    title=' '.join(word.title() for word in self.pick_words(rng, rng.randint(2, 4))),
+                    description='Synthetic benchmark book.',
+                    category=rng.choice(CATEGORIES),
+                    author=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    isbn=f"{9780000000000 + index}",
+                    published_year=str(rng.randint(1900, 2025)),
+                    average_rating=round(rng.uniform(1, 5), 1),
+                    available_copies=rng.randint(0, 10),
+                )
+                for index in range(offset, min(offset + batch_size, stop))
+            ])
+
+    def pick_words(self, rng, count):
+        return rng.choices(self.words, weights=self.weights, k=count)
+
+    def run_search(self, search, query):
+        # Same work ListBooksView does for a first page: COUNT(*) plus one page of rows.
+        books = search(Books.objects.all(), query)
+        if search is search_books:
+            books = books.order_by('-search_rank', '-id')
+        else:
+            books = books.order_by('-id')
+        books.count()
+        return list(books[:10])
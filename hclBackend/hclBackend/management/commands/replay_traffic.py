@@ -0,0 +1,58 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from hclBackend.dataset import DEFAULT_PASSWORD
+from hclBackend.traffic import Replayer, TokenMinter, load_entries
+
+
+class Command(BaseCommand):
+    help = 'Replay a TRAFFIC_LOG recording against a running server and report throughput and latency per route'
+
+    def add_arguments(self, parser):
+        parser.add_argument('log', help='JSONL file written with TRAFFIC_LOG set')
+        parser.add_argument('--target', default='http://127.0.0.1:8000', help='Base URL of the server to load')
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help='Replay N times faster than recorded; 0 sends as fast as possible')
+        parser.add_argument('--concurrency', type=int, default=8, help='Requests in flight at once')
+        parser.add_argument('--limit', type=int, help='Replay only the first N requests')
+        parser.add_argument('--password', default=DEFAULT_PASSWORD,
+                            help='Sent wherever a recorded password was redacted')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        entries = load_entries(options['log'], options['limit'])
+        if not entries:
+            raise CommandError(f"No requests recorded in {options['log']}")
+        span = entries[-1]['ts'] - entries[0]['ts']
+        self.stdout.write(
+            f"Replaying {len(entries)} requests recorded over {span:.1f}s against {options['target']} "
+            f"(speed {options['speed'] or 'max'}, concurrency {options['concurrency']})..."
+        )
+        # Tokens are minted locally, so this must share the target's database and SECRET_KEY.
+        replayer = Replayer(
+            options['target'], speed=options['speed'], concurrency=options['concurrency'],
+            tokens=TokenMinter(entries), password=options['password'],
+        )
+        report = replayer.run(entries)
+
+        self.stdout.write(
+            f"\n{'route':<45} {'count':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>6}"
+        )
+        for label, row in report['routes'].items():
+            self.stdout.write(
+                f"{label:<45} {row['count']:>7} {row['throughput_rps']:>8.1f} {row['p50_ms']:>9.2f} "
+                f"{row['p95_ms']:>9.2f} {row['p99_ms']:>9.2f} {row['errors']:>6}"
+            )
+        if report['skipped']:
+            self.stdout.write(f"Skipped: {report['skipped']}")
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                json.dump(report, handle, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {report['requests']} requests in {report['elapsed_s']}s ({report['throughput_rps']} req/s), "
+            f"max schedule lag {report['max_schedule_lag_ms']}ms"
+        ))
@@ -0,0 +1,99 @@
+import json
+import random
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from books.models import Books
+from borrow.models import BorrowRecord
+from hclBackend.benchmarking import isolated_database, summarize
+from users.models import Student, User
+
+
+class Command(BaseCommand):
+    help = 'Fire concurrent borrows at one hot book and check for oversell (semester-start rush)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=5000, help='Total borrow requests to fire')
+        parser.add_argument('--students', type=int, default=1000)
+        parser.add_argument('--copies', type=int, default=100, help='Copies of the hot book')
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            raise CommandError('SQLite serialises writers; run this against PostgreSQL (set DB_NAME/DB_USER)')
+
+        with isolated_database():
+            report = self.run(options)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        if report['oversold']:
+            raise CommandError(f"Oversold: {report['active_loans']} loans for {options['copies']} copies")
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {report['attempts']} borrows in {report['elapsed_s']}s "
+            f"({report['requests_per_s']} req/s), {report['active_loans']} loans, no oversell"
+        ))
+
+    def run(self, options):
+        book = Books.objects.create(
+            title='Hot Book', description='', category='Textbook', author='Author', isbn='9999999999999',
+            available_copies=options['copies'],
+        )
+        users = User.objects.bulk_create([
+            User(username=f'rush{index}', role='student') for index in range(options['students'])
+        ])
+        Student.objects.bulk_create([
+            Student(user=user, roll_number=f'RUSH{user.id}', is_approved=True) for user in users
+        ])
+
+        rng = random.Random(options['seed'])
+        attempts = [rng.choice(users) for _ in range(options['attempts'])]
+        threads = options['threads']
+        url = reverse('borrow_book')
+        statuses, latencies = [], []
+        barrier = threading.Barrier(threads + 1)
+
+        def hammer(batch):
+            client = APIClient()
+            barrier.wait()
+            try:
+                for user in batch:
+                    client.force_authenticate(user)
+                    started = time.perf_counter()
+                    response = client.post(url, {'book_id': book.id}, format='json')
+                    latencies.append(time.perf_counter() - started)
+                    statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=hammer, args=(attempts[i::threads],)) for i in range(threads)]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        started = time.perf_counter()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        book.refresh_from_db()
+        active_loans = BorrowRecord.objects.filter(book=book, status__in=BorrowRecord.ACTIVE_STATUSES).count()
+        return {
+            'attempts': len(statuses),
+            'threads': threads,
+            'copies': options['copies'],
+            'status_codes': {str(code): statuses.count(code) for code in sorted(set(statuses))},
+            'active_loans': active_loans,
+            'available_copies': book.available_copies,
+            'oversold': active_loans > options['copies'] or book.available_copies < 0
+            or active_loans + book.available_copies != options['copies'],
+            'elapsed_s': round(elapsed, 3),
+            'requests_per_s': round(len(statuses) / elapsed, 1),
+            'latency': summarize(latencies),
+        }
@@ -0,0 +1,36 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from borrow.fines import DEFAULT_CHUNK_SIZE, daily_rate, sweep
+from hclBackend.caching import DASHBOARD, LOANS, bump_version
+
+
+class Command(BaseCommand):
+    help = 'Mark loans past their due date overdue, accrue their fines and roll totals up to students'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+                            help='Rows per UPDATE statement')
+        parser.add_argument('--rate', help='Fine per overdue day (default: settings.FINE_PER_DAY)')
+        parser.add_argument('--date', help='Sweep as of this YYYY-MM-DD date instead of today')
+
+    def handle(self, *args, **options):
+        try:
+            rate = Decimal(options['rate']) if options['rate'] else daily_rate()
+            today = date.fromisoformat(options['date']) if options['date'] else timezone.now().date()
+        except (InvalidOperation, ValueError) as exc:
+            raise CommandError(f'Invalid option: {exc}')
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+
+        result = sweep(today, rate=rate, chunk_size=options['chunk_size'])
+        if any(result.values()):
+            bump_version(DASHBOARD, LOANS)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ Swept loans as of {today}: {result['marked_overdue']} marked overdue, "
+            f"{result['fines_updated']} fines updated, {result['students_updated']} student totals updated"
+        ))
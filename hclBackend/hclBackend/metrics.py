@@ -0,0 +1,303 @@
+"""
+Prometheus metrics for the API, aggregated across gunicorn workers.
+
+``MetricsMiddleware`` records, per route (the URL pattern, so ids don't
+multiply series) and method: requests by status, a latency histogram, SQL
+query count and SQL time. It also tracks the requests in flight and the
+response caches' hits and misses (``hclBackend.caching``). Recording is a
+few dict updates under a lock in the worker's memory.
+
+Each worker snapshots its numbers to ``METRICS_DIR/<pid>-<start>.json``
+from a background thread at most every ``METRICS_FLUSH_INTERVAL`` seconds,
+and ``/metrics`` sums the snapshots of all workers (its own taken live)
+into the Prometheus text format. The start time in the name keeps a new
+worker that is given a reused pid from overwriting an exited worker's
+snapshot. Counters of exited workers are kept so totals never go
+backwards; their in-flight gauge is dropped. The directory is cleared when
+gunicorn starts (see ``gunicorn.conf.py``).
+
+``/metrics`` only answers when ``METRICS_ENABLED`` is set, and then only to
+scrapers presenting ``Authorization: Bearer <METRICS_API_KEY>`` or
+connecting from an address in ``METRICS_ALLOWED_IPS``.
+"""
+import atexit
+import bisect
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+KNOWN_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+class QueryTimer:
+    """``connection.execute_wrapper`` that counts and times the queries of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class Metrics:
+    def __init__(self, directory, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.requests = Counter()     # (route, method, status) -> requests
+        self.durations = {}           # (route, method) -> per-bucket counts (last is +Inf), then the sum
+        self.queries = Counter()      # (route, method) -> SQL queries
+        self.sql_seconds = Counter()  # (route, method) -> seconds spent in SQL
+        self.cache_lookups = Counter()  # (cache, 'hit' | 'miss') -> lookups
+        self.in_flight = 0
+        self.dirty = False
+        self.writer_pid = None
+        self.name = None  # '<pid>-<start>', the stem of this process's snapshot file
+
+    # Recording (request thread)
+
+    def start_request(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def observe(self, route, method, status, duration, queries, sql_seconds):
+        key = (route, method if method in KNOWN_METHODS else 'OTHER')
+        bucket = bisect.bisect_left(DURATION_BUCKETS, duration)
+        with self.lock:
+            self.in_flight -= 1
+            self.requests[(*key, str(status))] += 1
+            histogram = self.durations.get(key)
+            if histogram is None:
+                histogram = self.durations[key] = [0] * (len(DURATION_BUCKETS) + 1) + [0.0]
+            histogram[bucket] += 1
+            histogram[-1] += duration
+            self.queries[key] += queries
+            self.sql_seconds[key] += sql_seconds
+            self.dirty = True
+        if self.writer_pid != os.getpid():
+            self.start_writer()
+
+    def count_cache(self, name, result):
+        with self.lock:
+            self.cache_lookups[(name, result)] += 1
+            self.dirty = True
+
+    # Sharing between workers
+
+    def snapshot(self):
+        with self.lock:
+            self.dirty = False
+            return {
+                'pid': os.getpid(),
+                'requests': [[*key, count] for key, count in self.requests.items()],
+                'durations': [[*key, list(histogram)] for key, histogram in self.durations.items()],
+                'queries': [[*key, count] for key, count in self.queries.items()],
+                'sql_seconds': [[*key, seconds] for key, seconds in self.sql_seconds.items()],
+                'cache_lookups': [[*key, count] for key, count in self.cache_lookups.items()],
+                'in_flight': self.in_flight,
+            }
+
+    def path(self, name):
+        return os.path.join(self.directory, f'{name}.json')
+
+    def flush(self):
+        snapshot = self.snapshot()
+        temporary = self.path(f'{self.name}.tmp')
+        with open(temporary, 'w') as handle:
+            json.dump(snapshot, handle)
+        os.replace(temporary, self.path(self.name))
+
+    def start_writer(self):
+        with self.lock:
+            if self.writer_pid == os.getpid():
+                return
+            self.writer_pid = os.getpid()
+            self.name = f'{self.writer_pid}-{time.time_ns()}'
+        os.makedirs(self.directory, exist_ok=True)
+        threading.Thread(target=self.write_periodically, daemon=True).start()
+        atexit.register(self.try_flush)
+
+    def try_flush(self):
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+    def write_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self.dirty:
+                self.try_flush()
+
+    def collect(self):
+        """Snapshots of every worker, this one taken live."""
+        own = os.getpid()
+        snapshots = [self.snapshot()]
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            names = []
+        # (pid, start) of every other snapshot; a pid's newest start is the only one that can be running
+        workers = {}
+        for name in names:
+            stem, extension = os.path.splitext(name)
+            pid, _, start = stem.partition('-')
+            if extension == '.json' and pid.isdigit() and start.isdigit() and stem != self.name:
+                workers[stem] = (int(pid), int(start))
+        newest = {}
+        for pid, start in workers.values():
+            newest[pid] = max(start, newest.get(pid, start))
+
+        for stem, (pid, start) in workers.items():
+            try:
+                with open(self.path(stem)) as handle:
+                    snapshot = json.load(handle)
+            except (OSError, ValueError):
+                continue
+            if pid == own or start != newest[pid] or not process_alive(pid):
+                snapshot['in_flight'] = 0
+            snapshots.append(snapshot)
+        return snapshots
+
+    # Exposition
+
+    def render(self):
+        requests, queries, sql_seconds, durations, in_flight = Counter(), Counter(), Counter(), {}, 0
+        cache_lookups = Counter()
+        for snapshot in self.collect():
+            for route, method, status, count in snapshot['requests']:
+                requests[(route, method, status)] += count
+            for route, method, count in snapshot['queries']:
+                queries[(route, method)] += count
+            for route, method, seconds in snapshot['sql_seconds']:
+                sql_seconds[(route, method)] += seconds
+            for route, method, histogram in snapshot['durations']:
+                total = durations.setdefault((route, method), [0] * len(histogram))
+                for index, value in enumerate(histogram):
+                    total[index] += value
+            for name, result, count in snapshot.get('cache_lookups', []):
+                cache_lookups[(name, result)] += count
+            in_flight += snapshot['in_flight']
+
+        lines = [
+            '# HELP http_requests_total Requests handled, by route, method and status.',
+            '# TYPE http_requests_total counter',
+        ]
+        for (route, method, status), count in sorted(requests.items()):
+            lines.append(f'http_requests_total{labels(route=route, method=method, status=status)} {count}')
+
+        lines += [
+            '# HELP http_request_duration_seconds Time to produce a response (to the first byte when streaming).',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (route, method), histogram in sorted(durations.items()):
+            cumulative = 0
+            for bound, count in zip([*DURATION_BUCKETS, '+Inf'], histogram[:-1]):
+                cumulative += count
+                lines.append(
+                    f'http_request_duration_seconds_bucket{labels(route=route, method=method, le=bound)} {cumulative}'
+                )
+            lines.append(f'http_request_duration_seconds_sum{labels(route=route, method=method)} {histogram[-1]}')
+            lines.append(f'http_request_duration_seconds_count{labels(route=route, method=method)} {cumulative}')
+
+        lines += [
+            '# HELP db_queries_total SQL queries run while handling requests.',
+            '# TYPE db_queries_total counter',
+        ]
+        for (route, method), count in sorted(queries.items()):
+            lines.append(f'db_queries_total{labels(route=route, method=method)} {count}')
+        lines += [
+            '# HELP db_query_seconds_total Time spent in SQL while handling requests.',
+            '# TYPE db_query_seconds_total counter',
+        ]
+        for (route, method), seconds in sorted(sql_seconds.items()):
+            lines.append(f'db_query_seconds_total{labels(route=route, method=method)} {seconds}')
+
+        lines += [
+            '# HELP cache_lookups_total Response cache lookups, by cache and result (hit or miss).',
+            '# TYPE cache_lookups_total counter',
+        ]
+        for (name, result), count in sorted(cache_lookups.items()):
+            lines.append(f'cache_lookups_total{labels(cache=name, result=result)} {count}')
+
+        lines += [
+            '# HELP http_requests_in_flight Requests being handled right now.',
+            '# TYPE http_requests_in_flight gauge',
+            f'http_requests_in_flight {in_flight}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def labels(**values):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in values.items()) + '}'
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+_metrics = {}
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """The registry for ``settings.METRICS_DIR`` in this process."""
+    directory = settings.METRICS_DIR
+    with _metrics_lock:
+        if directory not in _metrics:
+            _metrics[directory] = Metrics(directory, settings.METRICS_FLUSH_INTERVAL)
+        return _metrics[directory]
+
+
+def clear_directory(directory):
+    """Forget the snapshots of a previous server run (gunicorn ``on_starting``)."""
+    if not os.path.isdir(directory):
+        return
+    for name in os.listdir(directory):
+        if name.endswith(('.json', '.tmp')):
+            os.remove(os.path.join(directory, name))
+
+
+def scrape_allowed(request):
+    """Whether the request carries the metrics API key or comes from an allowed address."""
+    key = settings.METRICS_API_KEY
+    if key:
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(token.encode(), key.encode()):
+            return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics_view(request):
+    if not settings.METRICS_ENABLED:
+        raise Http404()
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(get_metrics().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
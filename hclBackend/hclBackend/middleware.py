@@ -1,9 +1,62 @@
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
 from django.http import JsonResponse
 import os
 import json
 import logging
+import random
+import time
+
+from hclBackend import metrics, profiling, traffic
+
+logger = logging.getLogger('hclBackend.requests')
+
+BODY_METHODS = ('POST', 'PUT', 'PATCH')
+MAX_RECORDED_BODY_BYTES = 64 * 1024
+
+class MetricsMiddleware:
+    """Per-route request, latency and SQL metrics for /metrics (see hclBackend.metrics)."""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.metrics = metrics.get_metrics()
+
+    def __call__(self, request):
+        queries = metrics.QueryTimer()
+        status = 500
+        self.metrics.start_request()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(queries):
+                response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            match = request.resolver_match
+            route = match.route if match else metrics.UNMATCHED_ROUTE
+            self.metrics.observe(
+                route, request.method, status, time.perf_counter() - start, queries.count, queries.seconds
+            )
+
+
+class ProfilingMiddleware:
+    """Profile requests that administrators flag with X-Profile: 1 or ?profile=1 (see hclBackend.profiling)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Read per request, so the benchmark can enable profiling for a single request
+        if not (settings.PROFILING_ENABLED and profiling.wants_profile(request)
+                and profiling.is_administrator(request)):
+            return self.get_response(request)
+        response, profile_id = profiling.profile_request(self.get_response, request)
+        response['X-Profile-Id'] = profile_id
+        return response
 
-logger = logging.getLogger('django')
 
 class APIKeyMiddleware:
     def __init__(self, get_response):
@@ -27,29 +80,69 @@ class APIKeyMiddleware:
         
         # Passing it to view for further checks
         request.api_key_valid = (api_key_header == self.api_key)
-        
-        # Log request with body
+        started_at, start = time.time(), time.perf_counter()
+
+        # Bodies are only read when something will use them: the traffic
+        # recorder, or the sampled share of request logs that include one.
+        recorder = traffic.get_recorder()
+        sample_rate = settings.REQUEST_LOG_BODY_SAMPLE_RATE
+        log_body = sample_rate > 0 and random.random() < sample_rate
+        body = None
+        if (recorder or log_body) and request.method in BODY_METHODS:
+            limit = MAX_RECORDED_BODY_BYTES if recorder else settings.REQUEST_LOG_BODY_MAX_BYTES
+            body = read_json_body(request, limit)
+
+        response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        # One structured record per request, written by a background thread
+        # (see hclBackend.request_logging)
         try:
-            if request.method in ['POST', 'PUT', 'PATCH']:
-                body = request.body.decode('utf-8') if request.body else ""
-                try:
-                    body_data = json.loads(body) if body else {}
-                except json.JSONDecodeError:
-                    body_data = body
-                
-                logger.info(f"📤 [{request.method}] {request.path} | Body: {json.dumps(body_data)} | User: {request.user}")
-            else:
-                params = dict(request.GET) if request.GET else {}
-                logger.info(f"📤 [{request.method}] {request.path} | Params: {params} | User: {request.user}")
+            if logger.isEnabledFor(logging.INFO):
+                fields = request_fields(request, response, duration)
+                if log_body and body is not None and fields['body_bytes'] <= settings.REQUEST_LOG_BODY_MAX_BYTES:
+                    fields['body'] = traffic.scrub(body)
+                logger.info('request', extra={'data': fields})
         except Exception as e:
             logger.debug(f"Error logging request: {str(e)}")
-        
-        response = self.get_response(request)
-        
-        # Log response
+
+        # Optionally record a scrubbed, replayable entry (see hclBackend.traffic)
         try:
-            logger.info(f"📥 [{response.status_code}] {request.method} {request.path}")
+            if recorder and request.path.startswith(traffic.RECORDED_PREFIX):
+                recorder.write(traffic.traffic_entry(request, response, started_at, duration, body))
         except Exception as e:
-            logger.debug(f"Error logging response: {str(e)}")
+            logger.debug(f"Error recording traffic: {str(e)}")
         
         return response
+
+
+def read_json_body(request, limit):
+    """The parsed JSON body if it is at most ``limit`` bytes, else None.
+
+    Reading request.body buffers the whole upload, which would defeat
+    streaming views, so larger and non-JSON bodies are never read.
+    """
+    length = int(request.META.get('CONTENT_LENGTH') or 0)
+    if request.content_type != 'application/json' or length > limit:
+        return None
+    try:
+        return json.loads(request.body) if request.body else {}
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def request_fields(request, response, duration):
+    match = request.resolver_match
+    user = getattr(request, 'user', None)
+    fields = {
+        'method': request.method,
+        'path': request.path,
+        'route': match.url_name if match else None,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'user_id': user.pk if user is not None and user.is_authenticated else None,
+        'body_bytes': int(request.META.get('CONTENT_LENGTH') or 0),
+    }
+    if request.GET:
+        fields['query'] = traffic.scrub({key: request.GET.getlist(key) for key in request.GET})
+    return fields
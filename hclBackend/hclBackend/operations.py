@@ -0,0 +1,24 @@
+"""
+Migration operations shared by the apps.
+
+``AddIndexConcurrently`` builds the index with ``CREATE INDEX CONCURRENTLY``
+on PostgreSQL, so writes to the table keep flowing while a large index is
+built, and falls back to a plain ``AddIndex`` on other databases (SQLite in
+development). Migrations using it must set ``atomic = False``.
+"""
+from django.contrib.postgres.operations import AddIndexConcurrently as PostgresAddIndexConcurrently
+from django.db import migrations
+
+
+class AddIndexConcurrently(PostgresAddIndexConcurrently):
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
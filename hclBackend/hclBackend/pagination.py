@@ -0,0 +1,173 @@
+"""
+Keyset ("cursor") pagination shared by the books, borrow and admin listings.
+
+Page-number pagination issues ``COUNT(*)`` plus ``OFFSET n`` on every page,
+which gets slower the deeper a client pages. Adding ``?cursor=`` (empty for
+the first page) to a request switches a paginator using
+``KeysetPaginationMixin`` to seeking on the queryset's ordering instead, so
+every page costs the same as the first. The primary key is always appended
+as a tiebreaker, and nullable fields sort NULLs last in both directions so
+the order is stable across backends. ``?count=true`` adds the total count;
+it is skipped by default.
+
+The response keeps the ``next``/``previous``/``results`` keys of the
+page-number format, with opaque cursor URLs in ``next``/``previous``.
+"""
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPaginationMixin:
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    keyset = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params and isinstance(queryset, QuerySet)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        keys = self.get_keyset_ordering(queryset)
+        reverse, values = self.decode_cursor(request.query_params.get(self.cursor_query_param), keys)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count = queryset.count()
+
+        queryset = queryset.order_by(*self.order_expressions(keys, reverse))
+        if values is not None:
+            queryset = queryset.filter(self.seek_filter(keys, values, reverse))
+
+        rows = list(queryset[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        if reverse:
+            # Walking backwards, the extra row lies before this page and the
+            # page we came from is always after it.
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        self.next_cursor = self.previous_cursor = None
+        if rows and has_next:
+            self.next_cursor = (False, self.row_values(rows[-1], keys))
+        if rows and has_previous:
+            self.previous_cursor = (True, self.row_values(rows[0], keys))
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        payload = {}
+        if self.count is not None:
+            payload['count'] = self.count
+        payload['next'] = self.cursor_link(self.next_cursor)
+        payload['previous'] = self.cursor_link(self.previous_cursor)
+        payload['results'] = data
+        return Response(payload)
+
+    def get_keyset_ordering(self, queryset):
+        """Return ``[(field, descending), ...]`` ending with the primary key."""
+        model = queryset.model
+        names = list(queryset.query.order_by or model._meta.ordering or ['pk'])
+        keys = []
+        for name in names:
+            if not isinstance(name, str):
+                raise ValueError('Keyset pagination only supports ordering by model fields')
+            descending = name.startswith('-')
+            name = name.lstrip('-')
+            field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            keys.append((field, descending))
+            if field.primary_key:
+                break
+        else:
+            keys.append((model._meta.pk, keys[-1][1] if keys else False))
+        return keys
+
+    def order_expressions(self, keys, reverse):
+        expressions = []
+        for field, descending in keys:
+            # Only nullable fields get an explicit NULLS placement; adding one to
+            # a NOT NULL column would stop the database using a plain index scan.
+            nulls = {'nulls_first' if reverse else 'nulls_last': True} if field.null else {}
+            expression = F(field.name)
+            if descending != reverse:
+                expressions.append(expression.desc(**nulls))
+            else:
+                expressions.append(expression.asc(**nulls))
+        return expressions
+
+    def seek_filter(self, keys, values, reverse):
+        """Rows strictly after ``values`` in the (possibly reversed) ordering."""
+        condition = Q(pk__in=[])
+        equal_so_far = Q()
+        for (field, descending), value in zip(keys, values):
+            ascending = descending == reverse
+            if value is None:
+                # NULLs sort last going forward, so nothing non-null follows them.
+                after = Q(**{f'{field.name}__isnull': False}) if reverse else None
+                equal = Q(**{f'{field.name}__isnull': True})
+            else:
+                after = Q(**{f"{field.name}__{'gt' if ascending else 'lt'}": value})
+                if field.null and not reverse:
+                    after |= Q(**{f'{field.name}__isnull': True})
+                equal = Q(**{field.name: value})
+            if after is not None:
+                condition |= equal_so_far & after
+            equal_so_far &= equal
+        return condition
+
+    def row_values(self, row, keys):
+        return [getattr(row, field.attname) for field, _ in keys]
+
+    def encode_cursor(self, reverse, values):
+        payload = {'r': reverse, 'v': [self.encode_value(value) for value in values]}
+        raw = json.dumps(payload, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, encoded, keys):
+        if not encoded:
+            return False, None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            values = payload['v']
+            if len(values) != len(keys):
+                raise ValueError
+            values = [
+                None if value is None else field.to_python(value)
+                for (field, _), value in zip(keys, values)
+            ]
+            return bool(payload['r']), values
+        except (binascii.Error, ValueError, KeyError, TypeError, ValidationError, FieldDoesNotExist):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_value(self, value):
+        if isinstance(value, (datetime.date, datetime.datetime, datetime.time)):
+            return value.isoformat()
+        if isinstance(value, decimal.Decimal):
+            return str(value)
+        return value
+
+    def cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(*cursor))
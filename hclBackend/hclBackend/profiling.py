@@ -0,0 +1,227 @@
+"""
+On-demand request profiling and repeated-query (N+1) detection.
+
+An administrator adds ``X-Profile: 1`` (or ``?profile=1``) to a request and
+``ProfilingMiddleware`` runs it under cProfile while recording every SQL
+statement with its duration and the project line that issued it. The
+result is saved under ``PROFILE_DIR`` as ``<id>.prof`` (a pstats dump for
+snakeviz & co.) and ``<id>.json`` (SQL, repeated-query groups and the top
+functions), the id is returned in the ``X-Profile-Id`` header, and
+``/api/admin/profiles/<id>/`` serves it back.
+
+Queries are grouped by their SQL text, which Django keeps parametrised, so
+one statement run for every row of a page (the N+1 pattern) shows up as a
+single group with a high count. Parameter values (password hashes, emails,
+tokens) are never stored: only a keyed digest, enough to spot a statement
+repeated with identical parameters. ``QueryPatternAssertions`` applies the same
+grouping in tests and fails when an endpoint repeats queries.
+"""
+import contextlib
+import cProfile
+import hashlib
+import io
+import json
+import os
+import pstats
+import re
+import time
+import traceback
+import uuid
+
+from django.conf import settings
+from django.db import connection
+
+PROFILE_ID = re.compile(r'[0-9a-f]{32}')
+REPEATED_QUERY_THRESHOLD = 3
+TOP_FUNCTIONS = 40
+# Transaction bookkeeping repeats by design and says nothing about access patterns
+IGNORED_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT', 'BEGIN', 'COMMIT', 'SET ', 'RESET ')
+# Random per process, so digests of guessable values (emails) can't be looked up
+PARAMS_DIGEST_KEY = os.urandom(16)
+
+
+def call_site():
+    """``file:line`` of the innermost project frame (outside Django and site-packages)."""
+    root = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        if frame.filename.startswith(root) and 'site-packages' not in frame.filename:
+            if not frame.filename.endswith(('profiling.py', 'middleware.py', 'metrics.py')):
+                return f'{os.path.relpath(frame.filename, root)}:{frame.lineno}'
+    return None
+
+
+def params_digest(params):
+    return hashlib.blake2b(repr(tuple(params)).encode(), key=PARAMS_DIGEST_KEY, digest_size=8).hexdigest()
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` keeping every statement, a digest of its parameters, duration and call site."""
+
+    def __init__(self, call_sites=True):
+        self.queries = []
+        self.call_sites = call_sites
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params_digest': params_digest(params) if params and not many else None,
+                'ms': round((time.perf_counter() - start) * 1000, 3),
+                'source': call_site() if self.call_sites else None,
+            })
+
+
+def group_queries(queries, threshold=REPEATED_QUERY_THRESHOLD):
+    """
+    ``(repeated, duplicates)``: statements run ``threshold`` or more times
+    with any parameters (likely N+1 loops), and statements run more than
+    once with identical parameters (wasted round trips). Most costly first.
+    """
+    shapes, exact = {}, {}
+    for query in queries:
+        if query['sql'].lstrip().upper().startswith(IGNORED_STATEMENTS):
+            continue
+        for groups, key in ((shapes, query['sql']), (exact, (query['sql'], query['params_digest']))):
+            group = groups.setdefault(key, {'sql': query['sql'], 'count': 0, 'ms': 0.0, 'sources': []})
+            group['count'] += 1
+            group['ms'] = round(group['ms'] + query['ms'], 3)
+            if query['source'] and query['source'] not in group['sources']:
+                group['sources'].append(query['source'])
+
+    def costly_first(groups, minimum):
+        return sorted((group for group in groups if group['count'] >= minimum), key=lambda group: -group['ms'])
+
+    return costly_first(shapes.values(), threshold), costly_first(exact.values(), 2)
+
+
+def wants_profile(request):
+    return request.headers.get('X-Profile') == '1' or request.GET.get('profile') == '1'
+
+
+def is_administrator(request):
+    """Authenticate the request's JWT early; the view authenticates again as usual."""
+    from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+    from users.authentication import ClaimsJWTAuthentication
+
+    try:
+        result = ClaimsJWTAuthentication().authenticate(request)
+    except (AuthenticationFailed, InvalidToken, TokenError):
+        return False
+    return result is not None and result[0].role == 'administrator'
+
+
+def profile_request(get_response, request):
+    """Run one request under cProfile and the query recorder; returns ``(response, profile_id)``."""
+    recorder = QueryRecorder()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    with connection.execute_wrapper(recorder):
+        profiler.enable()
+        try:
+            response = get_response(request)
+        finally:
+            profiler.disable()
+    duration = time.perf_counter() - start
+    profile_id = save_profile(request, response, duration, profiler, recorder.queries)
+    return response, profile_id
+
+
+def save_profile(request, response, duration, profiler, queries):
+    directory = settings.PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    profile_id = uuid.uuid4().hex
+    profiler.dump_stats(os.path.join(directory, f'{profile_id}.prof'))
+
+    top = io.StringIO()
+    pstats.Stats(profiler, stream=top).sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+    repeated, duplicates = group_queries(queries)
+    report = {
+        'id': profile_id,
+        'created_at': time.time(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'sql': {
+            'count': len(queries),
+            'ms': round(sum(query['ms'] for query in queries), 3),
+            'repeated': repeated,
+            'duplicates': duplicates,
+            'queries': queries,
+        },
+        'top_functions': top.getvalue(),
+    }
+    with open(os.path.join(directory, f'{profile_id}.json'), 'w') as handle:
+        json.dump(report, handle, indent=1, default=str)
+    prune_profiles(directory, settings.PROFILE_KEEP)
+    return profile_id
+
+
+def prune_profiles(directory, keep):
+    reports = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith('.json')),
+        key=lambda entry: entry.stat().st_mtime, reverse=True,
+    )
+    for entry in reports[keep:]:
+        for extension in ('.json', '.prof'):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(directory, entry.name[:-len('.json')] + extension))
+
+
+def profile_path(profile_id, extension):
+    """Path of a stored profile file, or None for ids that are malformed or unknown."""
+    if not PROFILE_ID.fullmatch(profile_id):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, f'{profile_id}{extension}')
+    return path if os.path.exists(path) else None
+
+
+def list_profiles():
+    """Summaries of the stored profiles, newest first."""
+    summaries = []
+    try:
+        entries = list(os.scandir(settings.PROFILE_DIR))
+    except FileNotFoundError:
+        return summaries
+    for entry in entries:
+        if not entry.name.endswith('.json'):
+            continue
+        try:
+            with open(entry.path) as handle:
+                report = json.load(handle)
+        except (OSError, ValueError):
+            continue
+        summaries.append({
+            'id': report['id'], 'created_at': report['created_at'], 'method': report['method'],
+            'path': report['path'], 'status': report['status'], 'duration_ms': report['duration_ms'],
+            'sql_count': report['sql']['count'], 'repeated_queries': len(report['sql']['repeated']),
+        })
+    summaries.sort(key=lambda summary: summary['created_at'], reverse=True)
+    return summaries
+
+
+class RepeatedQueriesError(AssertionError):
+    pass
+
+
+@contextlib.contextmanager
+def detect_repeated_queries(threshold=REPEATED_QUERY_THRESHOLD):
+    """Raise ``RepeatedQueriesError`` if the block repeats a query (see ``group_queries``)."""
+    recorder = QueryRecorder()
+    with connection.execute_wrapper(recorder):
+        yield recorder.queries
+    repeated, duplicates = group_queries(recorder.queries, threshold)
+    if repeated or duplicates:
+        lines = [f"  {group['count']}x {group['sql']}  <- {', '.join(group['sources']) or '?'}"
+                 for group in repeated + duplicates]
+        raise RepeatedQueriesError('Repeated queries:\n' + '\n'.join(lines))
+
+
+class QueryPatternAssertions:
+    """TestCase mixin: ``assertNoRepeatedQueries`` around a block of requests."""
+
+    def assertNoRepeatedQueries(self, threshold=REPEATED_QUERY_THRESHOLD):
+        return detect_repeated_queries(threshold)
@@ -0,0 +1,88 @@
+"""
+Structured request logging that stays off the request thread.
+
+``APIKeyMiddleware`` emits one record per request on the
+``hclBackend.requests`` logger, with its fields in ``record.data``.
+``BackgroundHandler`` only puts the record on an in-memory queue; a
+listener thread formats it as one JSON line and writes it out. If the
+queue is full (the output can't keep up) records are dropped and counted
+rather than making requests wait.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+DEFAULT_QUEUE_SIZE = 10_000
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger and message, plus the record's ``data``."""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'data', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, separators=(',', ':'), default=str)
+
+
+class BackgroundHandler(logging.handlers.QueueHandler):
+    """
+    Queues records for a listener thread that writes them to ``stream`` as JSON.
+
+    The listener starts on the first record in each process, so it also
+    runs in gunicorn workers forked after the settings were loaded.
+    """
+
+    def __init__(self, stream=None, maxsize=DEFAULT_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        self.target = logging.StreamHandler(stream)
+        self.target.setFormatter(JSONFormatter())
+        self.dropped = 0
+        self.listener = None
+        self.listener_pid = None
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        with self.start_lock:
+            if self.listener_pid != os.getpid():
+                self.listener = logging.handlers.QueueListener(self.queue, self.target)
+                self.listener.start()
+                self.listener_pid = os.getpid()
+                atexit.register(self.stop)
+
+    def stop(self):
+        """Write out everything queued and stop the listener."""
+        if self.listener is not None and self.listener_pid == os.getpid():
+            self.listener.stop()
+            self.listener_pid = None
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread. The records' data dicts
+        # are never touched again by the request thread, so they need no copy.
+        return record
+
+    def enqueue(self, record):
+        if self.listener_pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        """Block until the records queued so far are written (for tests and shutdown)."""
+        deadline = time.monotonic() + 5
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.001)
+        self.target.flush()
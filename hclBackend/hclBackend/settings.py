@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 from datetime import timedelta
 from dotenv import load_dotenv
 
@@ -36,12 +37,14 @@ INSTALLED_APPS = [
     "rest_framework_simplejwt",
     "corsheaders",
     # Local apps
+    "hclBackend",
     "books",
     "users",
     "borrow",
 ]
 
 MIDDLEWARE = [
+    "hclBackend.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -51,6 +54,7 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "hclBackend.middleware.APIKeyMiddleware",
+    "hclBackend.middleware.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "hclBackend.urls"
@@ -134,6 +138,85 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# CACHE_BACKEND=locmem keeps the cache in each process. file (a directory at
+# CACHE_LOCATION) or redis (a redis:// URL, any Redis-compatible server) are
+# shared by all gunicorn workers, so a write invalidates cached responses
+# everywhere at once.
+CACHE_BACKENDS = {
+    "locmem": ("django.core.cache.backends.locmem.LocMemCache", "hcl"),
+    "file": ("django.core.cache.backends.filebased.FileBasedCache", os.path.join(tempfile.gettempdir(), "hcl-cache")),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://localhost:6379/0"),
+}
+CACHE_BACKEND, CACHE_DEFAULT_LOCATION = CACHE_BACKENDS[os.getenv("CACHE_BACKEND", "locmem")]
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": os.getenv("CACHE_LOCATION", CACHE_DEFAULT_LOCATION),
+        "OPTIONS": {} if CACHE_BACKEND.endswith("RedisCache") else {"MAX_ENTRIES": 5000},
+    }
+}
+CACHE_SHARED = not CACHE_BACKEND.endswith("LocMemCache")
+# Without a shared cache, workers can't see each other's version bumps
+# (hclBackend/caching.py): versions expire after this many seconds instead
+LOCAL_VERSION_TTL = int(os.getenv("LOCAL_VERSION_TTL", "60"))
+
+# Seconds a public catalog response (book list, detail, categories) is
+# served before it is rebuilt; writes invalidate it immediately
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", "60"))
+
+# Seconds an admin dashboard snapshot is served before it is recomputed
+ADMIN_DASHBOARD_CACHE_TTL = int(os.getenv("ADMIN_DASHBOARD_CACHE_TTL", "30"))
+
+# Fine charged per day a loan is overdue (see the sweep_overdue command)
+FINE_PER_DAY = os.getenv("FINE_PER_DAY", "1.00")
+
+# When set, every /api/ request is appended to this JSONL file, scrubbed of
+# personal data, for the replay_traffic command (see hclBackend/traffic.py)
+TRAFFIC_LOG = os.getenv("TRAFFIC_LOG", "")
+
+# Share of request log records that include the (redacted) JSON body, and
+# the largest body that is ever logged
+REQUEST_LOG_BODY_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_BODY_SAMPLE_RATE", "0.01"))
+REQUEST_LOG_BODY_MAX_BYTES = int(os.getenv("REQUEST_LOG_BODY_MAX_BYTES", "2048"))
+
+# Prometheus metrics at /metrics (hclBackend/metrics.py). Each worker process
+# writes its numbers to METRICS_DIR every METRICS_FLUSH_INTERVAL seconds.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "0") == "1"
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "hcl-metrics"))
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1.0"))
+# Scrapers must send "Authorization: Bearer <METRICS_API_KEY>" or connect
+# from one of METRICS_ALLOWED_IPS (addresses or networks; the direct peer,
+# so behind a reverse proxy use the key)
+METRICS_API_KEY = os.getenv("METRICS_API_KEY", "")
+METRICS_ALLOWED_IPS = [
+    network.strip() for network in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if network.strip()
+]
+
+# Administrators can profile a request with X-Profile: 1 or ?profile=1
+# (hclBackend/profiling.py); the newest PROFILE_KEEP reports are kept.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "hcl-profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200"))
+
+
+# Processes hashing passwords during bulk student imports (users/onboarding.py):
+# ONBOARDING_WORKERS for the import_students command, and a pool of
+# ONBOARDING_VIEW_WORKERS per gunicorn worker, shared by import requests
+ONBOARDING_WORKERS = int(os.getenv("ONBOARDING_WORKERS", str(os.cpu_count() or 1)))
+ONBOARDING_VIEW_WORKERS = int(os.getenv("ONBOARDING_VIEW_WORKERS", "2"))
+
+# Revoked JWTs (users/revocation.py) are rows in the database. Each
+# process's Bloom filter is sized for REVOCATION_CAPACITY live revocations
+# at REVOCATION_ERROR_RATE false positives, and picks up other workers'
+# revocations every REVOCATION_SYNC_INTERVAL seconds.
+REVOCATION_CAPACITY = int(os.getenv("REVOCATION_CAPACITY", "1000000"))
+REVOCATION_ERROR_RATE = float(os.getenv("REVOCATION_ERROR_RATE", "0.001"))
+REVOCATION_SYNC_INTERVAL = float(os.getenv("REVOCATION_SYNC_INTERVAL", "1.0"))
+
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -143,7 +226,7 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # Django REST Framework Configuration
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.ClaimsJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": ("rest_framework.permissions.AllowAny",),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
@@ -165,6 +248,8 @@ SIMPLE_JWT = {
     "UPDATE_LAST_LOGIN": True,
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
+    # Re-reads the role/approval claims on refresh (users/authentication.py)
+    "TOKEN_REFRESH_SERIALIZER": "users.authentication.ClaimsTokenRefreshSerializer",
 }
 
 
@@ -193,6 +278,11 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
         },
+        # JSON lines written by a background thread (hclBackend/request_logging.py)
+        'requests': {
+            'class': 'hclBackend.request_logging.BackgroundHandler',
+            'stream': 'ext://sys.stderr',
+        },
     },
     'loggers': {
         'django': {
@@ -200,5 +290,10 @@ LOGGING = {
             'level': 'INFO',
             'propagate': True,
         },
+        'hclBackend.requests': {
+            'handlers': ['requests'],
+            'level': os.getenv("REQUEST_LOG_LEVEL", "INFO"),
+            'propagate': False,
+        },
     },
 }
@@ -0,0 +1,321 @@
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from books.models import Books
+from borrow.models import BorrowRecord
+from hclBackend.benchmarking import compare_reports
+from hclBackend.caching import get_version, version_key
+from hclBackend.management.commands.benchmark_endpoints import Command as BenchmarkEndpointsCommand
+from hclBackend.metrics import Metrics, get_metrics
+from hclBackend.profiling import QueryPatternAssertions, RepeatedQueriesError
+from hclBackend.management.commands.benchmark_endpoints import uncovered_routes
+from hclBackend.request_logging import BackgroundHandler
+from hclBackend.traffic import REDACTED, Replayer, TokenMinter, load_entries
+from users.models import Administrator, Student, User
+
+
+def report(**endpoints):
+    return {'endpoints': {
+        label: {'p50_ms': p50, 'p95_ms': p95, 'queries': queries, 'errors': 0}
+        for label, (p50, p95, queries) in endpoints.items()
+    }}
+
+
+class BenchmarkEndpointsTests(TestCase):
+    def test_every_route_is_benchmarked(self):
+        self.assertEqual(uncovered_routes(), [])
+
+    def test_every_endpoint_runs_cleanly(self):
+        command = BenchmarkEndpointsCommand(stdout=io.StringIO())
+        options = {'scale': 100, 'seed': 1, 'workers': 1, 'iterations': 2, 'warmup': 0, 'upload_rows': 3, 'only': []}
+        command.seed(options)
+        results = command.run(options)['endpoints']
+        failing = {label: row['statuses'] for label, row in results.items() if row['errors'] or row['n'] != 2}
+        self.assertEqual(failing, {})
+
+    def test_compare_reports(self):
+        baseline = report(fast=(2.0, 3.0, 2), slow=(100.0, 150.0, 5), gone=(1.0, 1.0, 1))
+        current = report(fast=(2.9, 3.5, 3), slow=(130.0, 160.0, 5), new=(50.0, 50.0, 9))
+        regressions = compare_reports(baseline, current, threshold=0.2, min_delta_ms=1.0)
+        self.assertEqual(
+            [(row['endpoint'], row['metric']) for row in regressions],
+            [('fast', 'queries'), ('slow', 'p50_ms')],
+        )
+
+
+class TrafficRecordReplayTests(LiveServerTestCase):
+    def setUp(self):
+        handle, self.log = tempfile.mkstemp(suffix='.jsonl')
+        os.close(handle)
+        self.addCleanup(os.remove, self.log)
+        self.student = User.objects.create(username='reader', role='student')
+        Student.objects.create(user=self.student, roll_number='R1', is_approved=True)
+        self.book = Books.objects.create(title='Dune', author='Frank Herbert', isbn='9780441172719',
+                                         available_copies=3)
+
+    def record(self):
+        client = APIClient()
+        with override_settings(TRAFFIC_LOG=self.log):
+            client.get(reverse('list_books'), {'search': 'dune'})
+            client.post(reverse('register'), {
+                'username': 'newbie', 'email': 'newbie@nitt.edu', 'password': 'secret-pass', 'roll_number': '4242',
+                'full_name': 'New Reader',
+            }, format='json')
+            client.force_authenticate(self.student)
+            client.get(reverse('borrow_book'))
+        return load_entries(self.log)
+
+    def test_records_scrubbed_entries(self):
+        entries = self.record()
+        self.assertEqual([entry['route'] for entry in entries], ['list_books', 'register', 'borrow_book'])
+        self.assertEqual(entries[0]['query'], {'search': ['dune']})
+        register = entries[1]
+        self.assertEqual((register['status'], register['body']['password']), (201, REDACTED))
+        self.assertTrue(register['body']['email'].endswith('@example.invalid'))
+        self.assertNotIn('newbie', json.dumps(register))
+        self.assertEqual((entries[2]['user_id'], entries[2]['role']), (self.student.id, 'student'))
+
+    def test_replay_reproduces_statuses(self):
+        entries = self.record()
+        report = Replayer(self.live_server_url, speed=0, concurrency=2, tokens=TokenMinter(entries),
+                          password='replay-pass').run(entries)
+        self.assertEqual(report['requests'], 3)
+        self.assertEqual(
+            {label: row['statuses'] for label, row in report['routes'].items()},
+            {'GET list_books': {'200': 1}, 'POST register': {'201': 1}, 'GET borrow_book': {'200': 1}},
+        )
+
+
+class RequestLoggingTests(TestCase):
+    def login(self, password='hunter2'):
+        with self.assertLogs('hclBackend.requests', 'INFO') as logs:
+            self.client.post(reverse('token_obtain_pair'), {'username': 'nobody', 'password': password},
+                             content_type='application/json')
+        self.assertEqual(len(logs.records), 1)
+        return logs.records[0].data
+
+    @override_settings(REQUEST_LOG_BODY_SAMPLE_RATE=1.0)
+    def test_structured_record_with_redacted_body(self):
+        fields = self.login()
+        self.assertEqual((fields['route'], fields['status']), ('token_obtain_pair', 401))
+        self.assertGreater(fields['duration_ms'], 0)
+        self.assertEqual(fields['body']['password'], REDACTED)
+        self.assertNotIn('hunter2', json.dumps(fields))
+
+    @override_settings(REQUEST_LOG_BODY_SAMPLE_RATE=1.0, REQUEST_LOG_BODY_MAX_BYTES=64)
+    def test_large_bodies_are_not_logged(self):
+        fields = self.login(password='x' * 100)
+        self.assertNotIn('body', fields)
+        self.assertGreater(fields['body_bytes'], 64)
+
+    @override_settings(REQUEST_LOG_BODY_SAMPLE_RATE=0)
+    def test_bodies_are_sampled(self):
+        self.assertNotIn('body', self.login())
+
+    def test_background_handler(self):
+        stream = io.StringIO()
+        handler = BackgroundHandler(stream)
+        self.addCleanup(handler.stop)
+        logger = logging.getLogger('hclBackend.tests.background')
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        logger.warning('request', extra={'data': {'status': 503}})
+        handler.flush()
+        self.assertEqual(json.loads(stream.getvalue())['status'], 503)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = BackgroundHandler(io.StringIO(), maxsize=1)
+        handler.listener_pid = os.getpid()  # as if started, but nothing drains the queue
+        record = logging.makeLogRecord({'msg': 'request'})
+        handler.handle(record)
+        handler.handle(record)
+        self.assertEqual((handler.queue.qsize(), handler.dropped), (1, 1))
+
+
+class VersionTests(TestCase):
+    def setUp(self):
+        cache.delete(version_key('catalog'))
+
+    def version_later(self, seconds):
+        with mock.patch('time.time', return_value=time.time() + seconds):
+            return get_version('catalog')
+
+    @override_settings(CACHE_SHARED=False, LOCAL_VERSION_TTL=30)
+    def test_per_process_versions_expire(self):
+        version = get_version('catalog')
+        self.assertEqual(self.version_later(10), version)
+        self.assertNotEqual(self.version_later(31), version)
+
+    @override_settings(CACHE_SHARED=True)
+    def test_shared_versions_do_not_expire(self):
+        version = get_version('catalog')
+        self.assertEqual(self.version_later(10 ** 6), version)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(METRICS_ENABLED=True, METRICS_DIR=directory, METRICS_FLUSH_INTERVAL=60))
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_counts_requests_latency_and_sql_per_route(self):
+        Books.objects.create(title='Dune', author='Frank Herbert', isbn='9780441172719')
+        self.client.get(reverse('list_books'))
+        self.client.get(reverse('list_books'), {'search': 'dune'})
+        self.client.get(reverse('book_detail', args=[999]))
+        text = self.scrape()
+
+        route = 'route="api/books/list/",method="GET"'
+        self.assertIn(f'http_requests_total{{{route},status="200"}} 2', text)
+        self.assertIn('http_requests_total{route="api/books/detail/<int:book_id>/",method="GET",status="404"} 1', text)
+        self.assertIn(f'http_request_duration_seconds_bucket{{{route},le="+Inf"}} 2', text)
+        self.assertIn(f'http_request_duration_seconds_count{{{route}}} 2', text)
+        self.assertIn(f'db_queries_total{{{route}}} 4', text)
+        self.assertIn('http_requests_in_flight 1', text)  # the scrape itself
+
+    def test_sums_worker_snapshots(self):
+        get_metrics().start_request()
+        get_metrics().observe('api/books/list/', 'GET', 200, 0.02, 2, 0.001)
+        exited = {
+            'pid': 999999999, 'in_flight': 3,
+            'requests': [['api/books/list/', 'GET', '200', 5]],
+            'durations': [['api/books/list/', 'GET', [5] + [0] * 11 + [0.01]]],
+            'queries': [['api/books/list/', 'GET', 10]],
+            'sql_seconds': [['api/books/list/', 'GET', 0.004]],
+        }
+        with open(get_metrics().path('999999999-1'), 'w') as handle:
+            json.dump(exited, handle)
+        text = self.scrape()
+        self.assertIn('http_requests_total{route="api/books/list/",method="GET",status="200"} 6', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="api/books/list/",method="GET",le="0.005"} 5', text)
+        self.assertIn('http_request_duration_seconds_bucket{route="api/books/list/",method="GET",le="0.025"} 6', text)
+        self.assertIn('db_queries_total{route="api/books/list/",method="GET"} 12', text)
+        # The exited worker's in-flight requests are gone; the live one is the scrape
+        self.assertIn('http_requests_in_flight 1', text)
+
+    def test_reused_pids_keep_both_snapshots(self):
+        # Two workers in turn with this process's pid, as after a restart that reuses it
+        for requests in (5, 1):
+            worker = Metrics(settings.METRICS_DIR, flush_interval=60)
+            worker.start_writer()
+            for _ in range(requests):
+                worker.start_request()
+                worker.observe('api/books/list/', 'GET', 200, 0.02, 1, 0.001)
+            worker.start_request()
+            worker.flush()
+        self.assertEqual(len(os.listdir(settings.METRICS_DIR)), 2)
+        # Of two snapshots with a running pid, only the newer can be that process
+        empty = {'requests': [], 'durations': [], 'queries': [], 'sql_seconds': []}
+        for start, in_flight in ((1, 3), (2, 2)):
+            with open(get_metrics().path(f'{os.getppid()}-{start}'), 'w') as handle:
+                json.dump({**empty, 'pid': os.getppid(), 'in_flight': in_flight}, handle)
+
+        text = self.scrape()
+        self.assertIn('http_requests_total{route="api/books/list/",method="GET",status="200"} 6', text)
+        self.assertIn('http_requests_in_flight 3', text)
+
+    def test_disabled(self):
+        with override_settings(METRICS_ENABLED=False):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(METRICS_API_KEY='scrape-key', METRICS_ALLOWED_IPS=['10.0.0.0/8'])
+    def test_requires_key_or_allowed_address(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='192.168.1.5').status_code, 403)
+        self.assertEqual(self.client.get(
+            '/metrics', REMOTE_ADDR='192.168.1.5', HTTP_AUTHORIZATION='Bearer wrong-key'
+        ).status_code, 403)
+        self.assertEqual(self.client.get(
+            '/metrics', REMOTE_ADDR='192.168.1.5', HTTP_AUTHORIZATION='Bearer scrape-key'
+        ).status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, 200)
+
+
+class ProfilingTests(QueryPatternAssertions, TestCase):
+    def setUp(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(PROFILING_ENABLED=True, PROFILE_DIR=os.path.join(directory, 'profiles')))
+        self.admin = User.objects.create(username='librarian', role='administrator')
+        Administrator.objects.create(user=self.admin)
+        self.student = User.objects.create(username='reader', role='student')
+        Student.objects.create(user=self.student, roll_number='R1', is_approved=True)
+        books = Books.objects.bulk_create([
+            Books(title=f'Book {index}', author='Author', isbn=f'{index:013d}', available_copies=2)
+            for index in range(5)
+        ])
+        due_date = timezone.now().date() - timedelta(days=2)
+        BorrowRecord.objects.bulk_create([
+            BorrowRecord(user=self.student, book=book, status='overdue', due_date=due_date) for book in books
+        ])
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+        return client
+
+    def test_administrators_can_profile_a_request(self):
+        client = self.client_for(self.admin)
+        response = client.get(reverse('students_dues'), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+
+        report = client.get(reverse('profile_detail', args=[profile_id])).json()
+        self.assertEqual((report['path'], report['status']), (reverse('students_dues'), 200))
+        self.assertGreater(report['sql']['count'], 0)
+        self.assertEqual(report['sql']['repeated'], [])
+        self.assertIn('function calls', report['top_functions'])
+        # Parameter values are never written to disk
+        fields = {field for query in report['sql']['queries'] for field in query}
+        self.assertEqual(fields, {'sql', 'params_digest', 'ms', 'source'})
+
+        dump = client.get(reverse('profile_detail', args=[profile_id]), {'download': '1'})
+        self.assertEqual(dump.status_code, 200)
+        self.assertGreater(len(b''.join(dump.streaming_content)), 0)
+        listed = client.get(reverse('profile_list')).json()['results']
+        self.assertEqual([row['id'] for row in listed], [profile_id])
+
+    def test_only_administrators_are_profiled(self):
+        response = self.client_for(self.student).get(reverse('borrow_history'), {'profile': '1'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.client.get(reverse('list_books'), HTTP_X_PROFILE='1').status_code, 200)
+        self.assertEqual(self.client_for(self.admin).get(reverse('profile_list')).json()['results'], [])
+
+    def test_unknown_and_malformed_ids(self):
+        client = self.client_for(self.admin)
+        for profile_id in ('0' * 32, '..%2Fsettings', 'not-a-profile'):
+            self.assertEqual(client.get(f"{reverse('profile_list')}{profile_id}/").status_code, 404)
+
+    def test_detector_flags_n_plus_one(self):
+        with self.assertRaisesMessage(RepeatedQueriesError, '5x SELECT'):
+            with self.assertNoRepeatedQueries():
+                [record.book.title for record in BorrowRecord.objects.all()]
+
+    def test_list_endpoints_do_not_repeat_queries(self):
+        requests = [
+            (None, 'list_books'), (None, 'category_list'),
+            (self.student, 'borrow_book'), (self.student, 'borrow_history'), (self.student, 'student_stats'),
+            (self.admin, 'borrow_book'), (self.admin, 'students_dues'), (self.admin, 'pending_registrations'),
+            (self.admin, 'admin_dashboard_stats'),
+        ]
+        for user, route in requests:
+            client = self.client_for(user) if user else APIClient()
+            with self.subTest(route=route, role=user.role if user else 'anonymous'), self.assertNoRepeatedQueries():
+                self.assertEqual(client.get(reverse(route)).status_code, 200)
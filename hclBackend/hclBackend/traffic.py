@@ -0,0 +1,291 @@
+"""
+Recording and replaying API traffic.
+
+When ``TRAFFIC_LOG`` is set, ``APIKeyMiddleware`` appends one JSON line per
+``/api/`` request to that file: arrival time, method, route, query, JSON body,
+status and duration. Personal data is scrubbed before anything is written:
+passwords, tokens, names and phone numbers become ``[redacted]``, and
+emails, usernames and roll numbers become keyed pseudonyms that stay unique
+(and stable within one deployment) but cannot be reversed without the
+``SECRET_KEY``. The caller is kept only as a user id and role.
+
+``replay_traffic`` sends such a log to a running server, keeping the
+recorded gaps between requests divided by a speed factor, and reports
+throughput and latency per route.
+"""
+import hashlib
+import hmac
+import http.client
+import json
+import os
+import queue
+import threading
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from hclBackend.benchmarking import summarize
+from users.models import User
+
+RECORDED_PREFIX = '/api/'
+REDACTED = '[redacted]'
+REDACTED_KEYS = {
+    'password', 'old_password', 'new_password', 'token', 'refresh', 'access', 'secret', 'api_key',
+    'phone', 'full_name', 'first_name', 'last_name', 'name',
+}
+PSEUDONYMS = {
+    'email': '{}@example.invalid',
+    'username': 'user-{}',
+    'roll_number': 'R{}',
+}
+
+
+def pseudonym(key, value):
+    digest = hmac.new(settings.SECRET_KEY.encode(), str(value).lower().encode(), hashlib.sha256).hexdigest()
+    return PSEUDONYMS[key].format(digest[:12])
+
+
+def scrub(value):
+    """Copy of a JSON value with personal data and credentials replaced."""
+    if isinstance(value, dict):
+        scrubbed = {}
+        for key, item in value.items():
+            lowered = str(key).lower()
+            if lowered in REDACTED_KEYS:
+                scrubbed[key] = REDACTED
+            elif lowered in PSEUDONYMS and isinstance(item, (str, int)):
+                scrubbed[key] = pseudonym(lowered, item)
+            elif lowered in PSEUDONYMS and isinstance(item, list):
+                scrubbed[key] = [pseudonym(lowered, element) for element in item]
+            else:
+                scrubbed[key] = scrub(item)
+        return scrubbed
+    if isinstance(value, list):
+        return [scrub(item) for item in value]
+    return value
+
+
+class TrafficRecorder:
+    """Appends entries to a JSONL file; one ``write`` per line, so concurrent workers don't interleave."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def write(self, entry):
+        os.write(self.fd, (json.dumps(entry, separators=(',', ':'), default=str) + '\n').encode())
+
+
+_recorders = {}
+_recorders_lock = threading.Lock()
+
+
+def get_recorder():
+    """The recorder for ``settings.TRAFFIC_LOG``, or None when recording is off."""
+    path = settings.TRAFFIC_LOG
+    if not path:
+        return None
+    recorder = _recorders.get(path)
+    if recorder is None:
+        with _recorders_lock:
+            recorder = _recorders.setdefault(path, TrafficRecorder(path))
+    return recorder
+
+
+def traffic_entry(request, response, started_at, duration, body):
+    """
+    The log line for one request. ``body`` is the parsed JSON body, or None
+    when it was not read (uploads and other non-JSON bodies).
+    """
+    match = request.resolver_match
+    user = getattr(request, 'user', None)
+    authenticated = bool(user is not None and user.is_authenticated)
+    return {
+        'ts': round(started_at, 6),
+        'method': request.method,
+        'path': request.path,
+        'route': match.url_name if match else None,
+        'query': scrub({key: request.GET.getlist(key) for key in request.GET}),
+        'content_type': request.content_type,
+        'body': scrub(body),
+        'body_bytes': int(request.META.get('CONTENT_LENGTH') or 0),
+        'user_id': user.pk if authenticated else None,
+        'role': getattr(user, 'role', None) if authenticated else None,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'streaming': response.streaming,
+    }
+
+
+# Replay
+
+def load_entries(path, limit=None):
+    with open(path) as handle:
+        entries = [json.loads(line) for line in handle if line.strip()]
+    entries.sort(key=lambda entry: entry['ts'])
+    return entries[:limit] if limit else entries
+
+
+def restore_passwords(value, password):
+    """Put ``password`` back wherever a recorded password was redacted."""
+    if isinstance(value, dict):
+        return {
+            key: password if 'password' in str(key).lower() and item == REDACTED else restore_passwords(item, password)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [restore_passwords(item, password) for item in value]
+    return value
+
+
+class TokenMinter:
+    """
+    Access tokens for replayed requests. Recorded users that exist in this
+    database are replayed as themselves; others as an existing user of the
+    same role. Needs the target server's database and ``SECRET_KEY``.
+    """
+
+    def __init__(self, entries, substitutes=1000):
+        recorded = {entry['user_id'] for entry in entries if entry.get('user_id') is not None}
+        self.users = User.objects.in_bulk(recorded)
+        roles = {entry['role'] for entry in entries if entry.get('role')}
+        self.substitutes = {
+            role: list(User.objects.filter(role=role, is_active=True).order_by('id')[:substitutes])
+            for role in roles
+        }
+        self.tokens = {}
+
+    def __call__(self, entry):
+        user_id = entry.get('user_id')
+        if user_id is None:
+            return None
+        user = self.users.get(user_id)
+        if user is None:
+            pool = self.substitutes.get(entry.get('role')) or []
+            if not pool:
+                return None
+            user = pool[user_id % len(pool)]
+        if user.pk not in self.tokens:
+            self.tokens[user.pk] = str(RefreshToken.for_user(user).access_token)
+        return self.tokens[user.pk]
+
+
+def route_label(entry):
+    return f"{entry['method']} {entry.get('route') or entry['path']}"
+
+
+class Replayer:
+    """
+    Sends recorded entries to ``target`` from ``concurrency`` threads, each
+    with its own keep-alive connection. Entries are released on the
+    recorded schedule divided by ``speed`` (0 sends as fast as possible);
+    when every thread is busy the schedule slips and the lag is reported.
+    """
+
+    def __init__(self, target, speed=1.0, concurrency=8, tokens=None, password=None, timeout=30):
+        parts = urlsplit(target)
+        self.scheme, self.host, self.port = parts.scheme, parts.hostname, parts.port
+        self.speed = speed
+        self.concurrency = concurrency
+        self.tokens = tokens or (lambda entry: None)
+        self.password = password
+        self.timeout = timeout
+
+    def connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        return connection_class(self.host, self.port, timeout=self.timeout)
+
+    def build(self, entry):
+        """``(method, url, body, headers)`` for an entry, or None if it can't be replayed."""
+        url = entry['path']
+        if entry.get('query'):
+            url = f"{url}?{urlencode(entry['query'], doseq=True)}"
+        headers = {}
+        token = self.tokens(entry)
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        body = None
+        if entry.get('body') is not None:
+            payload = restore_passwords(entry['body'], self.password) if self.password else entry['body']
+            body = json.dumps(payload).encode()
+            headers['Content-Type'] = 'application/json'
+        elif entry.get('body_bytes'):
+            return None
+        return entry['method'], url, body, headers
+
+    def run(self, entries):
+        jobs = queue.Queue(maxsize=self.concurrency * 4)
+        results = []
+        skipped = Counter()
+
+        def worker():
+            connection = self.connect()
+            while True:
+                job = jobs.get()
+                if job is None:
+                    break
+                label, (method, url, body, headers) = job
+                start = time.perf_counter()
+                try:
+                    connection.request(method, url, body=body, headers=headers)
+                    response = connection.getresponse()
+                    response.read()
+                    outcome = str(response.status)
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    connection = self.connect()
+                    outcome = 'connection error'
+                results.append((label, outcome, time.perf_counter() - start))
+            connection.close()
+
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(self.concurrency)]
+        for thread in threads:
+            thread.start()
+
+        started = time.perf_counter()
+        first_ts = entries[0]['ts'] if entries else 0
+        max_lag = 0.0
+        for entry in entries:
+            request = self.build(entry)
+            if request is None:
+                skipped['body not recorded'] += 1
+                continue
+            if self.speed > 0:
+                delay = (entry['ts'] - first_ts) / self.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+            jobs.put((route_label(entry), request))
+        for _ in threads:
+            jobs.put(None)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return self.report(results, elapsed, max_lag, skipped)
+
+    def report(self, results, elapsed, max_lag, skipped):
+        by_route = defaultdict(list)
+        for label, outcome, latency in results:
+            by_route[label].append((outcome, latency))
+        routes = {}
+        for label, samples in sorted(by_route.items()):
+            statuses = Counter(outcome for outcome, _ in samples)
+            routes[label] = {
+                'count': len(samples),
+                'errors': sum(n for outcome, n in statuses.items() if outcome[:1] not in ('2', '3')),
+                'statuses': dict(statuses),
+                'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0.0,
+                **summarize([latency for _, latency in samples]),
+            }
+        return {
+            'requests': len(results),
+            'skipped': dict(skipped),
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(results) / elapsed, 2) if elapsed else 0.0,
+            'max_schedule_lag_ms': round(max_lag * 1000, 3),
+            'routes': routes,
+        }
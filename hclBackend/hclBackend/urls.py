@@ -18,6 +18,7 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework_simplejwt.views import TokenRefreshView
 from users.views import LoginView
+from hclBackend.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -31,4 +32,7 @@ urlpatterns = [
     path('api/books/', include('books.urls')),
     path('api/borrow/', include('borrow.urls')),
     path('api/admin/', include('admin.urls')),
+
+    # Prometheus scrape endpoint (METRICS_ENABLED)
+    path('metrics', metrics_view, name='metrics'),
 ]
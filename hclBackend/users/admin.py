@@ -1,10 +1,30 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from .authentication import bump_auth_version
 from .models import User, Student, Administrator, RegistrationRequest
 
 
+class AuthVersionAdminMixin:
+    """Role, approval and active-flag edits take effect on tokens already issued."""
+    user_id_field = 'id'
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        bump_auth_version(getattr(obj, self.user_id_field))
+
+    def delete_model(self, request, obj):
+        user_id = getattr(obj, self.user_id_field)
+        super().delete_model(request, obj)
+        bump_auth_version(user_id)
+
+    def delete_queryset(self, request, queryset):
+        user_ids = list(queryset.values_list(self.user_id_field, flat=True))
+        super().delete_queryset(request, queryset)
+        bump_auth_version(*user_ids)
+
+
 @admin.register(User)
-class CustomUserAdmin(BaseUserAdmin):
+class CustomUserAdmin(AuthVersionAdminMixin, BaseUserAdmin):
     fieldsets = BaseUserAdmin.fieldsets + (
         ('Role', {'fields': ('role',)}),
     )
@@ -13,11 +33,13 @@ class CustomUserAdmin(BaseUserAdmin):
 
 
 @admin.register(Student)
-class StudentAdmin(admin.ModelAdmin):
+class StudentAdmin(AuthVersionAdminMixin, admin.ModelAdmin):
+    user_id_field = 'user_id'
     list_display = ['user', 'roll_number', 'is_approved', 'total_fines', 'created_at']
     list_filter = ['is_approved', 'created_at', 'department']
     search_fields = ['user__username', 'user__email', 'roll_number']
-    readonly_fields = ['created_at', 'updated_at']
+    # Summed from the loans by the overdue sweep (borrow.fines)
+    readonly_fields = ['total_fines', 'created_at', 'updated_at']
 
 
 @admin.register(Administrator)
@@ -33,4 +55,4 @@ class RegistrationRequestAdmin(admin.ModelAdmin):
     list_display = ['email', 'name', 'roll_number', 'status', 'created_at']
     list_filter = ['status', 'created_at', 'department']
     search_fields = ['email', 'name', 'roll_number']
-    readonly_fields = ['created_at', 'updated_at']
\ No newline at end of file
+    readonly_fields = ['created_at', 'updated_at']
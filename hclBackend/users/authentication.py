@@ -0,0 +1,159 @@
+"""
+JWT authentication without a user query per request.
+
+Tokens issued by ``/api/token/`` and ``/api/token/refresh/`` carry the
+user's role, approval state and auth version as claims (``add_claims``).
+``ClaimsJWTAuthentication`` trusts those claims for as long as the token's
+auth version is the user's current one, read from the cache like the other
+version counters (``hclBackend.caching``), and hands the view a
+``ClaimsUser`` built from the token alone. The ``users`` row is only loaded
+if the view reads an attribute the token doesn't carry.
+
+Whatever changes a user's role, approval or active flag must call
+``bump_auth_version``; tokens issued before that (and tokens without the
+claims) fall back to simplejwt's database lookup until they are refreshed.
+A bump only reaches other gunicorn workers through a shared cache, so with
+the per-process cache (``CACHE_SHARED`` off) every request takes the
+database lookup.
+
+Tokens revoked by logout or refresh rotation are refused (``users.revocation``).
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from hclBackend.caching import bump_version, get_version
+from .models import Student
+from .revocation import is_token_revoked, revoke_token
+
+ROLE_CLAIM = 'role'
+APPROVED_CLAIM = 'approved'
+AUTH_VERSION_CLAIM = 'auth_version'
+
+
+def auth_version_name(user_id):
+    return f'auth:{user_id}'
+
+
+def bump_auth_version(*user_ids):
+    """Make tokens issued so far re-read these users' role and approval from the database."""
+    names = [auth_version_name(user_id) for user_id in user_ids]
+    bump_version(*names)
+    # Inside a transaction, a token issued before the commit still reads the
+    # old role under the new version; bump again once the change is visible.
+    transaction.on_commit(lambda: bump_version(*names))
+
+
+def is_approved(user):
+    """Approval as the borrow view sees it: non-students always, students once approved."""
+    if isinstance(user, ClaimsUser):
+        return user.is_approved
+    if user.role != 'student':
+        return True
+    return Student.objects.filter(user_id=user.pk, is_approved=True).exists()
+
+
+def add_claims(token, user):
+    # The version is read before the role and approval: a change committed
+    # after that bumps it, so the token is stale rather than wrong.
+    token[AUTH_VERSION_CLAIM] = get_version(auth_version_name(user.pk))
+    current = get_user_model().objects.filter(pk=user.pk).annotate(approved=Exists(
+        Student.objects.filter(user_id=OuterRef('pk'), is_approved=True)
+    )).values('role', 'approved').get()
+    token[ROLE_CLAIM] = current['role']
+    token[APPROVED_CLAIM] = current['role'] != 'student' or current['approved']
+    return token
+
+
+class ClaimsUser:
+    """
+    The authenticated user as described by a verified token.
+
+    ``id``, ``role`` and ``is_approved`` come from the claims; any other
+    attribute (``email``, ``student_profile``, ...) loads the user row once
+    and reads it from there. Code that needs a model instance, e.g. to
+    assign a foreign key, should use ``user.instance`` or ``user.id``.
+    """
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, token):
+        self.token = token
+        # simplejwt stores the id as a string
+        id_field = get_user_model()._meta.get_field(api_settings.USER_ID_FIELD)
+        self.id = self.pk = id_field.to_python(token[api_settings.USER_ID_CLAIM])
+        self.role = token[ROLE_CLAIM]
+        self.is_approved = token[APPROVED_CLAIM]
+
+    @cached_property
+    def instance(self):
+        return get_user_model().objects.get(pk=self.id)
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name == 'instance':
+            raise AttributeError(name)
+        return getattr(self.instance, name)
+
+    def __str__(self):
+        return str(self.instance)
+
+    def __eq__(self, other):
+        return getattr(other, 'pk', None) == self.pk and getattr(other, 'is_authenticated', False)
+
+    def __hash__(self):
+        return hash(self.pk)
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_token_revoked(token):
+            raise InvalidToken('Token has been revoked')
+        return token
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        version = validated_token.get(AUTH_VERSION_CLAIM)
+        if (
+            settings.CACHE_SHARED
+            and user_id is not None and version is not None
+            and version == get_version(auth_version_name(user_id))
+        ):
+            return ClaimsUser(validated_token)
+        return super().get_user(validated_token)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refresh (and rotate) as simplejwt does, re-reading the claims from the
+    user row it loads anyway. Revoked refresh tokens are refused, and a
+    rotated one is revoked (``BLACKLIST_AFTER_ROTATION``).
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if is_token_revoked(refresh):
+            raise TokenError('Token has been revoked')
+        user = get_user_model().objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.get(api_settings.USER_ID_CLAIM)}
+        ).first()
+        if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
+        add_claims(refresh, user)
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                revoke_token(refresh)
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['is_approved', 'total_fines', 'id'], name='student_approved_fines_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['is_approved', 'department', 'total_fines', 'id'], name='student_dept_fines_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['is_approved', 'created_at', 'id'], name='student_approved_created_idx'),
+        ),
+    ]
@@ -34,10 +34,19 @@ class Student(models.Model):
     phone = models.CharField(max_length=15, null=True, blank=True)
     department = models.CharField(max_length=100, null=True, blank=True)
     is_approved = models.BooleanField(default=False)
+    # Derived: the overdue sweep sets it to the sum of the student's loan fines
     total_fines = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Access paths of the admin dues list (StudentsDueListView); id is the sort tiebreaker
+        indexes = [
+            models.Index(fields=['is_approved', 'total_fines', 'id'], name='student_approved_fines_idx'),
+            models.Index(fields=['is_approved', 'department', 'total_fines', 'id'], name='student_dept_fines_idx'),
+            models.Index(fields=['is_approved', 'created_at', 'id'], name='student_approved_created_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.roll_number}"
 
@@ -79,4 +88,13 @@ class RegistrationRequest(models.Model):
         ordering = ['-created_at']
 
     def __str__(self):
-        return f"{self.email} - {self.status}"
\ No newline at end of file
+        return f"{self.email} - {self.status}"
+
+
+class RevokedToken(models.Model):
+    """A revoked JWT, until it would have expired anyway; the id orders revocations (``users.revocation``)."""
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
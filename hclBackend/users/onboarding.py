@@ -0,0 +1,289 @@
+"""
+Bulk student onboarding used by ImportStudentsView and the import_students command.
+
+Each row describes one student: ``username``, ``email`` and
+``roll_number`` (required), ``department``, ``full_name`` and
+``password`` (optional; a random one is generated and reported back when
+it is missing). Rows are processed a chunk at a time:
+
+1. Fields are validated in Python, and usernames, emails (ignoring case)
+   and roll numbers repeated within the chunk are rejected.
+2. Three set-based queries find the usernames, emails and roll numbers
+   that are already taken.
+3. The passwords of the remaining rows are hashed across a pool of worker
+   processes. PBKDF2 is deliberately slow, so this is most of the work.
+   The command starts ``ONBOARDING_WORKERS`` of them for its run; the view
+   shares one small pool of ``ONBOARDING_VIEW_WORKERS`` per gunicorn
+   worker, started on the first import and kept for the next.
+4. The ``User`` and ``Student`` rows go in with one ``bulk_create`` each,
+   inside a transaction, so a chunk is either fully written or not at all.
+
+Uniqueness clashes with rows from earlier chunks are caught by step 2 of
+the later chunk.
+"""
+import contextlib
+import itertools
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models.functions import Lower
+
+from .models import Student, User
+
+DEFAULT_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 5000
+# Chunks with fewer passwords than this are hashed in-process; starting the
+# pool costs more than it saves
+POOL_MIN_PASSWORDS = 8
+GENERATED_PASSWORD_BYTES = 9
+
+# Field lengths enforced before insert, as the model would
+MAX_LENGTHS = {'username': 150, 'email': 254, 'roll_number': 20, 'department': 100, 'full_name': 300}
+UNIQUE_FIELDS = {'username': 'username', 'email': 'email', 'roll_number': 'roll number'}
+
+
+def clean_row(data):
+    """Return the validated fields of ``data``; raise ValidationError otherwise."""
+    if isinstance(data, ValidationError):
+        # A reader could not parse this row and passed its error through.
+        raise data
+    if not isinstance(data, dict):
+        raise ValidationError('Each student must be an object')
+
+    values = {name: str(data.get(name) or '').strip() for name in MAX_LENGTHS}
+    for name in UNIQUE_FIELDS:
+        if not values[name]:
+            raise ValidationError(f'{name} is required')
+    for name, length in MAX_LENGTHS.items():
+        if len(values[name]) > length:
+            raise ValidationError(f'{name}: at most {length} characters')
+    try:
+        UnicodeUsernameValidator()(values['username'])
+        validate_email(values['email'])
+    except ValidationError as exc:
+        raise ValidationError(' '.join(exc.messages))
+
+    values['generated'] = not data.get('password')
+    values['password'] = str(data.get('password') or secrets.token_urlsafe(GENERATED_PASSWORD_BYTES))
+    return values
+
+
+def unique_key(name, values):
+    return values[name].lower() if name == 'email' else values[name]
+
+
+def row_summary(index, data, error):
+    data = data if isinstance(data, dict) else {}
+    return {
+        'index': index,
+        'username': data.get('username', 'Unknown'),
+        'roll_number': data.get('roll_number', 'Unknown'),
+        'error': error,
+    }
+
+
+def student_summary(student, values):
+    summary = {
+        'id': student.user_id,
+        'username': values['username'],
+        'email': values['email'],
+        'roll_number': values['roll_number'],
+    }
+    if values['generated']:
+        summary['password'] = values['password']
+    return summary
+
+
+def start_pool(workers):
+    # Spawned rather than forked, so workers never share the caller's
+    # database connections; they only run ``make_password``.
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup)
+
+
+shared_pool = None
+shared_pool_pid = None
+shared_pool_lock = threading.Lock()
+
+
+def get_shared_pool():
+    """This process's pool of ``ONBOARDING_VIEW_WORKERS`` hashers, started on first use and then reused."""
+    global shared_pool, shared_pool_pid
+    with shared_pool_lock:
+        if shared_pool is None or shared_pool_pid != os.getpid():
+            shared_pool = start_pool(settings.ONBOARDING_VIEW_WORKERS)
+            shared_pool_pid = os.getpid()
+        return shared_pool
+
+
+@contextlib.contextmanager
+def password_hasher(workers=None, pool_min=POOL_MIN_PASSWORDS, shared=False):
+    """
+    Yield a function hashing a list of passwords with ``make_password``.
+
+    With ``workers > 1`` large lists are spread over a process pool, started
+    on first use and shut down on exit. With ``shared`` they go to the
+    process-wide pool of ``get_shared_pool`` instead, which is left running.
+    """
+    if shared:
+        workers = settings.ONBOARDING_VIEW_WORKERS
+    elif workers is None:
+        workers = settings.ONBOARDING_WORKERS
+    pool = None
+
+    def hash_passwords(passwords):
+        nonlocal pool
+        if workers <= 1 or len(passwords) < pool_min:
+            return [make_password(password) for password in passwords]
+        if pool is None:
+            pool = get_shared_pool() if shared else start_pool(workers)
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+    try:
+        yield hash_passwords
+    finally:
+        if pool is not None and not shared:
+            pool.shutdown()
+
+
+def import_students(rows, approved=True, batch_size=DEFAULT_BATCH_SIZE, workers=None, shared_pool=False):
+    """
+    Import an iterable of student dicts and return the per-row report.
+    Passwords are hashed by ``workers`` processes started for this import,
+    or by the process-wide pool with ``shared_pool``.
+
+    The report holds ``created_students`` and ``failed_students`` lists,
+    ``total`` (rows read), and the throughput as ``elapsed_s`` and
+    ``users_per_s``.
+    """
+    report = {'total': 0, 'created_students': [], 'failed_students': []}
+    start = time.perf_counter()
+    with password_hasher(workers, shared=shared_pool) as hash_passwords:
+        for result in iter_import(rows, hash_passwords, approved, batch_size):
+            report['total'] += result['rows']
+            report['created_students'].extend(result['created'])
+            report['failed_students'].extend(result['failed'])
+    elapsed = time.perf_counter() - start
+    report['elapsed_s'] = round(elapsed, 3)
+    report['users_per_s'] = round(len(report['created_students']) / elapsed, 1) if elapsed else None
+    return report
+
+
+def iter_import(rows, hash_passwords, approved=True, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import ``rows`` lazily, yielding one result per chunk once it is committed.
+
+    Each result holds ``rows`` (rows read) and the ``created`` and
+    ``failed`` row summaries.
+    """
+    rows = enumerate(rows)
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+
+        chunk, failed = [], []
+        seen = {name: set() for name in UNIQUE_FIELDS}
+        for index, data in batch:
+            try:
+                values = clean_row(data)
+            except ValidationError as exc:
+                failed.append(row_summary(index, data, ' '.join(exc.messages)))
+                continue
+            duplicate = next((name for name in UNIQUE_FIELDS if unique_key(name, values) in seen[name]), None)
+            if duplicate:
+                failed.append(row_summary(index, data, f'Duplicate {UNIQUE_FIELDS[duplicate]} in upload'))
+                continue
+            for name in UNIQUE_FIELDS:
+                seen[name].add(unique_key(name, values))
+            chunk.append((index, data, values))
+
+        result = {'rows': len(batch), 'created': [], 'failed': failed}
+        if chunk:
+            import_chunk(chunk, hash_passwords, approved, result)
+        result['failed'].sort(key=lambda row: row['index'])
+        yield result
+
+
+def import_chunk(chunk, hash_passwords, approved, result):
+    hashes = {}
+    # A concurrent writer can take one of our usernames between the lookup
+    # and the insert; the chunk is rolled back, so look them up once more.
+    for _ in range(2):
+        chunk, taken = split_taken(chunk)
+        result['failed'].extend(taken)
+        if not chunk:
+            return
+        pending = [(index, values['password']) for index, _, values in chunk if index not in hashes]
+        hashes.update(zip([index for index, _ in pending], hash_passwords([password for _, password in pending])))
+        try:
+            with transaction.atomic():
+                students = write_chunk(chunk, hashes, approved)
+            break
+        except IntegrityError as exc:
+            error = str(exc)
+    else:
+        result['failed'].extend(row_summary(index, data, error) for index, data, _ in chunk)
+        return
+
+    result['created'] = [student_summary(student, values) for student, (_, _, values) in zip(students, chunk)]
+
+
+def split_taken(chunk):
+    """Split ``chunk`` into rows that can be inserted and failures for usernames, emails or roll numbers in use."""
+    usernames = set(User.objects.filter(
+        username__in=[values['username'] for _, _, values in chunk]
+    ).values_list('username', flat=True))
+    emails = set(User.objects.annotate(normalized=Lower('email')).filter(
+        normalized__in=[values['email'].lower() for _, _, values in chunk]
+    ).values_list('normalized', flat=True))
+    roll_numbers = set(Student.objects.filter(
+        roll_number__in=[values['roll_number'] for _, _, values in chunk]
+    ).values_list('roll_number', flat=True))
+
+    free, taken = [], []
+    for index, data, values in chunk:
+        if values['username'] in usernames:
+            taken.append(row_summary(index, data, 'A user with this username already exists'))
+        elif values['email'].lower() in emails:
+            taken.append(row_summary(index, data, 'A user with this email already exists'))
+        elif values['roll_number'] in roll_numbers:
+            taken.append(row_summary(index, data, 'A student with this roll number already exists'))
+        else:
+            free.append((index, data, values))
+    return free, taken
+
+
+def write_chunk(chunk, hashes, approved):
+    users = []
+    for index, _, values in chunk:
+        first_name, _, last_name = values['full_name'].partition(' ')
+        users.append(User(
+            username=values['username'],
+            email=values['email'],
+            password=hashes[index],
+            first_name=first_name[:150],
+            last_name=last_name.strip()[:150],
+            role='student',
+            is_active=True,
+        ))
+    User.objects.bulk_create(users)
+    return Student.objects.bulk_create([
+        Student(
+            user=user,
+            roll_number=values['roll_number'],
+            department=values['department'],
+            is_approved=approved,
+        )
+        for user, (_, _, values) in zip(users, chunk)
+    ])
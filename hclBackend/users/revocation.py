@@ -0,0 +1,160 @@
+"""
+Revoked JWTs, by ``jti``.
+
+Logout revokes the tokens it is given, and refresh rotation revokes the
+refresh token it replaces. Each revocation is a ``RevokedToken`` row,
+kept until the token would have expired anyway; the table is the
+authoritative record, so revocations survive cache evictions and reach
+every worker whatever cache backend is configured.
+
+Every process keeps a Bloom filter of the revoked jtis, so checking a
+token that was never revoked (nearly every request) doesn't touch the
+database. At most every ``REVOCATION_SYNC_INTERVAL`` seconds a check also
+reads the rows added since the last sync (one indexed range read), which
+is how a logout handled by one gunicorn worker reaches the others. A jti
+the filter does contain is confirmed against its row, which rules out
+false positives and revocations that have since expired.
+
+Once the filter holds more than it was sized for, a background thread
+deletes the expired rows and builds a new filter from the rest, then
+swaps it in; requests keep using the old one (more false positives, no
+false negatives) meanwhile. Only a process's very first check loads the
+filter on the request thread.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+from datetime import UTC, datetime
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import RevokedToken
+
+# Rows fetched per round trip when (re)building a filter
+LOG_CHUNK = 1000
+# Recent rows read again on every sync, in case their ids were taken but
+# not yet committed when the previous sync ran
+LOG_OVERLAP = 64
+
+
+class BloomFilter:
+    """A fixed-size Bloom filter of strings: no false negatives, ``error_rate`` false positives at ``capacity``."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * step) % self.size for index in range(self.hashes)]
+
+    def add(self, item):
+        positions = self.positions(item)
+        if all(self.bits[position >> 3] >> (position & 7) & 1 for position in positions):
+            return
+        for position in positions:
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        bits = self.bits
+        return all(bits[position >> 3] >> (position & 7) & 1 for position in self.positions(item))
+
+
+class RevocationStore:
+    def __init__(self, capacity=None, error_rate=None, sync_interval=None):
+        self.capacity = capacity or settings.REVOCATION_CAPACITY
+        self.error_rate = error_rate or settings.REVOCATION_ERROR_RATE
+        self.sync_interval = settings.REVOCATION_SYNC_INTERVAL if sync_interval is None else sync_interval
+        self.lock = threading.Lock()
+        self.filter = None
+        self.pid = None
+        self.seen = 0
+        self.synced_at = 0.0
+        self.rebuilding = False
+
+    def revoke(self, jti, expires_at):
+        """Revoke ``jti`` until ``expires_at`` (a Unix timestamp), when the token stops being valid anyway."""
+        if expires_at <= time.time():
+            return
+        RevokedToken.objects.bulk_create([
+            RevokedToken(jti=jti, expires_at=datetime.fromtimestamp(expires_at, tz=UTC))
+        ], ignore_conflicts=True)
+        self.sync()
+        self.filter.add(jti)
+
+    def is_revoked(self, jti):
+        self.sync()
+        if jti not in self.filter:
+            return False
+        return RevokedToken.objects.filter(jti=jti, expires_at__gt=timezone.now()).exists()
+
+    def sync(self, force=False):
+        """Add rows revoked since the last sync to this process's filter, starting a rebuild once it is full."""
+        if (not force and self.pid == os.getpid()
+                and time.monotonic() - self.synced_at < self.sync_interval):
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.filter, self.seen = self.build()
+                self.pid = os.getpid()
+                self.rebuilding = False
+            else:
+                self.seen = max(self.seen, self.load(self.filter, max(self.seen - LOG_OVERLAP, 0)))
+            self.synced_at = time.monotonic()
+            if self.filter.count > self.filter.capacity and not self.rebuilding:
+                self.rebuilding = True
+                threading.Thread(target=self.rebuild_in_background, daemon=True).start()
+
+    def build(self):
+        """Drop expired rows and load the rest into a new filter; returns ``(filter, last_id)``."""
+        RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+        live = RevokedToken.objects.count()
+        bloom = BloomFilter(max(self.capacity, 2 * live), self.error_rate)
+        return bloom, self.load(bloom, 0)
+
+    def load(self, bloom, after):
+        """Add every row with an id above ``after`` to ``bloom``; returns the last id seen."""
+        last = after
+        while True:
+            rows = list(RevokedToken.objects.filter(id__gt=last).order_by('id').values_list('id', 'jti')[:LOG_CHUNK])
+            for last, jti in rows:
+                bloom.add(jti)
+            if len(rows) < LOG_CHUNK:
+                return last
+
+    def rebuild(self):
+        bloom, last = self.build()
+        with self.lock:
+            # Rows revoked while the new filter was built
+            self.seen = max(self.seen, self.load(bloom, max(last - LOG_OVERLAP, 0)))
+            self.filter = bloom
+            self.rebuilding = False
+
+    def rebuild_in_background(self):
+        try:
+            self.rebuild()
+        finally:
+            self.rebuilding = False
+            connections.close_all()
+
+
+revocations = RevocationStore()
+
+
+def revoke_token(token):
+    revocations.revoke(token[api_settings.JTI_CLAIM], token['exp'])
+
+
+def is_token_revoked(token):
+    return revocations.is_revoked(token[api_settings.JTI_CLAIM])
@@ -1,24 +1,23 @@
 from rest_framework import serializers
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .authentication import add_claims, is_approved
 from .models import User, Student, RegistrationRequest
 
 # ---------- AUTH ----------
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Role and approval ride along as claims (see users.authentication)
+        return add_claims(super().get_token(user), user)
+
     def validate(self, attrs):
         data = super().validate(attrs)
-        
-        is_approved = True
-        if self.user.role == 'student':
-            try:
-                is_approved = self.user.student_profile.is_approved
-            except:
-                is_approved = False
 
         data['user'] = {
             'username': self.user.username,
             'email': self.user.email,
             'role': self.user.role,
-            'is_approved': is_approved,
+            'is_approved': is_approved(self.user),
         }
         return data
 
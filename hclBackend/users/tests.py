@@ -1,3 +1,300 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from books.models import Books
+from hclBackend.caching import get_version
+from hclBackend.factories import make_student
+from .authentication import ClaimsJWTAuthentication, ClaimsUser, bump_auth_version, is_approved
+from .models import Administrator, RevokedToken, Student, User
+from . import onboarding
+from .onboarding import import_students, password_hasher
+from .revocation import BloomFilter, RevocationStore, revocations, revoke_token
+from .serializers import CustomTokenObtainPairSerializer
+
+
+@override_settings(CACHE_SHARED=True)
+class ClaimsAuthenticationTests(APITestCase):
+    """Role and approval travel in the token; the database is only asked again after a change."""
+
+    def setUp(self):
+        self.student = make_student('reader', approved=False)
+        self.admin = User.objects.create(username='librarian', role='administrator')
+        Administrator.objects.create(user=self.admin)
+        self.book = Books.objects.create(
+            title='Book', description='', author='Author', isbn='9780000000001', available_copies=2
+        )
+        # Keep the once-a-second revocation sync out of the query counts
+        revocations.sync(force=True)
+        patcher = mock.patch.object(revocations, 'sync_interval', 3600)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def authenticate(self, token):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+        user, _ = ClaimsJWTAuthentication().authenticate(request)
+        return user
+
+    def borrow(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+        return self.client.post(reverse('borrow_book'), {'book_id': self.book.id}, format='json')
+
+    def test_current_token_authenticates_without_queries(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.student)
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual((user.id, user.role, user.is_approved), (self.student.id, 'student', False))
+        # Anything not in the token comes from the user row
+        self.assertEqual(user.username, 'reader')
+
+    def test_stale_token_falls_back_to_database(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.student)
+        bump_auth_version(self.student.id)
+        with self.assertNumQueries(1):
+            user = self.authenticate(token)
+        self.assertIsInstance(user, User)
+
+    def test_change_while_issuing_leaves_no_stale_claims(self):
+        # An approval committed just before the version is read must be in the token
+        def approve_then_get_version(name):
+            Student.objects.filter(user=self.student).update(is_approved=True)
+            bump_auth_version(self.student.id)
+            return get_version(name)
+
+        with mock.patch('users.authentication.get_version', side_effect=approve_then_get_version):
+            token = CustomTokenObtainPairSerializer.get_token(self.student)
+        self.assertTrue(is_approved(self.authenticate(token)))
+
+    def test_per_process_cache_always_uses_database(self):
+        # Another worker's bump would never reach this one's cache
+        token = CustomTokenObtainPairSerializer.get_token(self.student)
+        with override_settings(CACHE_SHARED=False), self.assertNumQueries(1):
+            user = self.authenticate(token)
+        self.assertIsInstance(user, User)
+
+    def test_approval_applies_to_tokens_already_issued(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.student)
+        self.assertEqual(self.borrow(token).status_code, 403)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.post(
+            reverse('approve_reject_student', args=[self.student.student_profile.id]), {'action': 'approve'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(None)
+
+        self.assertEqual(self.borrow(token).status_code, 201)
+
+    def test_refresh_reissues_current_claims(self):
+        refresh = CustomTokenObtainPairSerializer.get_token(self.student)
+        Student.objects.filter(user=self.student).update(is_approved=True)
+        bump_auth_version(self.student.id)
+
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        with self.assertNumQueries(1):  # counting the (empty) history, no user lookup
+            self.assertEqual(self.client.get(reverse('borrow_history')).status_code, 200)
+        response = self.client.post(reverse('borrow_book'), {'book_id': self.book.id}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_rejected_student_token_is_refused(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.student)
+        self.client.force_authenticate(self.admin)
+        self.client.post(
+            reverse('approve_reject_student', args=[self.student.student_profile.id]), {'action': 'reject'}
+        )
+        self.client.force_authenticate(None)
+
+        self.assertEqual(self.borrow(token).status_code, 401)
+
+
+class RevocationTests(APITestCase):
+    """Logout and refresh rotation revoke tokens; revocations reach other processes through the database."""
+
+    def setUp(self):
+        self.student = make_student('reader')
+        self.refresh = CustomTokenObtainPairSerializer.get_token(self.student)
+
+    def get_history(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        return self.client.get(reverse('borrow_history'))
+
+    def refresh_with(self, refresh):
+        self.client.credentials()
+        return self.client.post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        access = self.refresh.access_token
+        self.assertEqual(self.get_history(access).status_code, 200)
+
+        response = self.client.post(reverse('logout'), {'refresh': str(self.refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.get_history(access).status_code, 401)
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        response = self.refresh_with(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+        self.assertEqual(self.refresh_with(response.data['refresh']).status_code, 200)
+
+    def test_revocation_reaches_other_processes(self):
+        worker = RevocationStore(capacity=1000, error_rate=0.01, sync_interval=0)
+        jti = self.refresh['jti']
+        self.assertFalse(worker.is_revoked(jti))
+
+        revoke_token(self.refresh)
+        self.assertTrue(worker.is_revoked(jti))
+        # A process starting later loads it from the table, whatever the cache has dropped
+        cache.clear()
+        self.assertTrue(RevocationStore(capacity=1000, error_rate=0.01).is_revoked(jti))
+
+    def test_revocation_expires_with_the_token(self):
+        store = RevocationStore(capacity=1000, error_rate=0.01, sync_interval=0)
+        store.revoke('expired', time.time() - 1)
+        self.assertFalse(store.is_revoked('expired'))
+
+        store.revoke('live', time.time() + 60)
+        self.assertTrue(store.is_revoked('live'))
+        RevokedToken.objects.filter(jti='live').update(expires_at=timezone.now())
+        self.assertFalse(store.is_revoked('live'))
+
+    def test_full_filter_is_rebuilt_off_the_request_thread(self):
+        store = RevocationStore(capacity=2, error_rate=0.01, sync_interval=0)
+        store.sync()
+        RevokedToken.objects.create(jti='expired', expires_at=timezone.now() - timedelta(minutes=1))
+        full = store.filter
+        with mock.patch('users.revocation.threading.Thread') as thread:
+            for jti in 'abcd':
+                store.revoke(jti, time.time() + 60)
+        # Started once, and the checks carried on with the old filter
+        thread.assert_called_once_with(target=store.rebuild_in_background, daemon=True)
+        self.assertIs(store.filter, full)
+
+        store.rebuild()
+        self.assertIsNot(store.filter, full)
+        self.assertFalse(store.rebuilding)
+        self.assertFalse(RevokedToken.objects.filter(jti='expired').exists())
+        self.assertTrue(all(store.is_revoked(jti) for jti in 'abcd'))
+
+    def test_bloom_filter_has_no_false_negatives(self):
+        bloom = BloomFilter(capacity=5000, error_rate=0.01)
+        revoked = [str(uuid.uuid4()) for _ in range(5000)]
+        for jti in revoked:
+            bloom.add(jti)
+        self.assertTrue(all(jti in bloom for jti in revoked))
+        false_positives = sum(str(uuid.uuid4()) in bloom for _ in range(5000))
+        self.assertLess(false_positives, 5000 * 0.03)
+
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+class OnboardingTests(TestCase):
+    def rows(self, count, start=0):
+        return [
+            {'username': f'intake-{index}', 'email': f'intake-{index}@nitt.edu', 'roll_number': f'IN{index:05d}',
+             'department': 'CSE', 'full_name': 'New Student', 'password': 'initial-pass'}
+            for index in range(start, start + count)
+        ]
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_creates_users_and_students(self):
+        rows = self.rows(3)
+        del rows[1]['password']
+        report = import_students(rows, workers=1)
+
+        self.assertEqual((report['total'], len(report['created_students'])), (3, 3))
+        self.assertIsNotNone(report['users_per_s'])
+        user = User.objects.select_related('student_profile').get(username='intake-0')
+        self.assertEqual((user.role, user.first_name, user.last_name), ('student', 'New', 'Student'))
+        self.assertTrue(user.student_profile.is_approved)
+        self.assertTrue(user.check_password('initial-pass'))
+        # Only generated passwords are reported back
+        generated = report['created_students'][1]
+        self.assertNotIn('password', report['created_students'][0])
+        self.assertTrue(User.objects.get(username='intake-1').check_password(generated['password']))
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_command_keeps_generated_passwords_out_of_its_output(self):
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, 'intake.csv')
+        with open(path, 'w', newline='') as handle:
+            handle.write('username,email,roll_number,department,full_name\n')
+            handle.write('intake-0,intake-0@nitt.edu,IN00000,CSE,New Student\n')
+        out = io.StringIO()
+        call_command('import_students', path, '--json', '--workers', '1', stdout=out)
+
+        with open(os.path.join(directory, 'intake.credentials.csv'), newline='') as handle:
+            password = next(csv.DictReader(handle))['password']
+        self.assertTrue(User.objects.get(username='intake-0').check_password(password))
+        self.assertNotIn(password, out.getvalue())
+        self.assertNotIn('"password"', out.getvalue())
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_reports_invalid_and_duplicate_rows(self):
+        make_student('taken')
+        rows = self.rows(7)
+        rows[1]['username'] = 'taken'
+        rows[2]['email'] = rows[0]['email'].upper()
+        rows[3]['roll_number'] = 'R-taken'
+        rows[4]['email'] = 'not-an-email'
+        del rows[5]['roll_number']
+        report = import_students(rows, workers=1, batch_size=4)
+
+        self.assertEqual([row['username'] for row in report['created_students']], ['intake-0', 'intake-6'])
+        self.assertEqual([(row['index'], row['error']) for row in report['failed_students']], [
+            (1, 'A user with this username already exists'),
+            (2, 'Duplicate email in upload'),
+            (3, 'A student with this roll number already exists'),
+            (4, 'Enter a valid email address.'),
+            (5, 'roll_number is required'),
+        ])
+
+    @override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+    def test_queries_per_chunk_do_not_grow_with_rows(self):
+        def count_queries(rows):
+            with CaptureQueriesContext(connection) as queries:
+                import_students(rows, workers=1, batch_size=len(rows))
+            return len(queries)
+
+        self.assertEqual(count_queries(self.rows(5)), count_queries(self.rows(50, start=5)))
+
+    def test_passwords_hash_in_worker_processes(self):
+        # Workers hash with the configured (PBKDF2) hasher
+        with password_hasher(workers=2, pool_min=1) as hash_passwords:
+            hashes = hash_passwords(['first', 'second'])
+        self.assertTrue(check_password('first', hashes[0]))
+        self.assertTrue(check_password('second', hashes[1]))
+
+    @override_settings(ONBOARDING_VIEW_WORKERS=2)
+    def test_requests_share_one_small_pool(self):
+        with (
+            mock.patch.object(onboarding, 'shared_pool', None),
+            mock.patch.object(onboarding, 'ProcessPoolExecutor') as executor,
+        ):
+            executor.return_value.map.side_effect = lambda hash_password, passwords, chunksize: passwords
+            for _ in range(2):
+                with password_hasher(workers=8, pool_min=1, shared=True) as hash_passwords:
+                    hash_passwords(['first', 'second'])
+        executor.assert_called_once()
+        self.assertEqual(executor.call_args.args, (2,))
+        executor.return_value.shutdown.assert_not_called()
@@ -3,6 +3,8 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
 from rest_framework import status
 
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenObtainPairView
 
 from .serializers import (
@@ -12,6 +14,8 @@ from .serializers import (
     CustomTokenObtainPairSerializer
 )
 from .permissions import IsStudent
+from .revocation import revoke_token
+from hclBackend.caching import DASHBOARD, bump_version
 
 
 class RegisterView(APIView): #/api/register
@@ -21,6 +25,7 @@ class RegisterView(APIView): #/api/register
         serializer = RegisterSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         serializer.save()
+        bump_version(DASHBOARD)
         return Response(
             {"message": "Student registered successfully"},
             status=status.HTTP_201_CREATED
@@ -33,4 +38,13 @@ class LogoutView(APIView):  #/api/logout
     permission_classes = [AllowAny]
     
     def post(self, request):
+        # Revoke the access token the request was made with and the refresh token in the body
+        if request.auth is not None:
+            revoke_token(request.auth)
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                revoke_token(RefreshToken(refresh))
+            except TokenError:
+                pass  # Expired or invalid: nothing left to revoke
         return Response({"message": "Logged out successfully"})